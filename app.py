@@ -2,7 +2,11 @@
 Main Streamlit Application - Phil Gustin AI Mortgage Assistant
 """
 import streamlit as st
+import plotly.express as px
+import plotly.graph_objects as go
 import json
+import tempfile
+import uuid
 from datetime import datetime
 from components.chatbot import MortgageChatbot
 from components.proposal_generator import ProposalGenerator
@@ -12,6 +16,13 @@ from utils.lead_manager import LeadDataManager
 from utils.conversation_manager import ConversationManager
 from utils.pdf_generator import generate_proposal_pdf
 from utils.campaign_manager import CampaignManager
+from utils.campaign_model import touchpoint_counts
+from utils.change_feed import ChangeFeedConsumer
+from utils.lead_scoring import CallQueue
+from utils.conversation_search import ConversationSearch
+from utils.funnel_analytics import FunnelAnalytics
+from utils.touchpoint_queue import TouchpointQueue
+from utils.send_capacity import backlog as send_backlog
 
 # Page configuration
 st.set_page_config(
@@ -21,6 +32,43 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+
+@st.cache_resource
+def get_shared_stores():
+    """Process-wide data stores shared by every browser session"""
+    lead_manager = LeadDataManager()
+    call_queue = CallQueue()
+    call_queue.attach(lead_manager)
+    conversation_manager = ConversationManager()
+    conversation_search = ConversationSearch()
+    conversation_search.attach(conversation_manager)
+    campaign_manager = CampaignManager()
+    touchpoint_queue = TouchpointQueue()
+    touchpoint_queue.attach(campaign_manager)
+    return {
+        "lead_manager": lead_manager,
+        "conversation_manager": conversation_manager,
+        "conversation_search": conversation_search,
+        "campaign_manager": campaign_manager,
+        "funnel_analytics": FunnelAnalytics(conversation_manager, campaign_manager),
+        "campaign_feed_consumer": ChangeFeedConsumer(lead_manager.change_feed, "campaigns"),
+        "call_queue": call_queue,
+        "touchpoint_queue": touchpoint_queue,
+    }
+
+
+def export_conversations(fmt):
+    """Stream a conversation export into a temporary file for st.download_button"""
+    f = tempfile.TemporaryFile(mode="w+", encoding="utf-8")
+    st.session_state.conversation_manager.write_export(f, fmt)
+    f.seek(0)
+    return f
+
+
+# Shared stores - one copy of the JSON data per process, not per session
+for store_name, store in get_shared_stores().items():
+    st.session_state[store_name] = store
+
 # Initialize session state
 if "messages" not in st.session_state:
     st.session_state.messages = []
@@ -31,18 +79,15 @@ if "proposal_generated" not in st.session_state:
 if "chatbot" not in st.session_state:
     config = load_config()
     st.session_state.chatbot = MortgageChatbot(config)
-if "lead_manager" not in st.session_state:
-    st.session_state.lead_manager = LeadDataManager()
-if "conversation_manager" not in st.session_state:
-    st.session_state.conversation_manager = ConversationManager()
-if "campaign_manager" not in st.session_state:
-    st.session_state.campaign_manager = CampaignManager()
 if "current_lead_id" not in st.session_state:
     st.session_state.current_lead_id = None
 if "view_mode" not in st.session_state:
-    st.session_state.view_mode = "chat"  # chat, manage_leads, import_lead, conversations, or campaigns
+    st.session_state.view_mode = "chat"  # chat, manage_leads, import_lead, conversations, campaigns, or analytics
 if "lead_just_loaded" not in st.session_state:
     st.session_state.lead_just_loaded = False
+if "chat_session_id" not in st.session_state:
+    # Saves of the same chat share stored messages (see ConversationManager)
+    st.session_state.chat_session_id = uuid.uuid4().hex
 
 # Header
 col1, col2, col3 = st.columns([1, 4, 2])
@@ -55,7 +100,7 @@ with col3:
     st.markdown("### Navigation")
     view_mode = st.radio(
         "Select Mode:",
-        ["💬 Chat", "📋 Manage Leads", "📥 Import Lead", "💾 Conversations", "📧 Campaigns"],
+        ["💬 Chat", "📋 Manage Leads", "📥 Import Lead", "💾 Conversations", "📧 Campaigns", "📈 Analytics"],
         label_visibility="collapsed",
         key="nav_radio"
     )
@@ -68,6 +113,8 @@ with col3:
         st.session_state.view_mode = "conversations"
     elif view_mode == "📧 Campaigns":
         st.session_state.view_mode = "campaigns"
+    elif view_mode == "📈 Analytics":
+        st.session_state.view_mode = "analytics"
     else:
         st.session_state.view_mode = "import_lead"
 
@@ -121,9 +168,11 @@ with st.sidebar:
                 lead_name=st.session_state.lead_data.get("name", "Unknown"),
                 messages=st.session_state.messages,
                 lead_data=st.session_state.lead_data,
-                proposal_generated=st.session_state.proposal_generated
+                proposal_generated=st.session_state.proposal_generated,
+                session_id=st.session_state.chat_session_id
             )
         
+        st.session_state.chat_session_id = uuid.uuid4().hex
         st.session_state.messages = []
         st.session_state.lead_data = {}
         st.session_state.proposal_generated = False
@@ -142,20 +191,18 @@ with st.sidebar:
     col1, col2 = st.columns(2)
     with col1:
         if st.button("📥 Download All (JSON)"):
-            json_data = st.session_state.conversation_manager.export_to_json()
             st.download_button(
                 label="💾 Save JSON File",
-                data=json_data,
+                data=export_conversations("json"),
                 file_name=f"conversations_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
                 mime="application/json"
             )
     
     with col2:
         if st.button("📊 Download Summary (CSV)"):
-            csv_data = st.session_state.conversation_manager.export_to_csv()
             st.download_button(
                 label="💾 Save CSV File",
-                data=csv_data,
+                data=export_conversations("csv"),
                 file_name=f"conversation_summary_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
                 mime="text/csv"
             )
@@ -172,14 +219,30 @@ if st.session_state.view_mode == "manage_leads":
         
         if st.button("📦 Load Sample Leads (Ronnie Yates & Peter Walker)"):
             sample_leads = st.session_state.lead_manager.get_sample_leads()
-            for lead_id, lead_data in sample_leads.items():
-                parsed = st.session_state.lead_manager.parse_bonzo_lead(lead_data)
-                st.session_state.lead_manager.add_lead(parsed)
+            st.session_state.lead_manager.add_leads(
+                st.session_state.lead_manager.parse_bonzo_lead(lead_data) for lead_data in sample_leads.values()
+            )
             st.success("Sample leads loaded!")
             st.rerun()
     else:
         st.subheader(f"Total Leads: {len(all_leads)}")
         
+        if st.button("🧹 Merge Duplicate Leads"):
+            merged = st.session_state.lead_manager.dedupe_leads()
+            st.success(f"Merged {len(merged)} duplicate lead(s)")
+            st.rerun()
+        
+        # Call queue - who to call first
+        with st.expander("📞 Call Queue (Top 10)", expanded=True):
+            for rank, (lead_id, score) in enumerate(st.session_state.call_queue.top(10), 1):
+                queued_lead = all_leads.get(lead_id)
+                if queued_lead is None:
+                    continue
+                st.write(
+                    f"**{rank}. {queued_lead.get('name', 'Unknown')}** - Score {score:.0f} | "
+                    f"Cash Out: ${queued_lead.get('cash_out_amount', 0):,} | {queued_lead.get('phone', 'N/A')}"
+                )
+        
         # Display leads in a table
         for lead_id, lead in all_leads.items():
             with st.expander(f"🔹 {lead.get('name', 'Unknown')} - ID: {lead_id}"):
@@ -212,6 +275,7 @@ if st.session_state.view_mode == "manage_leads":
                         st.session_state.lead_just_loaded = True
                         # Clear previous messages to start fresh
                         st.session_state.messages = []
+                        st.session_state.chat_session_id = uuid.uuid4().hex
                         st.rerun()
                 
                 with col3:
@@ -222,7 +286,7 @@ if st.session_state.view_mode == "manage_leads":
                 
                 # Show full JSON data
                 if st.checkbox("Show Full Data", key=f"show_{lead_id}"):
-                    st.json(lead)
+                    st.json(lead.to_dict(include_payload=True))
 
 elif st.session_state.view_mode == "import_lead":
     # ==================== IMPORT LEAD VIEW ====================
@@ -262,6 +326,8 @@ elif st.session_state.view_mode == "import_lead":
                     parsed_lead = st.session_state.lead_manager.parse_bonzo_lead(lead_json)
                     lead_id = st.session_state.lead_manager.add_lead(parsed_lead)
                     
+                    if parsed_lead.get("lead_id") and lead_id != parsed_lead.get("lead_id"):
+                        st.info(f"🔁 Matched existing borrower - merged into Lead ID: {lead_id}")
                     st.success(f"✅ Lead imported successfully! Lead ID: {lead_id}")
                     st.success(f"Name: {parsed_lead.get('name')}")
                     
@@ -337,9 +403,13 @@ elif st.session_state.view_mode == "conversations":
     # ==================== CONVERSATIONS HISTORY VIEW ====================
     st.header("💾 Conversation History")
     
-    all_conversations = st.session_state.conversation_manager.get_all_conversations()
+    # Older months live in compressed archive partitions, only read on request
+    include_archived = False
+    if st.session_state.conversation_manager.archive.months():
+        include_archived = st.checkbox("Include archived months", value=False)
+    all_conversations = st.session_state.conversation_manager.get_all_conversations(include_archived=include_archived)
     
-    if not all_conversations:
+    if not all_conversations and not st.session_state.conversation_manager.archive.months():
         st.info("No conversations recorded yet. Start chatting to create conversation history!")
     else:
         # Statistics
@@ -357,26 +427,50 @@ elif st.session_state.view_mode == "conversations":
         
         st.divider()
         
-        # Export buttons
+        # Export buttons (the export is only generated once requested)
         col1, col2 = st.columns(2)
         with col1:
-            json_data = st.session_state.conversation_manager.export_to_json()
-            st.download_button(
-                label="📥 Download All Conversations (JSON)",
-                data=json_data,
-                file_name=f"all_conversations_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
-                mime="application/json",
-                type="primary"
-            )
+            if st.button("📥 Download All Conversations (JSON)", type="primary"):
+                st.download_button(
+                    label="💾 Save JSON File",
+                    data=export_conversations("json"),
+                    file_name=f"all_conversations_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+                    mime="application/json",
+                    key="save_all_conversations_json"
+                )
         
         with col2:
-            csv_data = st.session_state.conversation_manager.export_to_csv()
-            st.download_button(
-                label="📊 Download Summary (CSV)",
-                data=csv_data,
-                file_name=f"conversation_summary_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                mime="text/csv"
-            )
+            if st.button("📊 Download Summary (CSV)", key="conversations_csv"):
+                st.download_button(
+                    label="💾 Save CSV File",
+                    data=export_conversations("csv"),
+                    file_name=f"conversation_summary_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+                    mime="text/csv",
+                    key="save_conversation_summary_csv"
+                )
+        
+        st.divider()
+        st.subheader("🔎 Search Transcripts")
+        
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            query = st.text_input("Search", placeholder='e.g. "debt consolidation" or 8315 Oceanview')
+        with col2:
+            role_filter = st.selectbox("Speaker", ["All", "user", "assistant"])
+        
+        if query:
+            hits = st.session_state.conversation_search.search(query, role=None if role_filter == "All" else role_filter)
+            st.caption(f"{len(hits)} matching message(s)")
+            for hit in hits:
+                conv_meta = st.session_state.conversation_manager.by_id.get(hit["conversation_id"], {})
+                st.markdown(
+                    f"**{conv_meta.get('lead_name', 'Unknown')}** · {hit['conversation_id']} · "
+                    f"message {hit['message_index'] + 1} ({hit['role']})"
+                )
+                st.markdown(f"> {hit['snippet']}")
+            # Only list the matching conversations below
+            matched = {hit["conversation_id"] for hit in hits}
+            all_conversations = [c for c in all_conversations if c.get("conversation_id") in matched]
         
         st.divider()
         st.subheader("Conversation List")
@@ -406,8 +500,8 @@ elif st.session_state.view_mode == "conversations":
                     st.write(f"**Messages:** {msg_count}")
                     st.write(f"**Proposal Generated:** {'✅ Yes' if proposal_gen else '❌ No'}")
                     
-                    # Show lead data
-                    lead_data = conv.get("lead_data", {})
+                    # Show lead data (summary kept with the metadata)
+                    lead_data = conv.get("lead_summary", {})
                     if lead_data:
                         st.write("**Lead Info:**")
                         st.write(f"- Property Value: ${lead_data.get('property_value', 0):,}")
@@ -416,22 +510,24 @@ elif st.session_state.view_mode == "conversations":
                         st.write(f"- Veteran: {lead_data.get('is_veteran', 'N/A')}")
                 
                 with col2:
-                    # Download individual conversation transcript
-                    transcript = st.session_state.conversation_manager.export_conversation_detail(conv_id)
-                    if transcript:
-                        st.download_button(
-                            label="📄 Download Transcript",
-                            data=transcript,
-                            file_name=f"transcript_{conv_id}.txt",
-                            mime="text/plain",
-                            key=f"download_{conv_id}"
-                        )
+                    # Download individual conversation transcript (body loaded on request)
+                    if st.button("📄 Transcript", key=f"transcript_{conv_id}"):
+                        transcript = st.session_state.conversation_manager.export_conversation_detail(conv_id)
+                        if transcript:
+                            st.download_button(
+                                label="💾 Save Transcript",
+                                data=transcript,
+                                file_name=f"transcript_{conv_id}.txt",
+                                mime="text/plain",
+                                key=f"download_{conv_id}"
+                            )
                 
                 # Show conversation messages
                 if st.checkbox("Show Conversation", key=f"show_conv_{conv_id}"):
                     st.markdown("---")
                     st.markdown("**Conversation Messages:**")
-                    for i, msg in enumerate(conv.get("messages", []), 1):
+                    body = st.session_state.conversation_manager.load_body(conv_id) or {}
+                    for i, msg in enumerate(body.get("messages") or [], 1):
                         role = msg.get("role", "unknown")
                         content = msg.get("content", "")
                         
@@ -450,6 +546,11 @@ elif st.session_state.view_mode == "campaigns":
     st.header("📧 Campaign Management")
     st.caption("Automated drip campaigns based on Phil's 57-step nurture sequence")
     
+    # Pick up campaigns the dispatcher changed, and lead edits (cash out,
+    # balance, ...), since the last render
+    st.session_state.campaign_manager.refresh()
+    st.session_state.campaign_manager.sync_lead_changes(st.session_state.campaign_feed_consumer)
+    
     tab1, tab2, tab3 = st.tabs(["🎯 Active Campaigns", "➕ Create Campaign", "📊 Campaign Stats"])
     
     with tab1:
@@ -479,8 +580,7 @@ elif st.session_state.view_mode == "campaigns":
                             status_emoji = "✅" if status == "active" else "⏸️" if status == "paused" else "🛑"
                             st.write(f"**Status:** {status_emoji} {status.upper()}")
                             
-                            completed = len(campaign.get("completed_touchpoints", []))
-                            total = len(campaign.get("scheduled_touchpoints", []))
+                            completed, total = touchpoint_counts(campaign)
                             st.progress(completed / total if total > 0 else 0)
                             st.caption(f"{completed} / {total} touchpoints sent")
                         else:
@@ -576,19 +676,34 @@ elif st.session_state.view_mode == "campaigns":
                 st.balloons()
                 st.session_state.view_mode = "campaigns"
                 st.rerun()
-    
+
+            st.markdown("---")
+            st.write("**Enroll Many Leads:**")
+            min_cash_out = st.number_input("Minimum cash out:", min_value=0, value=0, step=5000)
+            campaigns = st.session_state.campaign_manager.get_all_campaigns()
+            eligible = {
+                lead_id: lead for lead_id, lead in leads.items()
+                if str(lead_id) not in campaigns and (lead.get("cash_out_amount") or 0) >= min_cash_out
+            }
+            st.caption(f"{len(eligible):,} leads without a campaign match")
+
+            if st.button(f"📨 Enroll {len(eligible):,} Leads", disabled=not eligible):
+                enrolled = st.session_state.campaign_manager.enroll_leads(eligible, campaign_type)
+                st.success(f"✅ {len(enrolled):,} campaigns started!")
+                st.rerun()
+
     with tab3:
         st.subheader("Campaign Statistics")
         
         # Gather stats from all campaigns
-        campaigns = st.session_state.campaign_manager._load_all_campaigns()
+        campaigns = st.session_state.campaign_manager.get_all_campaigns()
         
         if not campaigns:
             st.info("No campaigns yet. Create one to see statistics.")
         else:
             total_campaigns = len(campaigns)
             active_campaigns = sum(1 for c in campaigns.values() if c.get("status") == "active")
-            total_touchpoints_sent = sum(len(c.get("completed_touchpoints", [])) for c in campaigns.values())
+            total_touchpoints_sent = sum(touchpoint_counts(c)[0] for c in campaigns.values())
             
             col1, col2, col3, col4 = st.columns(4)
             with col1:
@@ -600,15 +715,24 @@ elif st.session_state.view_mode == "campaigns":
             with col4:
                 avg_completion = (total_touchpoints_sent / total_campaigns) if total_campaigns > 0 else 0
                 st.metric("Avg Touchpoints/Campaign", f"{avg_completion:.1f}")
-            
+
+            # Global due index - no per-lead scan
+            due_now = st.session_state.touchpoint_queue.due()
+            next_due = st.session_state.touchpoint_queue.next_due()
+            if due_now:
+                st.warning(f"🔴 {len(due_now)} touchpoints are due now across {len({d['lead_id'] for d in due_now})} campaigns")
+                for channel, entry in send_backlog(due_now).items():
+                    st.caption(f"{channel}: {entry['depth']} queued, expected lag {entry['expected_lag_minutes']:.0f} min")
+            elif next_due:
+                st.caption(f"Next touchpoint due {next_due[0].strftime('%b %d, %I:%M %p')} (lead {next_due[1]})")
+
             st.divider()
             
             # Campaign breakdown
             st.write("**Campaign Breakdown:**")
             for lead_id, campaign in campaigns.items():
                 status = campaign.get("status", "unknown")
-                completed = len(campaign.get("completed_touchpoints", []))
-                total = len(campaign.get("scheduled_touchpoints", []))
+                completed, total = touchpoint_counts(campaign)
                 
                 col1, col2, col3 = st.columns([3, 1, 1])
                 with col1:
@@ -618,6 +742,71 @@ elif st.session_state.view_mode == "campaigns":
                 with col3:
                     st.write(f"{completed}/{total}")
 
+# ================================================================================
+# ANALYTICS VIEW
+# ================================================================================
+elif st.session_state.view_mode == "analytics":
+    st.header("📈 Conversion Analytics")
+    st.caption("Chat-to-proposal funnel and campaign reply rates")
+    
+    # Only conversations saved since the last render are read
+    metrics = st.session_state.funnel_analytics.metrics()
+    
+    if metrics["sessions"] == 0:
+        st.info("No conversations yet. Chats appear here once they are saved.")
+    else:
+        timing = metrics["time_to_proposal"]
+        funnel = metrics["funnel"]
+        
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Chat Sessions", metrics["sessions"])
+        with col2:
+            proposals = int(funnel["count"].iloc[2])
+            st.metric("Proposal Rate", f"{proposals / metrics['sessions']:.0%}")
+        with col3:
+            median_turns = timing["median_turns"]
+            st.metric("Median Replies to Proposal", f"{median_turns:g}" if median_turns is not None else "—")
+        with col4:
+            median_hours = timing["median_hours"]
+            st.metric("Median Hours to Proposal", f"{median_hours:.1f}" if median_hours is not None else "—")
+        
+        tab1, tab2, tab3 = st.tabs(["🔻 Funnel", "⏱️ Time to Proposal", "📧 Template Replies"])
+        
+        with tab1:
+            fig = go.Figure(go.Funnel(y=funnel["stage"], x=funnel["count"], textinfo="value+percent initial"))
+            fig.update_layout(height=400, margin=dict(t=20, b=20))
+            st.plotly_chart(fig, use_container_width=True)
+            
+            st.write("**Where chats without a proposal stopped:**")
+            drop_off = metrics["drop_off"]
+            if drop_off.empty:
+                st.info("Every chat reached a proposal.")
+            else:
+                fig = px.bar(drop_off, x="user_turns", y="sessions",
+                             labels={"user_turns": "Borrower replies", "sessions": "Sessions"})
+                fig.update_layout(height=300, margin=dict(t=20, b=20))
+                st.plotly_chart(fig, use_container_width=True)
+        
+        with tab2:
+            histogram = timing["turns_histogram"]
+            if histogram.empty:
+                st.info("No proposals generated yet.")
+            else:
+                st.caption(f"Middle 50% of sessions: {timing['p25_turns']:g} - {timing['p75_turns']:g} borrower replies")
+                fig = px.bar(histogram, x="user_turns", y="sessions",
+                             labels={"user_turns": "Borrower replies before the proposal", "sessions": "Sessions"})
+                fig.update_layout(height=300, margin=dict(t=20, b=20))
+                st.plotly_chart(fig, use_container_width=True)
+        
+        with tab3:
+            templates = metrics["template_response"]
+            if templates.empty:
+                st.info("No campaign touchpoints sent yet.")
+            else:
+                st.caption("Each reply is credited to the last touchpoint sent before it")
+                st.dataframe(templates, use_container_width=True, hide_index=True)
+
 else:
     # ==================== CHAT VIEW ====================
     st.header("💬 Chat with Phil's AI Assistant")
@@ -689,7 +878,8 @@ else:
                         lead_name=st.session_state.lead_data.get("name", "Unknown"),
                         messages=st.session_state.messages + [{"role": "assistant", "content": response["message"]}],
                         lead_data=st.session_state.lead_data,
-                        proposal_generated=True
+                        proposal_generated=True,
+                        session_id=st.session_state.chat_session_id
                     )
                     st.toast(f"✅ Conversation saved: {conv_id}", icon="💾")
         
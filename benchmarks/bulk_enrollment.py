@@ -0,0 +1,55 @@
+"""
+Benchmark - Enrolling many leads: create_campaign per lead vs enroll_leads
+
+Usage:
+    python -m benchmarks.bulk_enrollment [lead_count]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from utils.campaign_manager import CampaignManager
+
+
+TIMEZONES = ["America/New_York", "America/Chicago", "America/Denver", "America/Los_Angeles"]
+
+
+def make_leads(count):
+    """Leads spread over the US timezones"""
+    return {
+        str(40000000 + i): {
+            "lead_id": str(40000000 + i),
+            "name": f"Borrower {i}",
+            "email": f"borrower{i}@example.com",
+            "phone": f"{5550000000 + i}",
+            "property_value": 850000,
+            "cash_out_amount": 10000 + (i % 90) * 1000,
+            "timezone": TIMEZONES[i % len(TIMEZONES)],
+        }
+        for i in range(count)
+    }
+
+
+def main(count=10000):
+    """Run the benchmark and print enrollments per second"""
+    leads = make_leads(count)
+
+    one_by_one = CampaignManager(campaigns_file=os.path.join(tempfile.mkdtemp(), "campaigns.json"))
+    start = time.perf_counter()
+    for lead_id, lead in leads.items():
+        one_by_one.create_campaign(lead_id, "new_lead_cashout", lead)
+    single_seconds = time.perf_counter() - start
+
+    bulk = CampaignManager(campaigns_file=os.path.join(tempfile.mkdtemp(), "campaigns.json"))
+    start = time.perf_counter()
+    enrolled = bulk.enroll_leads(leads, "new_lead_cashout")
+    bulk_seconds = time.perf_counter() - start
+
+    print(f"Leads:             {count:,}")
+    print(f"create_campaign:   {single_seconds:,.2f} s ({count / single_seconds:,.0f} leads/s)")
+    print(f"enroll_leads:      {bulk_seconds:,.2f} s ({len(enrolled) / bulk_seconds:,.0f} leads/s)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
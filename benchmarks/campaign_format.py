@@ -0,0 +1,107 @@
+"""
+Benchmark - File size, load time and memory of expanded vs compact campaigns
+
+Usage:
+    python -m benchmarks.campaign_format [campaign_count]
+"""
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from utils.campaign_manager import CampaignManager
+from utils.campaign_store import JsonCampaignStore
+
+
+def make_campaigns(count):
+    """Expanded campaigns shaped like real ones, a few touchpoints into their schedule"""
+    manager = CampaignManager(campaigns_file=os.path.join(tempfile.mkdtemp(), "seed.json"))
+    lead = {"name": "Ronnie Yates", "email": "ronnie@example.com", "phone": "5550000000",
+            "property_value": 850000, "current_balance": 400000, "cash_out_amount": 50000,
+            "timezone": "America/Los_Angeles", "is_veteran": "No", "credit_score": "720"}
+    base = dict(manager.create_campaign("seed", "new_lead_cashout", lead))
+
+    campaigns = {}
+    for i in range(count):
+        shift = timedelta(minutes=i % 1440)
+        touchpoints = []
+        for index, touchpoint in enumerate(base["scheduled_touchpoints"]):
+            when = datetime.fromisoformat(touchpoint["scheduled_time"]) + shift
+            sent = index < i % 12
+            touchpoints.append({**touchpoint, "scheduled_time": when.isoformat(), "status": "sent" if sent else "pending",
+                                "sent_at": (when + timedelta(seconds=5)).isoformat() if sent else None})
+        lead_id = str(40000000 + i)
+        campaigns[lead_id] = {
+            **base,
+            "lead_id": lead_id,
+            "lead_data": {**base["lead_data"], "lead_id": lead_id, "phone": f"{5550000000 + i}"},
+            "scheduled_touchpoints": touchpoints,
+            "completed_touchpoints": [tp for tp in touchpoints if tp["status"] == "sent"],
+        }
+    return campaigns
+
+
+def timed(function):
+    """Return (result, seconds) of the best of three runs"""
+    best = None
+    for _ in range(3):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def measure(build):
+    """Return (result, bytes allocated) for a builder function"""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current
+
+
+def main(count=5000):
+    """Run the benchmark and print size, load time and memory per format"""
+    directory = tempfile.mkdtemp()
+    expanded_path = os.path.join(directory, "expanded.json")
+    compact_path = os.path.join(directory, "campaigns.json")
+    with open(expanded_path, 'w') as f:
+        json.dump(make_campaigns(count), f, indent=2)
+    # Loading the expanded file through the store migrates it
+    with open(expanded_path) as src, open(compact_path, 'w') as dst:
+        dst.write(src.read())
+    store = JsonCampaignStore(compact_path)
+
+    def load_expanded():
+        with open(expanded_path) as f:
+            return json.load(f)
+
+    def load_compact():
+        return JsonCampaignStore(compact_path, store.catalog)
+
+    _, expanded_seconds = timed(load_expanded)
+    _, compact_seconds = timed(load_compact)
+    _, expanded_bytes = measure(load_expanded)
+    _, compact_bytes = measure(load_compact)
+    campaign = store.get("40000000")
+    _, expand_seconds = timed(lambda: [campaign["scheduled_touchpoints"] for _ in range(1000)])
+
+    expanded_size = os.path.getsize(expanded_path)
+    compact_size = os.path.getsize(compact_path) + os.path.getsize(store.catalog.path)
+    print(f"Campaigns:         {count:,}")
+    print(f"File size:         {expanded_size / 1e6:,.1f} MB expanded, {compact_size / 1e6:,.2f} MB compact "
+          f"({expanded_size / compact_size:.0f}x smaller)")
+    print(f"Load time:         {expanded_seconds * 1e3:,.0f} ms expanded, {compact_seconds * 1e3:,.0f} ms compact")
+    print(f"Memory:            {expanded_bytes / count:,.0f} bytes/campaign expanded, "
+          f"{compact_bytes / count:,.0f} bytes/campaign compact")
+    print(f"Expand on display: {expand_seconds * 1e3:,.0f} µs per campaign")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
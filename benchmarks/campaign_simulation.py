@@ -0,0 +1,19 @@
+"""
+Benchmark - A month of campaigns on a virtual clock (throughput, storage, memory, lag)
+
+Usage:
+    python -m benchmarks.campaign_simulation [lead_count] [days]
+"""
+import sys
+
+from utils.campaign_simulator import CampaignSimulator, print_report
+
+
+def main(count=2000, days=30):
+    """Run the simulation and print its report"""
+    report = CampaignSimulator(leads=count, days=days).run(trace_memory=True)
+    print_report(report)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000, int(sys.argv[2]) if len(sys.argv) > 2 else 30)
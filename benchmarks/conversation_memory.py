@@ -0,0 +1,98 @@
+"""
+Benchmark - Startup time and resident memory of the conversation history
+
+Compares loading full records (legacy conversations.json) with loading only
+the metadata of the log (bodies stay compressed on disk), from the saved
+metadata index and by decoding every log record.
+
+Usage:
+    python -m benchmarks.conversation_memory [conversation_count]
+"""
+import gc
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.lead_memory import measure
+from utils.conversation_manager import ConversationManager
+
+
+def make_conversation(i, now=None):
+    """Conversation shaped like a typical 12-message chat session, from the last 28 days"""
+    started = (now or datetime.now()) - timedelta(days=i % 28)
+    messages = []
+    for turn in range(6):
+        messages.append({"role": "user", "content": f"My home is worth about {400 + turn}k, can I take out {50 + i % 40}k?"})
+        messages.append({"role": "assistant", "content": "Great question! Based on your equity position, " * 8})
+    return {
+        "conversation_id": f"conv_{started:%Y%m%d}_{i:06d}_{36390000 + i}",
+        "lead_id": str(36390000 + i),
+        "lead_name": f"Borrower {i}",
+        "timestamp": started.replace(microsecond=0).isoformat(),
+        "message_count": len(messages),
+        "messages": messages,
+        "lead_data": {"property_value": 450000, "current_balance": 210000, "cash_out_amount": 50000 + i, "is_veteran": i % 3 == 0},
+        "proposal_generated": i % 2 == 0,
+        "session_duration": None,
+    }
+
+
+def main(count=5000):
+    """Run the benchmark and print load time and memory"""
+    workdir = tempfile.mkdtemp()
+    data_file = os.path.join(workdir, "conversations.json")
+    now = datetime.now()
+    with open(data_file, 'w') as f:
+        json.dump([make_conversation(i, now) for i in range(count)], f)
+
+    # One-time migration into the log + compressed bodies
+    ConversationManager(data_file=data_file, fsync="never").log.close()
+
+    legacy_file = f"{data_file}.migrated"
+
+    def load_legacy():
+        with open(legacy_file, 'r') as f:
+            return json.load(f)
+
+    def load_metadata():
+        return ConversationManager(data_file=data_file, fsync="never")
+
+    def timed(build):
+        """Seconds a builder takes (measured without tracemalloc, which slows it down)"""
+        gc.collect()
+        start = time.perf_counter()
+        result = build()
+        seconds = time.perf_counter() - start
+        if isinstance(result, ConversationManager):
+            result.log.close()
+        return seconds
+
+    legacy_seconds = timed(load_legacy)
+    legacy_bytes = measure(load_legacy)[1]     # not kept alive while the others are timed
+
+    metadata_seconds = timed(load_metadata)
+    manager, metadata_bytes = measure(load_metadata)
+    manager.log.close()
+
+    # Without the saved index every log record is decoded (the index is then saved again)
+    index = f"{manager.index_file}.saved"
+    os.replace(manager.index_file, index)
+    scan_seconds = timed(load_metadata)
+    os.replace(index, manager.index_file)
+
+    bodies = manager.bodies.size()
+    print(f"Conversations:     {count:,}")
+    print(f"Full records:      {legacy_seconds:.2f}s, {legacy_bytes / 1e6:.1f} MB resident")
+    print(f"Metadata index:    {metadata_seconds:.2f}s, {metadata_bytes / 1e6:.1f} MB resident")
+    print(f"Log scan:          {scan_seconds:.2f}s (including saving the index)")
+    print(f"Bodies on disk:    {bodies / 1e6:.1f} MB compressed (legacy JSON {os.path.getsize(legacy_file) / 1e6:.1f} MB)")
+    manager.log.close()
+    shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
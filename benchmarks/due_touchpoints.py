@@ -0,0 +1,84 @@
+"""
+Benchmark - Finding due touchpoints with a per-lead scan vs the global queue
+
+Usage:
+    python -m benchmarks.due_touchpoints [campaign_count]
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from utils.campaign_manager import CampaignManager
+from utils.touchpoint_queue import TouchpointQueue
+
+
+def make_campaigns(count):
+    """Active cash-out campaigns with start times spread over the past 30 days"""
+    manager = CampaignManager(campaigns_file=os.path.join(tempfile.mkdtemp(), "unused.json"))
+    template = manager._schedule_touchpoints("new_lead_cashout", {"timezone": "America/Los_Angeles"})
+    base = [datetime.fromisoformat(tp["scheduled_time"]) for tp in template]
+    campaigns = {}
+    for i in range(count):
+        shift = timedelta(days=-30 + (i % 43200) / 1440)
+        campaigns[str(i)] = {
+            "lead_id": str(i),
+            "status": "active",
+            "scheduled_touchpoints": [
+                {**tp, "scheduled_time": (when + shift).isoformat()} for tp, when in zip(template, base)
+            ],
+        }
+    return campaigns
+
+
+def scan(campaigns, until):
+    """What get_pending_touchpoints does, for every lead"""
+    due = []
+    for lead_id, campaign in campaigns.items():
+        for index, touchpoint in enumerate(campaign["scheduled_touchpoints"]):
+            if touchpoint["status"] == "pending":
+                scheduled = datetime.fromisoformat(touchpoint["scheduled_time"])
+                if scheduled <= until.astimezone(scheduled.tzinfo):
+                    due.append((lead_id, index))
+    return due
+
+
+def main(count=100000):
+    """Run the benchmark and print timings"""
+    campaigns = make_campaigns(count)
+    # Mark everything due up to now as sent, so the next minute is the interesting window
+    now = datetime.now().astimezone()
+    for lead_id, index in scan(campaigns, now):
+        campaigns[lead_id]["scheduled_touchpoints"][index]["status"] = "sent"
+    window = now + timedelta(minutes=1)
+
+    start = time.perf_counter()
+    scanned = scan(campaigns, window)
+    scan_seconds = time.perf_counter() - start
+
+    queue = TouchpointQueue()
+    start = time.perf_counter()
+    queue.build(campaigns)
+    build_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    due = queue.due(window)
+    due_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for lead_id in list(campaigns)[:1000]:
+        queue.update(lead_id, campaigns[lead_id])
+    update_seconds = (time.perf_counter() - start) / 1000
+
+    assert sorted((d["lead_id"], d["index"]) for d in due) == sorted(scanned)
+    print(f"Campaigns:            {count:,}")
+    print(f"Due in next minute:   {len(due):,}")
+    print(f"Per-lead scan:        {scan_seconds * 1000:,.0f} ms")
+    print(f"Queue build (once):   {build_seconds * 1000:,.0f} ms")
+    print(f"Queue due():          {due_seconds * 1000:,.2f} ms")
+    print(f"Queue update():       {update_seconds * 1e6:,.0f} us per campaign")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
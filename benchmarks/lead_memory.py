@@ -0,0 +1,69 @@
+"""
+Benchmark - Resident memory of plain lead dicts vs compact LeadRecords
+
+Usage:
+    python -m benchmarks.lead_memory [lead_count]
+"""
+import gc
+import json
+import os
+import sys
+import tempfile
+import tracemalloc
+
+from utils.jsonl_store import JsonlStore
+from utils.lead_manager import LeadDataManager
+from utils.lead_model import LeadRecord
+
+
+def make_bonzo_leads(count):
+    """Generate Bonzo payloads shaped like the sample leads"""
+    manager = LeadDataManager(data_file=os.path.join(tempfile.mkdtemp(), "unused.json"))
+    samples = list(manager.get_sample_leads().values())
+    leads = []
+    for i in range(count):
+        payload = dict(samples[i % len(samples)])
+        payload["lead_id"] = str(40000000 + i)
+        payload["phone"] = f"{5550000000 + i}"
+        payload["email"] = f"borrower{i}@example.com"
+        payload["cash_out_amount"] = str(10000 + (i % 90) * 1000)
+        leads.append(manager.parse_bonzo_lead(payload))
+    # Round-trip through JSON so strings are not shared, like leads loaded from disk
+    return json.loads(json.dumps(leads))
+
+
+def measure(build):
+    """Return (result, bytes allocated) for a builder function"""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current
+
+
+def main(count=5000):
+    """Run the benchmark and print per-lead memory"""
+    raw = json.dumps(make_bonzo_leads(count))
+    payload_file = os.path.join(tempfile.mkdtemp(), "bench_bonzo.jsonl")
+
+    def build_dicts():
+        return {lead["lead_id"]: lead for lead in json.loads(raw)}
+
+    def build_records():
+        store = JsonlStore(payload_file)
+        return store, {lead["lead_id"]: LeadRecord.from_dict(lead, store) for lead in json.loads(raw)}
+
+    dicts, dict_bytes = measure(build_dicts)
+    del dicts
+    records, record_bytes = measure(build_records)
+
+    print(f"Leads:             {count:,}")
+    print(f"Plain dicts:       {dict_bytes / count:,.0f} bytes/lead ({dict_bytes / 1e6:.1f} MB)")
+    print(f"LeadRecord:        {record_bytes / count:,.0f} bytes/lead ({record_bytes / 1e6:.1f} MB)")
+    print(f"Reduction:         {100 * (1 - record_bytes / dict_bytes):.1f}%")
+    os.remove(payload_file)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
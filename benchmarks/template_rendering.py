@@ -0,0 +1,50 @@
+"""
+Benchmark - Rendering one template for many leads, per call vs compiled batch
+
+Usage:
+    python -m benchmarks.template_rendering [lead_count]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from utils.campaign_manager import CampaignManager
+from utils.message_templates import lead_tokens
+
+
+def per_call(manager, template_key, leads):
+    """What personalize_message used to do for every message"""
+    results = []
+    for lead in leads:
+        template = manager.get_message_templates().get(template_key, {})
+        tokens = lead_tokens(lead)
+        results.append({k: v.format(**tokens) if isinstance(v, str) else v for k, v in template.items()})
+    return results
+
+
+def main(count=50000):
+    """Run the benchmark and print timings"""
+    manager = CampaignManager(campaigns_file=os.path.join(tempfile.mkdtemp(), "unused.json"))
+    leads = [{"name": f"Borrower {i}", "email": f"b{i}@example.com", "cash_out_amount": 10000 + i} for i in range(count)]
+
+    start = time.perf_counter()
+    old = per_call(manager, "initial_contact", leads)
+    old_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    tokens = [lead_tokens(lead) for lead in leads]
+    tokens_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    new = manager.templates.render_batch("initial_contact", tokens)
+    batch_seconds = time.perf_counter() - start
+
+    assert old == new
+    print(f"Leads:                 {count:,}")
+    print(f"Per-call rendering:    {old_seconds * 1000:,.0f} ms ({old_seconds / count * 1e6:.1f} us/message)")
+    print(f"Token dicts (once):    {tokens_seconds * 1000:,.0f} ms")
+    print(f"Compiled batch render: {batch_seconds * 1000:,.0f} ms ({batch_seconds / count * 1e6:.1f} us/message)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
@@ -0,0 +1,115 @@
+"""
+Test Cases for the Analytics Export - Typed columnar tables and incremental runs
+"""
+import os
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from utils.analytics_export import AnalyticsExporter
+from utils.campaign_manager import CampaignManager
+from utils.conversation_manager import ConversationManager
+from utils.lead_manager import LeadDataManager
+
+
+class TestAnalyticsExport:
+    """Test the export pipeline"""
+
+    def setup_stores(self, temp_storage_dir):
+        """Stores with one lead, one conversation and one campaign"""
+        self.leads = LeadDataManager(data_file=os.path.join(temp_storage_dir, "leads.json"))
+        self.conversations = ConversationManager(data_file=os.path.join(temp_storage_dir, "conversations.json"))
+        self.campaigns = CampaignManager(campaigns_file=os.path.join(temp_storage_dir, "campaigns.json"))
+        self.leads.add_lead({"lead_id": "1", "name": "Ronnie Yates", "property_value": "450,000", "cash_out_amount": 50000})
+        self.conversations.save_conversation("1", "Ronnie Yates", [
+            {"role": "user", "content": "Hi"},
+            {"role": "assistant", "content": "Hello!"},
+        ], {"property_value": 450000})
+        self.campaigns.create_campaign("1", "new_lead_cashout", self.leads.get_lead("1"))
+        return AnalyticsExporter(
+            os.path.join(temp_storage_dir, "analytics"), self.leads, self.conversations, self.campaigns
+        )
+
+    def test_first_run_is_a_full_typed_snapshot(self, temp_storage_dir):
+        """Every table is written with typed columns"""
+        exporter = self.setup_stores(temp_storage_dir)
+
+        counts = exporter.export()
+
+        assert counts["leads"] == 1
+        assert counts["conversations"] == 1
+        assert counts["messages"] == 2
+        assert counts["touchpoints"] == len(self.campaigns.get_campaign("1")["scheduled_touchpoints"])
+        leads = exporter.read_table("leads")
+        assert leads["property_value"].iloc[0] == 450000.0
+        messages = exporter.read_table("messages")
+        assert list(messages["role"]) == ["user", "assistant"]
+        touchpoints = exporter.read_table("touchpoints")
+        assert str(touchpoints["scheduled_time"].dtype) == "datetime64[us, UTC]"
+
+    def test_incremental_runs_append_only_changes(self, temp_storage_dir):
+        """Later runs only append changed leads, new conversations and sent touchpoints"""
+        exporter = self.setup_stores(temp_storage_dir)
+        exporter.export()
+
+        assert exporter.export() == {"leads": 0, "conversations": 0, "messages": 0, "touchpoints": 0}
+
+        self.leads.update_lead("1", {"cash_out_amount": 75000})
+        self.conversations.save_conversation("1", "Ronnie Yates", [{"role": "user", "content": "Rates?"}], {})
+        self.campaigns.mark_touchpoint_sent("1", 0)
+
+        reopened = AnalyticsExporter(exporter.output_dir, self.leads, self.conversations, self.campaigns)
+        counts = reopened.export()
+
+        assert counts == {"leads": 1, "conversations": 1, "messages": 1, "touchpoints": 1}
+        leads = reopened.read_table("leads")
+        assert list(leads["cash_out_amount"]) == [50000.0, 75000.0]
+        assert reopened.read_table("touchpoints")["event"].tolist().count("sent") == 1
+
+    def test_touchpoints_follow_campaign_events(self, temp_storage_dir):
+        """Later runs read the campaign events instead of scanning every campaign"""
+        exporter = self.setup_stores(temp_storage_dir)
+        exporter.export()
+        self.campaigns.create_campaign("2", "new_lead_cashout", {"name": "Second Lead"})
+        self.campaigns.mark_touchpoint_sent("1", 2)
+        self.campaigns.get_all_campaigns = None     # a rescan would fail
+
+        exporter.export()
+
+        touchpoints = exporter.read_table("touchpoints")
+        added = touchpoints[touchpoints["lead_id"] == "2"]
+        assert len(added) == len(self.campaigns.get_campaign("2")["scheduled_touchpoints"])
+        assert set(added["event"]) == {"scheduled"}
+        sent = touchpoints[touchpoints["event"] == "sent"]
+        assert sent[["lead_id", "touchpoint_index"]].values.tolist() == [["1", 2]]
+        assert sent["sent_at"].notna().all()
+
+    def test_deleted_lead_row(self, temp_storage_dir):
+        """Deleting a lead appends a tombstone row"""
+        exporter = self.setup_stores(temp_storage_dir)
+        exporter.export()
+        self.leads.delete_lead("1")
+
+        exporter.export()
+
+        assert exporter.read_table("leads")["deleted"].tolist() == [False, True]
+
+    def test_failed_run_repeats_lead_changes(self, temp_storage_dir, monkeypatch):
+        """Lead changes stay pending until the run's state is saved"""
+        exporter = self.setup_stores(temp_storage_dir)
+        exporter.export()
+        self.leads.update_lead("1", {"cash_out_amount": 75000})
+
+        def crash():
+            raise OSError("disk full")
+        monkeypatch.setattr(exporter, "_save_state", crash)
+        with pytest.raises(OSError):
+            exporter.export()
+
+        reopened = AnalyticsExporter(exporter.output_dir, self.leads, self.conversations, self.campaigns)
+        assert reopened.export()["leads"] == 1
+        assert list(reopened.read_table("leads")["cash_out_amount"]) == [50000.0, 75000.0]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
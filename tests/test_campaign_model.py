@@ -0,0 +1,110 @@
+"""
+Test Cases for the Campaign Model - Compact records, template catalog and expansion
+"""
+import json
+import os
+from datetime import datetime, timedelta
+import pytest
+import pytz
+from utils.campaign_model import CampaignRecord, TemplateCatalog, pending_touchpoints, touchpoint_counts
+
+
+TZ = pytz.timezone("America/Los_Angeles")
+START = TZ.localize(datetime(2025, 10, 21, 9, 0))
+DEFINITION = [
+    {"day": 1, "type": "SMS", "delay_minutes": 0, "template": "initial_contact"},
+    {"day": 1, "type": "VM", "delay_minutes": 3, "template": "vm1_long_honest"},
+    {"day": 2, "type": "Email", "time": "9:02am", "template": "good_morning"},
+]
+
+
+def make_expanded(lead_id="1", sent=0):
+    """Expanded campaign with its first `sent` touchpoints sent"""
+    times = [START, START + timedelta(minutes=3), TZ.localize(datetime(2025, 10, 22, 9, 2))]
+    touchpoints = [
+        {**touchpoint, "scheduled_time": when.isoformat(), "status": "sent" if i < sent else "pending",
+         "sent_at": (when + timedelta(seconds=i)).replace(tzinfo=None).isoformat() if i < sent else None}
+        for i, (touchpoint, when) in enumerate(zip(DEFINITION, times))
+    ]
+    return {
+        "lead_id": lead_id,
+        "campaign_type": "new_lead_cashout",
+        "status": "active",
+        "created_at": "2025-10-21T09:00:00",
+        "lead_data": {"name": "Ronnie Yates", "timezone": "America/Los_Angeles", "is_veteran": "No"},
+        "scheduled_touchpoints": touchpoints,
+        "completed_touchpoints": [tp for tp in touchpoints if tp["status"] == "sent"],
+        "tags": ["new_lead_cashout"],
+    }
+
+
+class TestCampaignRecord:
+    """Test compacting and expanding campaigns"""
+
+    def test_round_trip(self):
+        """Expanded -> stored -> expanded gives back the same campaign"""
+        catalog = TemplateCatalog()
+        expanded = make_expanded(sent=2)
+        record = CampaignRecord.from_expanded(expanded, catalog)
+
+        stored = json.loads(json.dumps(record.to_dict()))
+        restored = CampaignRecord.from_dict(stored, catalog)
+
+        assert "scheduled_touchpoints" not in stored
+        assert stored["offsets"] == [0, 180, 86520]
+        assert stored["sent"] == "3"
+        expected = {**expanded, "lead_data": {"name": "Ronnie Yates", "timezone": "America/Los_Angeles"}}
+        assert dict(restored) == expected
+
+    def test_definitions_are_shared(self, temp_storage_dir):
+        """Campaigns built from one template reference a single catalogued definition"""
+        path = os.path.join(temp_storage_dir, "templates.json")
+        catalog = TemplateCatalog(path)
+        first = CampaignRecord.from_expanded(make_expanded("1"), catalog)
+        second = CampaignRecord.from_expanded(make_expanded("2", sent=1), catalog)
+
+        assert first.template_version == second.template_version
+        assert first._definition is second._definition
+        assert list(TemplateCatalog(path).definitions) == [f"new_lead_cashout@{first.template_version}"]
+
+    def test_old_template_versions_still_expand(self):
+        """Changing a campaign template does not change campaigns built from the old one"""
+        catalog = TemplateCatalog()
+        old = CampaignRecord.from_expanded(make_expanded("1"), catalog)
+        changed = make_expanded("2")
+        changed["scheduled_touchpoints"][0]["template"] = "initial_contact_v2"
+        new = CampaignRecord.from_expanded(changed, catalog)
+
+        assert old.template_version != new.template_version
+        reloaded = CampaignRecord.from_dict(old.to_dict(), catalog)
+        assert reloaded["scheduled_touchpoints"][0]["template"] == "initial_contact"
+
+    def test_mark_sent_on_copy(self):
+        """Sends update the bitmap of a copy, never the original"""
+        record = CampaignRecord.from_expanded(make_expanded(), TemplateCatalog())
+        updated = record.copy()
+
+        assert updated.mark_sent(2, "2025-10-22T09:02:05")
+        assert updated.mark_sent(0, "2025-10-22T09:03:00")
+        assert not updated.mark_sent(0, "later")
+        assert not updated.mark_sent(7, "later")
+
+        assert [tp["template"] for tp in updated["completed_touchpoints"]] == ["good_morning", "initial_contact"]
+        assert record["completed_touchpoints"] == []
+        assert touchpoint_counts(updated) == (2, 3)
+        assert [index for _, index, _ in pending_touchpoints(updated)] == [1]
+        assert pending_touchpoints(updated)[0][0] == (START + timedelta(minutes=3)).timestamp()
+
+    def test_extra_fields(self):
+        """Keys outside the compact fields are kept and stored"""
+        record = CampaignRecord.from_expanded(make_expanded(), TemplateCatalog())
+        record.update({"responded_at": "2025-10-21T10:00:00"})
+
+        assert record["responded_at"] == "2025-10-21T10:00:00"
+        assert record.to_dict()["responded_at"] == "2025-10-21T10:00:00"
+        del record["responded_at"]
+        assert "responded_at" not in record
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,61 @@
+"""
+Test Cases for the Campaign Simulator - Virtual clock runs and invariant checks
+"""
+import os
+from datetime import datetime
+import pytest
+import pytz
+from utils.campaign_manager import CampaignManager
+from utils.campaign_simulator import CampaignSimulator, VirtualClock
+
+
+class TestVirtualClock:
+    """Test the injectable clock"""
+
+    def test_manager_uses_clock(self, temp_storage_dir):
+        """Campaigns are created and scheduled at the virtual time"""
+        start = pytz.timezone("America/New_York").localize(datetime(2025, 10, 20, 9, 0)).timestamp()
+        clock = VirtualClock(start)
+        manager = CampaignManager(campaigns_file=os.path.join(temp_storage_dir, "campaigns.json"), clock=clock)
+
+        campaign = manager.create_campaign("1", "responded", {"name": "A", "timezone": "America/New_York"})
+        first = datetime.fromisoformat(campaign["scheduled_touchpoints"][0]["scheduled_time"]).timestamp()
+
+        assert campaign["created_at"] == datetime.fromtimestamp(start).isoformat()
+        assert first >= start
+        assert manager.get_pending_touchpoints("1") == []
+        clock.advance_to(first)
+        assert [item["index"] for item in manager.get_pending_touchpoints("1")] == [0]
+
+
+class TestCampaignSimulator:
+    """Test simulated runs"""
+
+    def test_run_keeps_invariants(self, temp_storage_dir):
+        """Sends, replies and pauses over several days leave no violations"""
+        simulator = CampaignSimulator(leads=30, days=4, arrival_days=1, reply_rate=0.05, pause_rate=0.3,
+                                      pause_days=1, step=300, campaigns_file=os.path.join(temp_storage_dir, "c.json"))
+
+        report = simulator.run()
+
+        assert report["violations"] == []
+        assert report["touchpoints_sent"] > 0
+        assert sum(report["campaigns"].values()) == 30
+        assert report["campaigns"].get("stopped", 0) > 0
+        assert report["lag_seconds"]["max"] <= 3600
+        assert [day for day, _ in report["storage"]] == [0, 1, 2, 3, 4]
+        assert report["storage"][-1][1] > report["storage"][0][1]
+
+    def test_check_reports_sends_while_paused(self, temp_storage_dir):
+        """A send during a pause is reported"""
+        simulator = CampaignSimulator(leads=5, days=1, arrival_days=0.1, reply_rate=0, pause_rate=0, step=300,
+                                      campaigns_file=os.path.join(temp_storage_dir, "c.json"))
+        simulator.run()
+        sent_time, lead_id, _, _ = simulator.sender.sent[-1]
+        simulator.inactive[lead_id] = [(sent_time - 60, sent_time + 60)]
+
+        assert any("while paused" in violation for violation in simulator.check())
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
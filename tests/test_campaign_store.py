@@ -0,0 +1,321 @@
+"""
+Test Cases for the Campaign Store - Cached reads, dirty tracking and backends
+"""
+import json
+import multiprocessing
+import os
+import sqlite3
+import pytest
+from utils.campaign_manager import CampaignManager
+from utils.campaign_model import CampaignRecord
+from utils.campaign_store import JsonCampaignStore, SqliteCampaignStore, events_path
+
+
+LEAD = {"name": "Ronnie Yates", "cash_out_amount": 50000}
+
+CONCURRENT_CAMPAIGNS = 60
+
+
+def _append_campaigns(path, prefix):
+    """Worker process: create campaigns one event at a time, snapshotting often"""
+    store = JsonCampaignStore(path, snapshot_every=7)
+    for i in range(CONCURRENT_CAMPAIGNS):
+        lead_id = f"{prefix}{i}"
+        store.append([("created", lead_id, {"lead_id": lead_id, "status": "active", "template_version": None})])
+    store.close()
+
+
+class TestJsonCampaignStore:
+    """Test the JSON file backend"""
+
+    def setup_method(self):
+        """Setup sample campaigns"""
+        self.campaigns = [
+            {"lead_id": "1", "status": "active", "tags": ["new"], "touchpoints": [{"day": 1}]},
+            {"lead_id": "2", "status": "paused", "tags": [], "touchpoints": []},
+        ]
+
+    def test_file_holds_compact_campaigns(self, temp_storage_dir):
+        """Flushed files hold one compact campaign per line and load back equal"""
+        path = os.path.join(temp_storage_dir, "campaigns.json")
+        store = JsonCampaignStore(path)
+        for campaign in self.campaigns:
+            store.put(campaign)
+        store.flush()
+
+        with open(path) as f:
+            lines = f.read().splitlines()
+        assert len(lines) == len(self.campaigns) + 2
+        assert all("template_version" in json.loads(line.split(": ", 1)[1].rstrip(",")) for line in lines[1:-1])
+        assert dict(JsonCampaignStore(path).get("1")) == dict(store.get("1"))
+
+    def test_expanded_files_are_migrated_on_load(self, temp_storage_dir):
+        """Campaigns stored fully expanded are rewritten in the compact format"""
+        path = os.path.join(temp_storage_dir, "campaigns.json")
+        manager = CampaignManager(campaigns_file=path)
+        manager.create_campaign("1", "new_lead_cashout", LEAD)
+        manager.mark_touchpoint_sent("1", 0)
+        expanded = dict(manager.get_campaign("1"))
+        with open(path, 'w') as f:
+            json.dump({"1": expanded}, f, indent=2)
+        before = os.path.getsize(path)
+
+        store = JsonCampaignStore(path)
+
+        assert dict(store.get("1")) == expanded
+        assert os.path.getsize(path) < before / 5
+        with open(path) as f:
+            assert CampaignRecord.is_compact(json.load(f)["1"])
+
+    def test_only_dirty_campaigns_are_encoded(self, temp_storage_dir):
+        """Unchanged campaigns reuse their cached JSON"""
+        store = JsonCampaignStore(os.path.join(temp_storage_dir, "campaigns.json"))
+        for campaign in self.campaigns:
+            store.put(campaign)
+        store.flush()
+        cached = store._encoded["2"]
+
+        store.put({**self.campaigns[0], "status": "stopped"})
+
+        assert store.dirty == {"1"}
+        store.flush()
+        assert store._encoded["2"] is cached
+        assert JsonCampaignStore(store.path).get("1")["status"] == "stopped"
+
+    def test_outside_edits_are_reloaded(self, temp_storage_dir):
+        """A changed mtime/size triggers a reload, an unchanged file does not"""
+        path = os.path.join(temp_storage_dir, "campaigns.json")
+        store = JsonCampaignStore(path)
+        store.put(self.campaigns[0])
+        store.flush()
+
+        assert store.refresh() is False
+
+        with open(path, 'w') as f:
+            json.dump({"9": {"lead_id": "9", "status": "active"}}, f)
+
+        assert store.refresh() is True
+        assert list(store.all()) == ["9"]
+
+
+class TestSqliteCampaignStore:
+    """Test the SQLite backend"""
+
+    def test_rows_and_migration(self, temp_storage_dir):
+        """An empty database imports the JSON file and writes one row per campaign"""
+        json_path = os.path.join(temp_storage_dir, "campaigns.json")
+        with open(json_path, 'w') as f:
+            json.dump({"1": {"lead_id": "1", "status": "active"}}, f)
+        db_path = os.path.join(temp_storage_dir, "campaigns.db")
+
+        store = SqliteCampaignStore(db_path, migrate_from=json_path)
+        store.put({"lead_id": "2", "status": "paused"})
+        store.flush()
+
+        reopened = SqliteCampaignStore(db_path, migrate_from=json_path)
+        assert reopened.get("1")["status"] == "active"
+        assert reopened.get("2")["status"] == "paused"
+
+    def test_other_connections_invalidate(self, temp_storage_dir):
+        """Commits from another connection are picked up on refresh"""
+        db_path = os.path.join(temp_storage_dir, "campaigns.db")
+        store = SqliteCampaignStore(db_path)
+        store.put({"lead_id": "1", "status": "active"})
+        store.flush()
+
+        assert store.refresh() is False
+
+        other = sqlite3.connect(db_path)
+        with other:
+            other.execute("UPDATE campaigns SET campaign = ? WHERE lead_id = '1'", (json.dumps({"lead_id": "1", "status": "stopped"}),))
+        other.close()
+
+        assert store.refresh() is True
+        assert store.get("1")["status"] == "stopped"
+
+    def test_events_since(self, temp_storage_dir):
+        """Events are kept in a table for consumers; pruned ones make them rescan"""
+        store = SqliteCampaignStore(os.path.join(temp_storage_dir, "campaigns.db"), keep_events=2)
+        store.append([("created", "1", {"lead_id": "1", "status": "active", "template_version": None})])
+        store.append([("paused", "1", {"status": "paused"}), ("resumed", "1", {"status": "active"})])
+
+        assert [event["op"] for event in store.events_since(1)] == ["paused", "resumed"]
+        assert store.events_since(3) == []
+        assert store.events_since(0) is None
+
+
+class TestCampaignEventLog:
+    """Test event-sourced writes, snapshots and replay"""
+
+    def setup_method(self):
+        """Setup a sample lead"""
+        self.lead = dict(LEAD)
+
+    def test_writes_append_events(self, temp_storage_dir):
+        """Sends and status changes append to the log instead of rewriting the snapshot"""
+        path = os.path.join(temp_storage_dir, "campaigns.json")
+        manager = CampaignManager(campaigns_file=path)
+        manager.create_campaign("1", "new_lead_cashout", self.lead)
+        snapshot = os.stat(path) if os.path.exists(path) else None
+
+        assert manager.mark_touchpoints_sent([("1", 0), ("1", 1), ("1", 0)]) == 2
+        manager.update_campaign_status("1", "paused")
+
+        assert (os.stat(path) if os.path.exists(path) else None) == snapshot
+        with open(events_path(path)) as f:
+            assert [json.loads(line)["op"] for line in f] == ["created", "touchpoint_sent", "touchpoint_sent", "paused"]
+
+        campaign = CampaignManager(campaigns_file=path).get_campaign("1")
+        assert campaign["status"] == "paused"
+        assert len(campaign["completed_touchpoints"]) == 2
+
+    def test_snapshots_truncate_the_log(self, temp_storage_dir):
+        """Every snapshot_every events the projection is written and the log restarts"""
+        path = os.path.join(temp_storage_dir, "campaigns.json")
+        store = JsonCampaignStore(path, snapshot_every=3)
+        store.append([("created", "1", {"lead_id": "1", "status": "active", "template_version": None})])
+        store.append([("paused", "1", {"status": "paused"}), ("resumed", "1", {"status": "active"})])
+
+        assert os.path.getsize(events_path(path)) == 0
+        with open(path) as f:
+            assert json.load(f)["1"]["status"] == "active"
+
+        store.append([("stopped", "1", {"status": "stopped"})])
+        assert JsonCampaignStore(path).get("1")["status"] == "stopped"
+
+    def test_batch_swaps_dict_once(self, temp_storage_dir):
+        """A batch of new campaigns swaps in one new dict; held snapshots are unchanged"""
+        store = JsonCampaignStore(os.path.join(temp_storage_dir, "campaigns.json"))
+        before = store.all()
+
+        store.append([("created", str(i), {"lead_id": str(i), "status": "active", "template_version": None})
+                      for i in range(3)] + [("paused", "1", {"status": "paused"})])
+
+        assert before == {}
+        assert list(store.all()) == ["0", "1", "2"]
+        assert store.get("1")["status"] == "paused"
+
+    def test_events_since_spans_snapshots(self, temp_storage_dir):
+        """Sequence numbers continue after a snapshot and the previous log is still read"""
+        path = os.path.join(temp_storage_dir, "campaigns.json")
+        store = JsonCampaignStore(path, snapshot_every=3)
+        store.append([("created", "1", {"lead_id": "1", "status": "active", "template_version": None})])
+        store.append([("paused", "1", {"status": "paused"}), ("resumed", "1", {"status": "active"})])
+        store.append([("stopped", "1", {"status": "stopped"})])
+
+        reopened = JsonCampaignStore(path)
+        assert reopened.seq == 4
+        assert [event["seq"] for event in reopened.events_since(1)] == [2, 3, 4]
+        assert reopened.events_since(4) == []
+
+        reopened.append([("paused", "1", {"status": "paused"})] * 3)
+        reopened.snapshot()
+        # The first events went with the log before the previous one
+        assert reopened.events_since(1) is None
+        assert [event["seq"] for event in reopened.events_since(4)] == [5, 6, 7]
+
+    def test_crash_recovery(self, temp_storage_dir):
+        """A torn last event is dropped and events a snapshot already holds replay harmlessly"""
+        path = os.path.join(temp_storage_dir, "campaigns.json")
+        store = JsonCampaignStore(path)
+        store.append([("created", "1", {"lead_id": "1", "status": "active", "tags": ["new"], "template_version": None})])
+        store.append([("stopped", "1", {"status": "stopped", "tags": ["new", "responded"]})])
+        with open(events_path(path)) as f:
+            log = f.read()
+        store.snapshot()
+        # Crash between writing the snapshot and truncating the log, mid-append
+        with open(events_path(path), 'w') as f:
+            f.write(log + '{"seq":3,"op":"resu')
+
+        recovered = JsonCampaignStore(path)
+        recovered.append([("paused", "1", {"status": "paused"})])
+
+        campaign = JsonCampaignStore(path).get("1")
+        assert campaign["status"] == "paused"
+        assert campaign["tags"] == ["new", "responded"]
+
+    def test_long_torn_event_is_dropped(self, temp_storage_dir):
+        """A torn event longer than the scan chunk is cut back to the previous complete event"""
+        path = os.path.join(temp_storage_dir, "campaigns.json")
+        store = JsonCampaignStore(path)
+        store.append([("created", "1", {"lead_id": "1", "status": "active", "template_version": None})])
+        with open(events_path(path), 'a') as f:
+            f.write('{"seq":2,"op":"lead_updated","changes":{"notes":"' + "x" * 200000)
+
+        assert JsonCampaignStore(path).get("1")["status"] == "active"
+        with open(events_path(path)) as f:
+            assert [json.loads(line)["op"] for line in f] == ["created"]
+
+    def test_other_processes_see_events(self, temp_storage_dir):
+        """Events appended by another store are picked up on refresh"""
+        path = os.path.join(temp_storage_dir, "campaigns.json")
+        app = CampaignManager(campaigns_file=path)
+        app.create_campaign("1", "new_lead_cashout", self.lead)
+        dispatcher = CampaignManager(campaigns_file=path)
+
+        dispatcher.mark_touchpoint_sent("1", 0)
+
+        assert app.get_campaign("1")["scheduled_touchpoints"][0]["status"] == "pending"
+        assert app.refresh() is True
+        assert app.get_campaign("1")["scheduled_touchpoints"][0]["status"] == "sent"
+        assert app.refresh() is False
+
+    def test_concurrent_processes_lose_no_events(self, temp_storage_dir):
+        """Two processes appending and snapshotting the same files keep every event"""
+        path = os.path.join(temp_storage_dir, "campaigns.json")
+        JsonCampaignStore(path).close()
+        context = multiprocessing.get_context("fork")
+        workers = [context.Process(target=_append_campaigns, args=(path, prefix)) for prefix in "ab"]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        assert len(JsonCampaignStore(path).all()) == 2 * CONCURRENT_CAMPAIGNS
+
+
+class TestCachedCampaignManager:
+    """Test CampaignManager on top of the stores"""
+
+    @pytest.mark.parametrize("backend", ["json", "sqlite"])
+    def test_reads_do_not_reparse(self, temp_storage_dir, backend, monkeypatch):
+        """Lookups are served from memory and writes persist across instances"""
+        path = os.path.join(temp_storage_dir, "campaigns.json")
+        manager = CampaignManager(campaigns_file=path, backend=backend)
+        manager.create_campaign("1", "new_lead_cashout", LEAD)
+        monkeypatch.setattr(json, "load", lambda *args, **kwargs: pytest.fail("campaigns re-parsed"))
+
+        monkeypatch.setattr(manager.store, "refresh", lambda: pytest.fail("store refreshed on a read"))
+
+        for _ in range(10):
+            assert manager.get_campaign("1")["status"] == "active"
+            assert "1" in manager.get_all_campaigns()
+        monkeypatch.undo()
+
+        manager.mark_touchpoint_sent("1", 0)
+        manager.update_campaign_status("1", "paused")
+
+        reopened = CampaignManager(campaigns_file=path, backend=backend)
+        campaign = reopened.get_campaign("1")
+        assert campaign["status"] == "paused"
+        assert campaign["scheduled_touchpoints"][0]["status"] == "sent"
+
+    def test_returned_campaigns_are_not_mutated(self, temp_storage_dir):
+        """Writes replace a campaign instead of modifying a dict a reader holds"""
+        manager = CampaignManager(campaigns_file=os.path.join(temp_storage_dir, "campaigns.json"))
+        manager.create_campaign("1", "new_lead_cashout", LEAD)
+        before = manager.get_campaign("1")
+
+        manager.update_campaign_status("1", "stopped", ["responded"])
+
+        assert before["status"] == "active"
+        assert manager.get_campaign("1")["status"] == "stopped"
+
+    def test_unknown_backend(self, temp_storage_dir):
+        """Unknown backends are rejected"""
+        with pytest.raises(ValueError):
+            CampaignManager(campaigns_file=os.path.join(temp_storage_dir, "c.json"), backend="redis")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
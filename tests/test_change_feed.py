@@ -0,0 +1,98 @@
+"""
+Test Cases for the Lead Change Feed - Events, diffs and checkpointed consumers
+"""
+import os
+import pytest
+from utils.campaign_manager import CampaignManager
+from utils.change_feed import ChangeFeed, ChangeFeedConsumer, diff_fields
+from utils.lead_manager import LeadDataManager
+
+
+class TestChangeFeed:
+    """Test the append-only event log"""
+
+    def test_diff_fields(self):
+        """Only changed fields appear in the diff"""
+        diff = diff_fields({"a": 1, "b": 2}, {"a": 1, "b": 3, "c": 4})
+
+        assert diff == {"b": [2, 3], "c": [None, 4]}
+
+    def test_sequence_numbers_survive_reopen(self, temp_storage_dir):
+        """Sequence numbers keep increasing across restarts"""
+        path = os.path.join(temp_storage_dir, "feed.jsonl")
+        feed = ChangeFeed(path)
+        feed.append("add", "1", {})
+        feed.append("update", "1", {"x": [1, 2]})
+
+        reopened = ChangeFeed(path)
+
+        assert reopened.last_seq == 2
+        assert reopened.append("delete", "1", {})["seq"] == 3
+        assert [e["seq"] for e in reopened.read(since_seq=1)] == [2, 3]
+
+    def test_append_many(self, temp_storage_dir):
+        """A batch gets consecutive sequence numbers"""
+        feed = ChangeFeed(os.path.join(temp_storage_dir, "feed.jsonl"))
+        feed.append("add", "1", {})
+
+        events = feed.append_many([("update", "1", {"x": [1, 2]}), ("delete", "1", {})])
+
+        assert [e["seq"] for e in events] == [2, 3]
+        assert [e["op"] for e in feed.read()] == ["add", "update", "delete"]
+
+
+class TestLeadManagerFeed:
+    """Test change capture in LeadDataManager"""
+
+    def setup_method(self):
+        """Setup names used by the tests"""
+        self.lead = {"lead_id": "1", "name": "Ronnie Yates", "cash_out_amount": 10000, "current_balance": 145000}
+
+    def test_update_emits_field_diff(self, temp_storage_dir):
+        """Updating cash out records old and new values"""
+        manager = LeadDataManager(data_file=os.path.join(temp_storage_dir, "leads.json"))
+        manager.add_lead(dict(self.lead))
+        manager.update_lead("1", {"cash_out_amount": 25000})
+        manager.update_lead("1", {"cash_out_amount": 25000})  # no-op, no event
+        manager.delete_lead("1")
+
+        events = manager.change_feed.read()
+
+        assert [e["op"] for e in events] == ["add", "update", "delete"]
+        assert events[1]["changes"] == {"cash_out_amount": [10000, 25000]}
+        assert events[2]["changes"]["name"] == ["Ronnie Yates", None]
+
+    def test_consumer_tails_from_checkpoint(self, temp_storage_dir):
+        """Consumers only see events after their committed checkpoint"""
+        manager = LeadDataManager(data_file=os.path.join(temp_storage_dir, "leads.json"))
+        manager.add_lead(dict(self.lead))
+        consumer = ChangeFeedConsumer(manager.change_feed, "test")
+
+        assert len(consumer.poll()) == 1
+        consumer.commit()
+        manager.update_lead("1", {"current_balance": 140000})
+
+        restarted = ChangeFeedConsumer(manager.change_feed, "test")
+        events = restarted.poll()
+
+        assert [e["op"] for e in events] == ["update"]
+        assert restarted.lag() == 1
+        restarted.commit()
+        assert restarted.lag() == 0
+
+    def test_campaign_lead_data_synced(self, temp_storage_dir):
+        """Campaigns pick up lead changes from the feed"""
+        manager = LeadDataManager(data_file=os.path.join(temp_storage_dir, "leads.json"))
+        campaigns = CampaignManager(campaigns_file=os.path.join(temp_storage_dir, "campaigns.json"))
+        consumer = ChangeFeedConsumer(manager.change_feed, "campaigns")
+        manager.add_lead(dict(self.lead))
+        campaigns.create_campaign("1", "new_lead_cashout", manager.get_lead("1"))
+        manager.update_lead("1", {"cash_out_amount": 50000})
+
+        assert campaigns.sync_lead_changes(consumer) == 1
+        assert campaigns.get_campaign("1")["lead_data"]["cash_out_amount"] == 50000
+        assert campaigns.sync_lead_changes(consumer) == 0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
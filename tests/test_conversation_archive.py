@@ -0,0 +1,150 @@
+"""
+Test Cases for the Conversation Archive - Monthly partitions, lazy loading and retention
+"""
+import json
+import os
+from datetime import datetime
+import pytest
+from utils.conversation_archive import month_from_id, month_of, months_back
+from utils.conversation_manager import ConversationManager
+from utils.conversation_search import ConversationSearch
+
+
+class TestPartitionKeys:
+    """Test month keys"""
+
+    def test_month_helpers(self):
+        """Timestamps, IDs and month arithmetic map to YYYY-MM keys"""
+        assert month_of("2025-10-28T18:16:00") == "2025-10"
+        assert month_of("") is None
+        assert month_from_id("conv_20250712_101500_36391862") == "2025-07"
+        assert month_from_id("conv_unknown") is None
+        assert months_back(datetime(2026, 2, 15), 2) == "2025-12"
+
+
+class TestArchiving:
+    """Test moving cold months out of the hot log"""
+
+    def setup_method(self):
+        """Setup a sample chat"""
+        self.messages = [{"role": "user", "content": "Can I consolidate my car loan?"}]
+
+    def make_manager(self, temp_storage_dir, **kwargs):
+        """Manager with three saved conversations"""
+        manager = ConversationManager(data_file=os.path.join(temp_storage_dir, "conversations.json"), **kwargs)
+        self.ids = [
+            manager.save_conversation(lead_id, name, self.messages, {"property_value": 400000}, proposal)
+            for lead_id, name, proposal in (("1", "Ronnie", True), ("2", "Dana", False), ("1", "Ronnie", False))
+        ]
+        return manager
+
+    def test_cold_months_leave_the_hot_set(self, temp_storage_dir):
+        """Archived conversations are no longer loaded at startup but still found"""
+        manager = self.make_manager(temp_storage_dir)
+        later = datetime.now().replace(year=datetime.now().year + 1)
+
+        assert manager.archive_old_conversations(now=later) == 3
+        assert manager.get_all_conversations() == []
+        assert len(manager.log) == 0
+
+        manager.log.close()
+        reopened = ConversationManager(data_file=os.path.join(temp_storage_dir, "conversations.json"))
+
+        assert reopened.get_all_conversations() == []
+        assert len(reopened.get_all_conversations(include_archived=True)) == 3
+        assert reopened.get_conversation_by_id(self.ids[1])["lead_name"] == "Dana"
+        assert reopened.load_body(self.ids[0])["messages"] == self.messages
+        assert [c["conversation_id"] for c in reopened.get_conversations_by_lead("1")] == [self.ids[0], self.ids[2]]
+
+    def test_ids_without_their_month_are_found(self, temp_storage_dir):
+        """Archived records whose ID does not encode the timestamp's month stay reachable"""
+        data_file = os.path.join(temp_storage_dir, "conversations.json")
+        with open(data_file, 'w') as f:
+            json.dump([{"conversation_id": "conv_unknown", "lead_id": "7", "timestamp": "2023-05-02T10:00:00",
+                        "messages": self.messages},
+                       {"conversation_id": "conv_20230101_000000_8", "lead_id": "8", "timestamp": "2023-02-03T10:00:00",
+                        "messages": self.messages}], f)
+        ConversationManager(data_file=data_file).log.close()
+
+        manager = ConversationManager(data_file=data_file)
+
+        assert manager.archive.months() == ["2023-02", "2023-05"]
+        assert manager.get_conversation_by_id("conv_unknown")["lead_id"] == "7"
+        assert manager.load_body("conv_20230101_000000_8")["messages"] == self.messages
+        exported = json.loads(manager.export_to_json(["conv_unknown", "conv_20230101_000000_8"]))
+        assert [c["conversation_id"] for c in exported] == ["conv_20230101_000000_8", "conv_unknown"]
+
+    def test_manifest_without_ids_is_upgraded(self, temp_storage_dir):
+        """Partitions from manifests written before the ID map are scanned once on load"""
+        data_file = os.path.join(temp_storage_dir, "conversations.json")
+        with open(data_file, 'w') as f:
+            json.dump([{"conversation_id": "conv_unknown", "lead_id": "7", "timestamp": "2023-05-02T10:00:00",
+                        "messages": self.messages}], f)
+        manager = ConversationManager(data_file=data_file)
+        manager.log.close()
+        with open(manager.archive.manifest_file) as f:
+            manifest = json.load(f)
+        del manifest["partitions"]["2023-05"]["ids"]
+        with open(manager.archive.manifest_file, 'w') as f:
+            json.dump(manifest, f)
+
+        assert ConversationManager(data_file=data_file).get_conversation_by_id("conv_unknown")["lead_id"] == "7"
+
+    def test_restored_legacy_file_not_reimported(self, temp_storage_dir):
+        """A legacy file reappearing after everything was archived is not migrated again"""
+        manager = self.make_manager(temp_storage_dir)
+        manager.archive_old_conversations(now=datetime.now().replace(year=datetime.now().year + 1))
+        manager.log.close()
+        with open(os.path.join(temp_storage_dir, "conversations.json"), 'w') as f:
+            json.dump([{"conversation_id": "conv_restored", "lead_id": "9", "messages": self.messages}], f)
+
+        reopened = ConversationManager(data_file=os.path.join(temp_storage_dir, "conversations.json"))
+
+        assert reopened.get_all_conversations() == []
+        assert len(reopened.get_all_conversations(include_archived=True)) == 3
+
+    def test_queries_span_partitions(self, temp_storage_dir):
+        """Statistics and exports cover archived and hot conversations"""
+        manager = self.make_manager(temp_storage_dir)
+        manager.archive_old_conversations(now=datetime.now().replace(year=datetime.now().year + 1))
+        hot_id = manager.save_conversation("3", "Peter", self.messages, {})
+
+        stats = manager.get_statistics()
+
+        assert stats["total_conversations"] == 4
+        assert stats["with_proposals"] == 1
+        assert [c["conversation_id"] for c in json.loads(manager.export_to_json())] == self.ids + [hot_id]
+        assert [c["conversation_id"] for c in json.loads(manager.export_to_json([hot_id, self.ids[1]]))] == [self.ids[1], hot_id]
+        assert manager.export_to_csv().count("Ronnie") == 2
+
+    def test_search_covers_archived(self, temp_storage_dir):
+        """Archived months stay searchable until retention drops them"""
+        manager = self.make_manager(temp_storage_dir, retention_months=15)
+        search = ConversationSearch()
+        search.attach(manager)
+        assert len(search.search("car loan")) == 3
+
+        manager.archive_old_conversations(now=datetime.now().replace(year=datetime.now().year + 1))
+        hits = search.search("car loan")
+        assert len(hits) == 3
+        assert hits[0]["snippet"] == "Can I consolidate my car loan?"
+
+        manager.archive_old_conversations(now=datetime.now().replace(year=datetime.now().year + 2))
+        assert search.search("car loan") == []
+
+    def test_retention(self, temp_storage_dir):
+        """Partitions past the retention window are deleted"""
+        manager = self.make_manager(temp_storage_dir, hot_months=1, retention_months=2)
+        manager.archive_old_conversations(now=datetime.now().replace(year=datetime.now().year + 1))
+
+        assert manager.archive.months() == []
+        assert manager.get_statistics()["total_conversations"] == 0
+
+    def test_invalid_policy(self, temp_storage_dir):
+        """Retention shorter than the hot window is rejected"""
+        with pytest.raises(ValueError):
+            ConversationManager(data_file=os.path.join(temp_storage_dir, "c.json"), hot_months=3, retention_months=2)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,365 @@
+"""
+Test Cases for the Conversation Log - Append-only JSONL storage, migration and compaction
+"""
+import json
+import os
+import pytest
+from utils.conversation_manager import CONVERSATION_FIELDS, ConversationManager
+from utils.jsonl_store import JsonlStore
+
+
+class TestJsonlStore:
+    """Test the append-only keyed store"""
+
+    def test_put_get_reopen(self, temp_storage_dir):
+        """Latest record wins and the index is rebuilt on reopen"""
+        path = os.path.join(temp_storage_dir, "store.jsonl")
+        store = JsonlStore(path)
+        store.put("a", {"n": 1})
+        store.put("b", {"n": 2})
+        store.put("a", {"n": 3})
+        store.delete("b")
+        store.close()
+
+        reopened = JsonlStore(path)
+
+        assert reopened.get("a") == {"n": 3}
+        assert "b" not in reopened
+        assert reopened.dead_records == 3
+
+    def test_torn_tail_is_repaired(self, temp_storage_dir):
+        """A partially written last line is dropped before the next append"""
+        path = os.path.join(temp_storage_dir, "store.jsonl")
+        store = JsonlStore(path)
+        store.put("a", 1)
+        store.close()
+        with open(path, 'a') as f:
+            f.write('{"key":"b","val')
+
+        reopened = JsonlStore(path)
+        reopened.put("c", 3)
+        reopened.close()
+
+        assert dict(JsonlStore(path).items()) == {"a": 1, "c": 3}
+
+    def test_compaction(self, temp_storage_dir):
+        """Compaction keeps only live records"""
+        path = os.path.join(temp_storage_dir, "store.jsonl")
+        store = JsonlStore(path, compact_ratio=0.5)
+        for i in range(4):
+            store.put("a", i)
+        store.put("b", "x")
+
+        assert store.maybe_compact()
+        assert dict(store.items()) == {"a": 3, "b": "x"}
+        with open(path) as f:
+            assert len(f.readlines()) == 2
+
+    def test_saved_index_skips_the_scan(self, temp_storage_dir):
+        """A saved index is used and only later lines are scanned; a rewritten file is rescanned"""
+        path = os.path.join(temp_storage_dir, "store.jsonl")
+        store = JsonlStore(path)
+        store.put("a", 1)
+        store.put("b", 2)
+        state = store.index_state()
+        store.delete("a")
+        store.put("c", 3)
+        store.close()
+
+        reopened = JsonlStore(path, index_state=state)
+        assert reopened.restored_size == state["size"]
+        assert list(reopened.records_from(reopened.restored_size)) == [("a", None), ("c", 3)]
+        assert dict(reopened.items()) == {"b": 2, "c": 3}
+
+        reopened.compact()
+        rescanned = JsonlStore(path, index_state=state)
+        assert rescanned.restored_size == 0
+        assert dict(rescanned.items()) == {"b": 2, "c": 3}
+
+    def test_invalid_fsync_policy(self, temp_storage_dir):
+        """Unknown fsync policies are rejected"""
+        with pytest.raises(ValueError):
+            JsonlStore(os.path.join(temp_storage_dir, "store.jsonl"), fsync="sometimes")
+
+
+class TestConversationLog:
+    """Test ConversationManager on top of the log"""
+
+    def setup_method(self):
+        """Setup a sample chat"""
+        self.messages = [
+            {"role": "user", "content": "I want to pull out 50k"},
+            {"role": "assistant", "content": "Let's look at your equity."},
+        ]
+
+    def test_save_appends_and_reloads(self, temp_storage_dir):
+        """Saved conversations survive a restart"""
+        data_file = os.path.join(temp_storage_dir, "conversations.json")
+        manager = ConversationManager(data_file=data_file, fsync="always")
+        conv_id = manager.save_conversation("1", "Ronnie Yates", self.messages, {"cash_out_amount": 50000})
+        manager.log.close()
+
+        reloaded = ConversationManager(data_file=data_file)
+
+        assert reloaded.get_conversation_by_id(conv_id)["messages"] == self.messages
+        assert not os.path.exists(data_file)
+
+    def test_ids_unique_within_same_second(self, temp_storage_dir):
+        """Two saves for the same lead in the same second get distinct IDs"""
+        manager = ConversationManager(data_file=os.path.join(temp_storage_dir, "conversations.json"))
+
+        ids = {manager.save_conversation("1", "Ronnie", self.messages, {}) for _ in range(3)}
+
+        assert len(ids) == 3
+
+    def test_legacy_json_migrated(self, temp_storage_dir):
+        """An existing conversations.json is imported into the log once"""
+        data_file = os.path.join(temp_storage_dir, "conversations.json")
+        legacy = [{"conversation_id": "conv_old", "lead_id": "7", "messages": self.messages}]
+        with open(data_file, 'w') as f:
+            json.dump(legacy, f)
+
+        manager = ConversationManager(data_file=data_file)
+        manager.save_conversation("8", "New", self.messages, {})
+        manager.log.close()
+
+        reloaded = ConversationManager(data_file=data_file)
+
+        assert [c["lead_id"] for c in reloaded.get_all_conversations()] == ["7", "8"]
+
+    def test_legacy_json_migrated_only_once(self, temp_storage_dir):
+        """Deleted legacy conversations stay deleted after the log empties and restarts"""
+        data_file = os.path.join(temp_storage_dir, "conversations.json")
+        with open(data_file, 'w') as f:
+            json.dump([{"conversation_id": "conv_old", "lead_id": "7", "messages": self.messages}], f)
+
+        manager = ConversationManager(data_file=data_file)
+        assert manager.delete_conversation("conv_old")
+        manager.log.close()
+
+        assert ConversationManager(data_file=data_file).get_all_conversations() == []
+        assert os.path.exists(f"{data_file}.migrated")
+
+    def test_delete(self, temp_storage_dir):
+        """Deleted conversations are gone after a restart"""
+        data_file = os.path.join(temp_storage_dir, "conversations.json")
+        manager = ConversationManager(data_file=data_file)
+        conv_id = manager.save_conversation("1", "Ronnie", self.messages, {})
+
+        assert manager.delete_conversation(conv_id)
+        assert not manager.delete_conversation(conv_id)
+        manager.log.close()
+        assert ConversationManager(data_file=data_file).get_all_conversations() == []
+
+    def test_restart_reads_saved_index(self, temp_storage_dir, monkeypatch):
+        """A restart loads the saved metadata and replays only the records appended since"""
+        data_file = os.path.join(temp_storage_dir, "conversations.json")
+        manager = ConversationManager(data_file=data_file)
+        kept = [manager.save_conversation(str(i), "Ronnie", self.messages, {}) for i in range(3)]
+        deleted = manager.save_conversation("9", "Gone", self.messages, {})
+        manager.save_index()
+        manager.delete_conversation(deleted)
+        added = manager.save_conversation("10", "Later", self.messages, {})
+        manager.log.close()
+        monkeypatch.setattr(JsonlStore, "items", lambda store: pytest.fail("whole log decoded"))
+
+        reloaded = ConversationManager(data_file=data_file)
+
+        assert [c["conversation_id"] for c in reloaded.get_all_conversations()] == kept + [added]
+        assert reloaded.get_conversation_by_id(added)["messages"] == self.messages
+
+
+class TestConversationIndexes:
+    """Test the conversation_id and lead_id indexes"""
+
+    def test_lookups(self, temp_storage_dir):
+        """ID and lead lookups use the indexes and follow deletes"""
+        manager = ConversationManager(data_file=os.path.join(temp_storage_dir, "conversations.json"))
+        first = manager.save_conversation("1", "Ronnie", [], {})
+        manager.save_conversation("2", "Dana", [], {})
+        second = manager.save_conversation("1", "Ronnie", [], {})
+
+        assert manager.get_conversation_by_id(second)["lead_id"] == "1"
+        assert [c["conversation_id"] for c in manager.get_conversations_by_lead("1")] == [first, second]
+
+        manager.delete_conversation(first)
+
+        assert manager.get_conversation_by_id(first) is None
+        assert [c["conversation_id"] for c in manager.get_conversations_by_lead("1")] == [second]
+
+    def test_export_filter_keeps_history_order(self, temp_storage_dir):
+        """Filtered exports return the selected conversations in history order"""
+        manager = ConversationManager(data_file=os.path.join(temp_storage_dir, "conversations.json"))
+        ids = [manager.save_conversation(str(i), f"Lead {i}", [], {}) for i in range(4)]
+
+        exported = json.loads(manager.export_to_json([ids[3], ids[1], "missing"]))
+
+        assert [c["conversation_id"] for c in exported] == [ids[1], ids[3]]
+
+
+class TestLazyBodies:
+    """Test the metadata/body split"""
+
+    def setup_method(self):
+        """Setup a sample chat"""
+        self.messages = [{"role": "user", "content": "What rate can I get? " * 20}]
+        self.lead_data = {"property_value": 450000, "cash_out_amount": 60000, "notes": "call after 5"}
+
+    def test_metadata_only_in_memory(self, temp_storage_dir):
+        """Listings hold metadata and a lead summary, bodies load on demand"""
+        manager = ConversationManager(data_file=os.path.join(temp_storage_dir, "conversations.json"))
+        conv_id = manager.save_conversation("1", "Ronnie", self.messages, self.lead_data)
+
+        listed = manager.get_all_conversations()[0]
+
+        assert "messages" not in listed
+        assert listed["lead_summary"] == {"property_value": 450000, "cash_out_amount": 60000}
+        assert manager.load_body(conv_id) == {"messages": self.messages, "lead_data": self.lead_data}
+        assert list(manager.get_conversation_by_id(conv_id)) == list(CONVERSATION_FIELDS)
+        assert "450000,60000" in manager.export_to_csv()
+
+    def test_full_records_in_log_are_split(self, temp_storage_dir):
+        """A log written before the split is converted on startup"""
+        data_file = os.path.join(temp_storage_dir, "conversations.json")
+        log = JsonlStore(os.path.join(temp_storage_dir, "conversations.jsonl"))
+        log.put("conv_1", {"conversation_id": "conv_1", "lead_id": "1", "messages": self.messages, "lead_data": {}})
+        log.close()
+
+        manager = ConversationManager(data_file=data_file)
+
+        assert "body" in manager.log.get("conv_1")
+        assert manager.load_body("conv_1")["messages"] == self.messages
+
+    def test_compact_moves_bodies(self, temp_storage_dir):
+        """Compaction drops deleted bodies and keeps the rest readable"""
+        data_file = os.path.join(temp_storage_dir, "conversations.json")
+        manager = ConversationManager(data_file=data_file)
+        doomed = manager.save_conversation("1", "Ronnie", self.messages, {})
+        kept = manager.save_conversation("2", "Dana", [{"role": "user", "content": "hi"}], {})
+        manager.delete_conversation(doomed)
+        size = manager.bodies.size()
+
+        manager.compact()
+
+        assert manager.bodies.size() < size
+        assert manager.load_body(kept)["messages"][0]["content"] == "hi"
+        manager.log.close()
+        assert ConversationManager(data_file=data_file).load_body(kept)["messages"][0]["content"] == "hi"
+
+
+class TestSessionDeltas:
+    """Test session-scoped delta persistence"""
+
+    def setup_method(self):
+        """Setup a growing chat"""
+        self.messages = [{"role": "user" if i % 2 else "assistant", "content": f"message {i} " * 30} for i in range(6)]
+
+    def test_resave_appends_only_new_messages(self, temp_storage_dir):
+        """A second save of the session references the first save's messages"""
+        manager = ConversationManager(data_file=os.path.join(temp_storage_dir, "conversations.json"))
+        first = manager.save_conversation("1", "Ronnie", self.messages[:4], {"a": 1}, session_id="s1")
+        second = manager.save_conversation("1", "Ronnie", self.messages, {"a": 1}, True, session_id="s1")
+
+        segments = manager.by_id[second]["segments"]
+
+        assert segments[0] == manager.by_id[first]["segments"][0]
+        assert segments[1][3] == 2
+        assert manager.by_id[second]["body"] == manager.by_id[first]["body"]
+        assert manager.load_body(first)["messages"] == self.messages[:4]
+        assert manager.load_body(second)["messages"] == self.messages
+
+    def test_diverged_history_reuses_common_prefix(self, temp_storage_dir):
+        """Only the shared prefix is referenced when the chat was changed"""
+        manager = ConversationManager(data_file=os.path.join(temp_storage_dir, "conversations.json"))
+        manager.save_conversation("1", "Ronnie", self.messages[:4], {}, session_id="s1")
+        edited = self.messages[:2] + [{"role": "user", "content": "start over"}]
+        conv_id = manager.save_conversation("1", "Ronnie", edited, {}, session_id="s1")
+
+        assert manager.by_id[conv_id]["segments"][0][3] == 2
+        assert manager.load_body(conv_id)["messages"] == edited
+
+    def test_shared_segments_survive_compaction_and_reload(self, temp_storage_dir):
+        """Compaction keeps blobs still referenced by another snapshot"""
+        data_file = os.path.join(temp_storage_dir, "conversations.json")
+        manager = ConversationManager(data_file=data_file)
+        first = manager.save_conversation("1", "Ronnie", self.messages[:3], {}, session_id="s1")
+        second = manager.save_conversation("1", "Ronnie", self.messages, {}, session_id="s1")
+        manager.delete_conversation(first)
+        manager.compact()
+        manager.log.close()
+
+        reloaded = ConversationManager(data_file=data_file)
+
+        assert reloaded.load_body(second)["messages"] == self.messages
+        assert reloaded.get_conversation_by_id(second)["session_id"] == "s1"
+        assert "segments" not in json.loads(reloaded.export_to_json())[0]
+
+
+class TestRunningStatistics:
+    """Test the incrementally maintained statistics"""
+
+    def test_matches_full_rebuild(self, temp_storage_dir):
+        """Running aggregates equal a full recomputation after saves and deletes"""
+        manager = ConversationManager(data_file=os.path.join(temp_storage_dir, "conversations.json"))
+        manager.save_conversation("1", "Ronnie", [{}] * 4, {}, proposal_generated=True)
+        doomed = manager.save_conversation("2", "Dana", [{}] * 2, {})
+        manager.save_conversation("3", "Peter", [{}] * 1, {})
+        manager.delete_conversation(doomed)
+
+        stats = manager.get_statistics()
+
+        assert stats["total_conversations"] == 2
+        assert stats["with_proposals"] == 1
+        assert stats["avg_messages_per_conversation"] == 2.5
+        assert sum(stats["conversations_by_date"].values()) == 2
+        running = json.loads(json.dumps(manager.stats))
+        assert manager.rebuild_statistics() == running
+
+    def test_persisted_and_validated(self, temp_storage_dir):
+        """Statistics are reloaded from disk, and rebuilt if they are stale"""
+        data_file = os.path.join(temp_storage_dir, "conversations.json")
+        manager = ConversationManager(data_file=data_file)
+        manager.save_conversation("1", "Ronnie", [{}] * 3, {})
+        manager.log.close()
+
+        assert ConversationManager(data_file=data_file).get_statistics()["total_conversations"] == 1
+
+        with open(manager.stats_file, 'w') as f:
+            json.dump({"total": 99}, f)
+
+        assert ConversationManager(data_file=data_file).get_statistics()["avg_messages_per_conversation"] == 3
+
+
+class TestStreamingExports:
+    """Test the chunked JSON/CSV exporters"""
+
+    def test_chunks_match_full_export(self, temp_storage_dir):
+        """Chunked output joins to the same document whatever the chunk size"""
+        manager = ConversationManager(data_file=os.path.join(temp_storage_dir, "conversations.json"))
+        for i in range(5):
+            manager.save_conversation(str(i), f"Lead {i}", [{"role": "user", "content": "line\nbreak"}], {"property_value": i})
+
+        expected = json.dumps([manager.get_conversation_by_id(c["conversation_id"]) for c in manager.get_all_conversations()], indent=2)
+
+        for chunk_size in (1, 2, 5, 50):
+            assert "".join(manager.iter_json(chunk_size=chunk_size)) == expected
+        assert len(list(manager.iter_csv(chunk_size=2))) == 3
+        assert manager.export_to_csv().count("\n") == 6
+
+    def test_write_export(self, temp_storage_dir):
+        """Exports stream straight into a file"""
+        manager = ConversationManager(data_file=os.path.join(temp_storage_dir, "conversations.json"))
+        manager.save_conversation("1", "Ronnie", [], {})
+        path = os.path.join(temp_storage_dir, "export.json")
+
+        with open(path, 'w') as f:
+            manager.write_export(f, "json")
+
+        with open(path) as f:
+            assert json.load(f)[0]["lead_id"] == "1"
+        with pytest.raises(ValueError):
+            manager.write_export(None, "xml")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
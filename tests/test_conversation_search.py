@@ -0,0 +1,104 @@
+"""
+Test Cases for Conversation Search - Tokenization, phrases, role filters and ranking
+"""
+import os
+import pytest
+from utils.conversation_manager import ConversationManager
+from utils.conversation_search import ConversationSearch, make_snippet, parse_query, tokenize
+
+
+class TestQueryParsing:
+    """Test tokenization and query parsing"""
+
+    def test_tokenize(self):
+        """Tokens are lowercased words and numbers"""
+        assert tokenize("Debt Consolidation at 123 Main St., CA 92630!") == [
+            "debt", "consolidation", "at", "123", "main", "st", "ca", "92630"
+        ]
+
+    def test_parse_phrases(self):
+        """Quoted text becomes one phrase clause"""
+        assert parse_query('"debt consolidation" 92630') == [["debt", "consolidation"], ["92630"]]
+
+    def test_snippet_window(self):
+        """Snippets are cut around the first matching token"""
+        text = "x " * 100 + "I want debt consolidation please" + " y" * 100
+
+        snippet = make_snippet(text, {"debt"})
+
+        assert "debt consolidation" in snippet
+        assert snippet.startswith("...") and snippet.endswith("...")
+
+
+class TestSearch:
+    """Test the inverted index"""
+
+    def setup_method(self):
+        """Index a few conversations"""
+        self.search = ConversationSearch()
+        self.search.add_conversation("c1", [
+            {"role": "user", "content": "I need debt consolidation for my credit cards"},
+            {"role": "assistant", "content": "Debt consolidation with a cash out refinance can help."},
+        ])
+        self.search.add_conversation("c2", [
+            {"role": "user", "content": "Consolidation of debt? No, I want a new kitchen"},
+        ])
+        self.search.add_conversation("c3", [
+            {"role": "user", "content": "My house at 8315 Oceanview Ave needs a roof"},
+        ])
+
+    def test_phrase_query(self):
+        """Phrases only match adjacent words in order"""
+        hits = self.search.search('"debt consolidation"')
+
+        assert {hit["conversation_id"] for hit in hits} == {"c1"}
+
+    def test_all_words_required(self):
+        """Plain words match in any order, all must be present"""
+        hits = self.search.search("consolidation debt")
+
+        assert {hit["conversation_id"] for hit in hits} == {"c1", "c2"}
+        assert self.search.search("debt roof") == []
+
+    def test_role_filter_and_snippet(self):
+        """Role filters drop other speakers' messages; hits carry snippets"""
+        hits = self.search.search("debt consolidation", role="assistant")
+
+        assert len(hits) == 1
+        assert hits[0]["message_index"] == 1
+        assert "cash out refinance" in hits[0]["snippet"]
+
+    def test_address_search(self):
+        """Addresses are searchable by number and street"""
+        assert self.search.search('"8315 oceanview"')[0]["conversation_id"] == "c3"
+
+    def test_remove(self):
+        """Removed conversations stop matching"""
+        self.search.remove_conversation("c1")
+
+        assert {hit["conversation_id"] for hit in self.search.search("debt")} == {"c2"}
+        assert "cards" not in self.search.postings
+
+
+class TestAttach:
+    """Test following a ConversationManager"""
+
+    def test_indexes_existing_and_new_conversations(self, temp_storage_dir):
+        """Existing history is indexed on the first query and new saves incrementally"""
+        manager = ConversationManager(data_file=os.path.join(temp_storage_dir, "conversations.json"))
+        manager.save_conversation("1", "Ronnie", [{"role": "user", "content": "pay off my HELOC"}], {})
+        search = ConversationSearch()
+        search.attach(manager)
+        assert len(search) == 0
+
+        conv_id = manager.save_conversation("2", "Dana", [{"role": "user", "content": "another HELOC question"}], {})
+
+        assert len(search.search("heloc")) == 2
+        assert search.search("another")[0]["snippet"] == "another HELOC question"
+
+        manager.delete_conversation(conv_id)
+        assert len(search.search("heloc")) == 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,127 @@
+"""
+Test Cases for Funnel Analytics - Funnel, time-to-proposal and template reply rates
+"""
+import os
+from datetime import datetime
+import pytest
+from utils.campaign_manager import CampaignManager
+from utils.conversation_manager import ConversationManager
+from utils.funnel_analytics import FunnelAnalytics
+
+
+def chat(turns):
+    """Messages with the given number of borrower replies"""
+    messages = []
+    for i in range(turns):
+        messages.append({"role": "assistant", "content": f"Question {i}?"})
+        messages.append({"role": "user", "content": f"Answer {i}"})
+    return messages
+
+
+class TestFunnelAnalytics:
+    """Test the analytics engine"""
+
+    def setup_stores(self, temp_storage_dir):
+        """Empty stores and an engine over them"""
+        self.conversations = ConversationManager(data_file=os.path.join(temp_storage_dir, "conversations.json"))
+        self.campaigns = CampaignManager(campaigns_file=os.path.join(temp_storage_dir, "campaigns.json"))
+        return FunnelAnalytics(self.conversations, self.campaigns)
+
+    def test_funnel_and_time_to_proposal(self, temp_storage_dir):
+        """Sessions are counted once and the earliest proposal save sets the turn count"""
+        analytics = self.setup_stores(temp_storage_dir)
+        # Session "a" is saved twice: without, then with a proposal
+        self.conversations.save_conversation("1", "Ronnie", chat(3), {}, session_id="a")
+        self.conversations.save_conversation("1", "Ronnie", chat(4), {}, True, session_id="a")
+        self.conversations.save_conversation("2", "Dana", chat(1), {}, session_id="b")
+        self.conversations.save_conversation("3", "Peter", chat(2), {}, session_id="c")
+        self.conversations.save_conversation("4", "Maria", chat(6), {}, True, session_id="d")
+
+        metrics = analytics.metrics()
+
+        assert metrics["sessions"] == 4
+        assert list(metrics["funnel"]["count"]) == [4, 3, 2, 0, 0]
+        assert metrics["time_to_proposal"]["median_turns"] == 5.0
+        assert metrics["time_to_proposal"]["median_hours"] >= 0
+        drop_off = dict(zip(metrics["drop_off"]["user_turns"], metrics["drop_off"]["sessions"]))
+        assert drop_off == {1: 1, 2: 1}
+
+    def test_incremental_refresh(self, temp_storage_dir):
+        """Only changed conversations are read and unchanged stores reuse the cache"""
+        analytics = self.setup_stores(temp_storage_dir)
+        first = self.conversations.save_conversation("1", "Ronnie", chat(2), {})
+        analytics.refresh()
+
+        assert analytics.refresh() is False
+
+        self.conversations.save_conversation("2", "Dana", chat(1), {}, True)
+        self.conversations.delete_conversation(first)
+
+        assert analytics.refresh() is True
+        assert set(analytics.rows) == {c["conversation_id"] for c in self.conversations.get_all_conversations()}
+        assert analytics.metrics()["sessions"] == 1
+
+    def test_retention_drop_removes_rows(self, temp_storage_dir):
+        """Conversations of a month deleted by retention leave the funnel"""
+        self.conversations = ConversationManager(data_file=os.path.join(temp_storage_dir, "conversations.json"),
+                                                 retention_months=15)
+        self.campaigns = CampaignManager(campaigns_file=os.path.join(temp_storage_dir, "campaigns.json"))
+        analytics = FunnelAnalytics(self.conversations, self.campaigns)
+        self.conversations.save_conversation("1", "Ronnie", chat(2), {})
+        now = datetime.now()
+
+        self.conversations.archive_old_conversations(now=now.replace(year=now.year + 1))
+        assert analytics.metrics()["sessions"] == 1
+
+        self.conversations.archive_old_conversations(now=now.replace(year=now.year + 2))
+        assert analytics.metrics()["sessions"] == 0
+
+    def test_template_reply_rates(self, temp_storage_dir):
+        """A reply is credited to the last touchpoint sent before it"""
+        analytics = self.setup_stores(temp_storage_dir)
+        self.conversations.save_conversation("1", "Ronnie", chat(3), {}, True)
+        for lead_id in ("1", "2"):
+            self.campaigns.create_campaign(lead_id, "new_lead_cashout", {"name": "Lead", "cash_out_amount": 50000})
+        touchpoints = self.campaigns.get_campaign("1")["scheduled_touchpoints"]
+        self.campaigns.mark_touchpoint_sent("1", 0)
+        self.campaigns.mark_touchpoint_sent("1", 1)
+        self.campaigns.mark_touchpoint_sent("2", 0)
+        self.campaigns.stop_campaign_on_response("1")
+
+        table = analytics.metrics()["template_response"].set_index("template")
+
+        assert table.loc[touchpoints[1]["template"], "replies"] == 1
+        assert table["replies"].sum() == 1
+        assert table.loc[touchpoints[0]["template"], "sends"] == 2
+        assert list(analytics.metrics()["funnel"]["count"])[3:] == [1, 1]
+
+    def test_sends_without_time_are_not_credited(self, temp_storage_dir):
+        """A responding lead whose sends have no sent_at gets no reply credit instead of an error"""
+        analytics = self.setup_stores(temp_storage_dir)
+        self.campaigns.create_campaign("1", "new_lead_cashout", {"name": "Lead"})
+        self.campaigns.mark_touchpoints_sent([("1", 0, None)])
+        # Tagged before responded_at was recorded
+        self.campaigns.update_campaign_status("1", "stopped", ["responded"])
+
+        table = analytics.metrics()["template_response"]
+
+        assert table["sends"].sum() == 1
+        assert table["replies"].sum() == 0
+
+    def test_only_changed_campaigns_are_reread(self, temp_storage_dir):
+        """After the first refresh, campaign events name the leads whose rows are rebuilt"""
+        analytics = self.setup_stores(temp_storage_dir)
+        for lead_id in ("1", "2"):
+            self.campaigns.create_campaign(lead_id, "new_lead_cashout", {"name": "Lead"})
+        analytics.refresh()
+        self.campaigns.get_all_campaigns = None     # a rescan would fail
+
+        self.campaigns.mark_touchpoint_sent("2", 0)
+
+        assert analytics.refresh() is True
+        assert analytics.metrics()["template_response"]["sends"].sum() == 1
+        assert analytics.refresh() is False
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,158 @@
+"""
+Test Cases for Lead Deduplication - Blocking keys, hash indexes and merging
+"""
+import os
+import pytest
+from utils.lead_dedup import (
+    LeadDeduplicator, normalize_phone, normalize_email, normalize_address, merge_leads
+)
+from utils.lead_manager import LeadDataManager
+
+
+class TestNormalization:
+    """Test phone/email/address normalization"""
+
+    def test_normalize_phone_formats(self):
+        """Different phone formats reduce to the same 10 digits"""
+        assert normalize_phone("(859) 516-2730") == "8595162730"
+        assert normalize_phone("+1 859.516.2730") == "8595162730"
+        assert normalize_phone("555-1234") is None
+
+    def test_normalize_email(self):
+        """Emails are lowercased and +tags / gmail dots removed"""
+        assert normalize_email(" Peter.Walker2+bonzo@GMAIL.com ") == "peterwalker2@gmail.com"
+        assert normalize_email("yatesronnie@yahoo.com") == "yatesronnie@yahoo.com"
+        assert normalize_email("not-an-email") is None
+
+    def test_normalize_address(self):
+        """Street suffixes and directions are abbreviated"""
+        a = normalize_address("196 West Jefferson Avenue", zip_code="40422-1234")
+        b = normalize_address("196 W. Jefferson Ave", zip_code="40422")
+        assert a == b
+        assert normalize_address("196 W Jefferson Ave") is None
+
+
+class TestDeduplicator:
+    """Test the hash-indexed duplicate detector"""
+
+    def test_find_duplicate_by_phone(self):
+        """A new lead_id with a known phone matches the existing lead"""
+        dedup = LeadDeduplicator()
+        dedup.add("1", {"lead_id": "1", "phone": "8595162730"})
+
+        match = dedup.find_duplicate({"lead_id": "2", "phone": "859-516-2730"})
+
+        assert match == ("1", "phone:8595162730")
+
+    def test_same_lead_id_is_not_duplicate(self):
+        """Re-sending the same lead_id is an update, not a duplicate"""
+        dedup = LeadDeduplicator()
+        dedup.add("1", {"lead_id": "1", "email": "a@b.com"})
+
+        assert dedup.find_duplicate({"lead_id": "1", "email": "a@b.com"}) is None
+
+    def test_remove_releases_keys(self):
+        """Removing a lead frees its blocking keys"""
+        dedup = LeadDeduplicator()
+        dedup.add("1", {"email": "a@b.com"})
+        dedup.remove("1")
+
+        assert dedup.find_duplicate({"lead_id": "2", "email": "a@b.com"}) is None
+
+    def test_batch_find_duplicates(self):
+        """Batch mode maps every duplicate to the first lead seen"""
+        leads = {
+            "1": {"phone": "8595162730"},
+            "2": {"email": "x@y.com"},
+            "3": {"phone": "859 516 2730", "email": "z@y.com"},
+            "4": {"email": "X@Y.com"},
+        }
+
+        assert LeadDeduplicator().find_duplicates(leads) == {"3": "1", "4": "2"}
+
+    def test_address_match_needs_name(self):
+        """Household members at one address are not merged; the same borrower is"""
+        dedup = LeadDeduplicator()
+        dedup.add("1", {"name": "Ronnie Yates", "property_address": "196 W Jefferson Ave", "property_zip": "40422"})
+
+        spouse = {"lead_id": "2", "name": "Carol Yates", "property_address": "196 West Jefferson Avenue",
+                  "property_zip": "40422"}
+        same = {"lead_id": "3", "name": "ronnie  yates", "property_address": "196 W. Jefferson Ave",
+                "property_zip": "40422"}
+
+        assert dedup.find_duplicate(spouse) is None
+        assert dedup.possible_duplicate(spouse) == ("1", "addr:196 w jefferson ave|40422")
+        assert dedup.find_duplicate(same) == ("1", "addr:196 w jefferson ave|40422")
+        assert LeadDeduplicator().find_duplicates({"1": dict(same, lead_id="1"), "2": spouse, "3": same}) == {"3": "1"}
+
+    def test_merge_keeps_existing_id(self):
+        """Merging keeps the original lead_id and records the alias"""
+        merged = merge_leads(
+            {"lead_id": "1", "cash_out_amount": 10000, "phone": "8595162730"},
+            {"lead_id": "2", "cash_out_amount": 20000, "phone": None},
+        )
+
+        assert merged["lead_id"] == "1"
+        assert merged["cash_out_amount"] == 20000
+        assert merged["phone"] == "8595162730"
+        assert merged["duplicate_lead_ids"] == ["2"]
+
+
+class TestLeadManagerDedup:
+    """Test duplicate handling in LeadDataManager"""
+
+    def _manager(self, temp_storage_dir):
+        """Lead manager backed by a temp file"""
+        return LeadDataManager(data_file=os.path.join(temp_storage_dir, "leads.json"))
+
+    def test_add_lead_merges_duplicate(self, temp_storage_dir):
+        """Bonzo re-sends under a new lead_id are merged"""
+        manager = self._manager(temp_storage_dir)
+        manager.add_lead({"lead_id": "1", "name": "Ronnie Yates", "email": "yatesronnie@yahoo.com"})
+
+        lead_id = manager.add_lead({"lead_id": "2", "name": "Ronnie Yates", "email": "YatesRonnie@yahoo.com"})
+
+        assert lead_id == "1"
+        assert list(manager.get_all_leads()) == ["1"]
+        assert manager.get_lead("1")["duplicate_lead_ids"] == ["2"]
+
+    def test_add_lead_flags_duplicate(self, temp_storage_dir):
+        """Flag mode stores the lead with a duplicate_of marker"""
+        manager = self._manager(temp_storage_dir)
+        manager.add_lead({"lead_id": "1", "phone": "8595162730"})
+
+        lead_id = manager.add_lead({"lead_id": "2", "phone": "8595162730"}, on_duplicate="flag")
+
+        assert lead_id == "2"
+        assert manager.get_lead("2")["duplicate_of"] == "1"
+
+    def test_add_lead_flags_possible_duplicate(self, temp_storage_dir):
+        """A different borrower at a known address is kept, marked as a possible duplicate"""
+        manager = self._manager(temp_storage_dir)
+        manager.add_lead({"lead_id": "1", "name": "Ronnie Yates", "property_address": "196 W Jefferson Ave",
+                          "property_zip": "40422"})
+
+        lead_id = manager.add_lead({"lead_id": "2", "name": "Carol Yates", "property_address": "196 W Jefferson Ave",
+                                    "property_zip": "40422"})
+
+        assert lead_id == "2"
+        assert list(manager.get_all_leads()) == ["1", "2"]
+        assert manager.get_lead("2")["possible_duplicate_of"] == "1"
+
+    def test_invalid_mode_raises(self, temp_storage_dir):
+        """Unknown on_duplicate modes are rejected"""
+        with pytest.raises(ValueError):
+            self._manager(temp_storage_dir).add_lead({"lead_id": "1"}, on_duplicate="ignore")
+
+    def test_dedupe_leads_batch(self, temp_storage_dir):
+        """Batch dedup merges an existing book and persists it"""
+        manager = self._manager(temp_storage_dir)
+        manager.add_lead({"lead_id": "1", "phone": "8595162730"}, on_duplicate="insert")
+        manager.add_lead({"lead_id": "2", "phone": "8595162730"}, on_duplicate="insert")
+
+        assert manager.dedupe_leads() == {"2": "1"}
+        assert list(self._manager(temp_storage_dir).get_all_leads()) == ["1"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -2,6 +2,8 @@
 Test Cases for Lead Manager - CRUD Operations and Data Management
 NOTE: These tests are placeholders for future implementation
 """
+import os
+import tempfile
 import pytest
 
 # Placeholder tests - LeadManager class needs to be implemented
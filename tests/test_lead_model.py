@@ -0,0 +1,116 @@
+"""
+Test Cases for the Compact Lead Model - LeadRecord and the Bonzo payload store
+"""
+import json
+import os
+import pytest
+from utils.jsonl_store import JsonlStore
+from utils.lead_manager import LeadDataManager
+from utils.lead_model import LeadRecord
+
+
+class TestJsonlStore:
+    """Test the append-only keyed payload store"""
+
+    def test_put_get_delete(self, temp_storage_dir):
+        """Values round-trip through disk and deletes are honored"""
+        store = JsonlStore(os.path.join(temp_storage_dir, "store.jsonl"))
+        store.put("a", {"x": 1})
+        store.put("b", [1, 2])
+
+        assert store.get("a") == {"x": 1}
+        assert store.delete("a") is True
+        assert store.get("a") is None
+        assert list(store.keys()) == ["b"]
+
+    def test_index_rebuilt_on_reopen(self, temp_storage_dir):
+        """Reopening the file rebuilds the offset index with last-write-wins"""
+        path = os.path.join(temp_storage_dir, "store.jsonl")
+        store = JsonlStore(path)
+        store.put("a", 1)
+        store.put("a", 2)
+
+        reopened = JsonlStore(path)
+
+        assert reopened.get("a") == 2
+        assert reopened.dead_records == 1
+
+    def test_compact(self, temp_storage_dir):
+        """Compaction drops superseded lines"""
+        path = os.path.join(temp_storage_dir, "store.jsonl")
+        store = JsonlStore(path)
+        for i in range(5):
+            store.put("a", i)
+        store.compact()
+
+        with open(path) as f:
+            assert len(f.readlines()) == 1
+        assert store.get("a") == 4
+
+
+class TestLeadRecord:
+    """Test the dict-compatible slotted lead record"""
+
+    def test_behaves_like_dict(self):
+        """Existing dict-style access keeps working"""
+        record = LeadRecord.from_dict({"lead_id": "1", "name": "Ronnie Yates", "cash_out_amount": 10000, "custom": "x"})
+
+        assert record["name"] == "Ronnie Yates"
+        assert record.get("property_value", 0) == 0
+        assert record.get("custom") == "x"
+        assert "phone" not in record
+        assert dict(record) == {"lead_id": "1", "name": "Ronnie Yates", "cash_out_amount": 10000, "custom": "x"}
+
+    def test_update_and_attributes(self):
+        """Updates go through the mapping API and are visible as attributes"""
+        record = LeadRecord.from_dict({"lead_id": "1", "cash_out_amount": 10000})
+        record.update({"cash_out_amount": 20000})
+
+        assert record.cash_out_amount == 20000
+
+    def test_no_instance_dict(self):
+        """Records are slotted"""
+        assert not hasattr(LeadRecord(), "__dict__")
+
+    def test_payload_loaded_lazily(self, temp_storage_dir):
+        """The Bonzo payload lives in the store and is read on access"""
+        store = JsonlStore(os.path.join(temp_storage_dir, "payloads.jsonl"))
+        record = LeadRecord.from_dict({"bonzo_data": {"first_name": "Ronnie"}, "lead_id": "1"}, store)
+
+        assert "bonzo_data" not in record.to_dict()
+        assert "1" in store
+        assert record["bonzo_data"] == {"first_name": "Ronnie"}
+        assert record.to_dict(include_payload=True)["bonzo_data"] == {"first_name": "Ronnie"}
+
+
+class TestLeadManagerStorage:
+    """Test LeadDataManager with compact records"""
+
+    def test_migrates_inline_payloads(self, temp_storage_dir):
+        """Old files with inline bonzo_data are moved to the payload store"""
+        data_file = os.path.join(temp_storage_dir, "leads.json")
+        with open(data_file, "w") as f:
+            json.dump({"1": {"lead_id": "1", "name": "Peter Walker", "bonzo_data": {"lead_id": "1"}}}, f)
+
+        manager = LeadDataManager(data_file=data_file)
+
+        with open(data_file) as f:
+            assert "bonzo_data" not in json.load(f)["1"]
+        assert manager.get_lead("1")["bonzo_data"] == {"lead_id": "1"}
+
+    def test_parsed_lead_round_trip(self, temp_storage_dir):
+        """Parsed Bonzo leads survive a save/reload"""
+        data_file = os.path.join(temp_storage_dir, "leads.json")
+        manager = LeadDataManager(data_file=data_file)
+        bonzo = manager.get_sample_leads()["36389389"]
+        manager.add_lead(manager.parse_bonzo_lead(bonzo))
+
+        lead = LeadDataManager(data_file=data_file).get_lead("36389389")
+
+        assert lead["name"] == "Peter Walker"
+        assert lead["cash_out_amount"] == 82000
+        assert lead["bonzo_data"] == bonzo
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
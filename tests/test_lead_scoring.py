@@ -0,0 +1,116 @@
+"""
+Test Cases for Lead Scoring - Features, ranking and the incremental call queue
+"""
+import os
+from datetime import datetime
+import pytest
+from utils.lead_manager import LeadDataManager
+from utils.lead_scoring import CallQueue, LeadScorer, lead_features, parse_credit, source_quality
+
+
+NOW = datetime(2025, 10, 21, 9, 0)
+
+
+def make_lead(cash_out=50000, balance=200000, value=400000, credit="720", applied="2025-10-20", source="LendingTree"):
+    """Lead dictionary with the fields the scorer reads"""
+    return {
+        "property_value": value,
+        "current_balance": balance,
+        "cash_out_amount": cash_out,
+        "credit_score": credit,
+        "application_date": applied,
+        "lead_source": source,
+    }
+
+
+class TestFeatures:
+    """Test feature extraction"""
+
+    def test_parse_credit(self):
+        """Numeric scores and band labels are both understood"""
+        assert parse_credit("769") == 769
+        assert parse_credit("EXCELLENT") == 760
+        assert parse_credit(None) == 660
+
+    def test_source_quality(self):
+        """Known source keywords map to a quality weight"""
+        assert source_quality("BROWN - CASHOUT - Good/Exc") == 1.0
+        assert source_quality("Unknown") == 0.5
+
+    def test_feature_columns(self):
+        """Equity, LTV and age are computed per lead"""
+        features = lead_features([make_lead(), make_lead(value=0)], NOW)
+
+        assert features["equity"].tolist() == [200000, 0]
+        assert features["ltv"][0] == pytest.approx(0.625)
+        assert features["ltv"][1] == 1.0
+        assert features["age_days"][0] == pytest.approx(1.375)
+
+
+class TestScoring:
+    """Test ranking"""
+
+    def test_better_lead_ranks_first(self):
+        """More equity, bigger cash out and a fresher lead score higher"""
+        leads = {
+            "weak": make_lead(cash_out=5000, balance=380000, credit="POOR", applied="2025-09-01"),
+            "strong": make_lead(cash_out=100000, balance=100000, value=600000, credit="780"),
+        }
+
+        ranked = LeadScorer().rank_leads(leads, NOW)
+
+        assert [lead_id for lead_id, _ in ranked] == ["strong", "weak"]
+        assert 0 <= ranked[1][1] < ranked[0][1] <= 100
+
+    def test_vectorized_matches_single(self):
+        """Book scoring and single-lead scoring agree"""
+        scorer = LeadScorer()
+        lead = make_lead()
+
+        assert scorer.score_leads({"1": lead}, NOW)["1"] == scorer.score_lead(lead, NOW)
+
+    def test_unknown_date_gets_no_recency(self):
+        """A missing or unparseable application date does not score as brand new"""
+        scorer = LeadScorer()
+        undated = scorer.score_lead(make_lead(applied=None), NOW)
+
+        assert undated == scorer.score_lead(make_lead(applied="not a date"), NOW)
+        assert undated == scorer.score_lead(make_lead(applied="2000-01-01"), NOW)
+        assert undated < scorer.score_lead(make_lead(), NOW)
+
+
+class TestCallQueue:
+    """Test the heap-based top-K queue"""
+
+    def test_top_k_and_updates(self):
+        """Updating one lead re-orders the queue without a rebuild"""
+        queue = CallQueue()
+        queue.build({str(i): make_lead(cash_out=10000 * i) for i in range(1, 6)}, NOW)
+
+        assert [lead_id for lead_id, _ in queue.top(2)] == ["5", "4"]
+
+        queue.update("1", make_lead(cash_out=150000), NOW)
+        queue.remove("5")
+
+        assert [lead_id for lead_id, _ in queue.top(2)] == ["1", "4"]
+        assert len(queue) == 4
+
+    def test_follows_lead_manager(self, temp_storage_dir):
+        """An attached queue tracks adds, updates and deletes"""
+        manager = LeadDataManager(data_file=os.path.join(temp_storage_dir, "leads.json"))
+        manager.add_lead({"lead_id": "a", **make_lead(cash_out=10000)})
+        queue = CallQueue()
+        queue.attach(manager)
+
+        manager.add_lead({"lead_id": "b", **make_lead(cash_out=20000)})
+        assert queue.top(1)[0][0] == "b"
+
+        manager.update_lead("a", {"cash_out_amount": 140000})
+        assert queue.top(1)[0][0] == "a"
+
+        manager.delete_lead("a")
+        assert [lead_id for lead_id, _ in queue.top(5)] == ["b"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
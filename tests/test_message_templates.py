@@ -0,0 +1,65 @@
+"""
+Test Cases for Message Templates - Compilation, validation and batch rendering
+"""
+import os
+import pytest
+from utils.campaign_manager import CampaignManager
+from utils.message_templates import TemplateRegistry, lead_tokens
+
+
+TEMPLATES = {
+    "hello": {"subject": "Hi {first_name}", "body": "Cash out {cash_out} - see {calendly_link}", "attachment": "card"},
+    "plain": {"body": "No tokens here {{literally}}"},
+}
+
+
+class TestTemplateRegistry:
+    """Test compiled templates"""
+
+    def test_render_matches_str_format(self):
+        """Rendering gives the same fields, in order, as formatting every field"""
+        registry = TemplateRegistry(TEMPLATES)
+        tokens = lead_tokens({"name": "Ronnie Yates", "cash_out_amount": 50000})
+
+        assert registry.render("hello", tokens) == {
+            "subject": "Hi Ronnie",
+            "body": "Cash out $50,000 - see https://calendly.com/philgustin",
+            "attachment": "card",
+        }
+        assert list(registry.render("hello", tokens)) == ["subject", "body", "attachment"]
+        assert registry.render("plain", tokens) == {"body": "No tokens here {literally}"}
+        assert registry.render("unknown", tokens) == {}
+
+    def test_batch_render(self):
+        """One template over many leads"""
+        registry = TemplateRegistry(TEMPLATES)
+        tokens = [lead_tokens({"name": name}) for name in ("Ronnie Yates", "Dana", "")]
+
+        subjects = [message["subject"] for message in registry.render_batch("hello", tokens)]
+
+        assert subjects == ["Hi Ronnie", "Hi Dana", "Hi there"]
+
+    @pytest.mark.parametrize("body", ["Hi {frist_name}", "Hi {}", "Hi {lead.name}", "Hi {first_name"])
+    def test_bad_placeholders_fail_at_load(self, body):
+        """Unknown, positional, attribute and malformed placeholders are rejected up front"""
+        with pytest.raises(ValueError):
+            TemplateRegistry({"broken": {"body": body}})
+
+    def test_missing_references(self):
+        """Template keys referenced but not defined are reported"""
+        registry = TemplateRegistry(TEMPLATES)
+
+        assert registry.missing(["hello", "nope", "nope"]) == ["nope"]
+
+    def test_campaign_manager_templates_compile(self, temp_storage_dir):
+        """The shipped templates pass validation and personalize_message uses them"""
+        manager = CampaignManager(campaigns_file=os.path.join(temp_storage_dir, "campaigns.json"))
+
+        message = manager.personalize_message("initial_contact", {"name": "Ronnie Yates"})
+
+        assert message["body"].startswith("Hi Ronnie,")
+        assert "Ronnie" in manager.personalize_message("initial_contact", {"name": "Ronnie", "property_value": "450,000"})["body"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,249 @@
+"""
+Test Cases for Send Capacity - Slot planning, token buckets and backlog reports
+"""
+import json
+import os
+from datetime import datetime, timedelta
+import pytest
+import pytz
+from utils.campaign_manager import CampaignManager
+from utils.campaign_store import events_path
+from utils.send_capacity import RateLimiter, SendPlanner, TokenBucket, backlog, sender_for
+from utils.touchpoint_queue import TouchpointQueue
+
+
+TZ = pytz.timezone("America/New_York")
+LIMITS = {
+    "SMS": {"per_minute": 2, "senders": {"+15550001": 2, "+15550002": 2}},
+    "Email": {"per_minute": 5, "senders": {}},
+}
+
+
+class FakeClock:
+    """Manually advanced clock"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TestSendPlanner:
+    """Test per-minute slot reservations"""
+
+    def test_bursts_spill_into_later_minutes(self):
+        """A full minute pushes touchpoints to the next minute, then the next morning"""
+        planner = SendPlanner(LIMITS)
+        start = TZ.localize(datetime(2025, 10, 21, 19, 58))
+
+        slots = [planner.reserve("SMS", str(i), start) for i in range(5)]
+
+        assert [slot.strftime("%d %H:%M") for slot in slots] == ["21 19:58", "21 19:58", "21 19:59", "21 19:59", "22 08:00"]
+        assert planner.reserve("VM", "1", start) == start
+
+    def test_sender_limits(self):
+        """A lead's sender can be full while the channel still has room"""
+        limits = {"SMS": {"per_minute": 10, "senders": {"+15550001": 1}}}
+        planner = SendPlanner(limits)
+        start = TZ.localize(datetime(2025, 10, 21, 9, 0))
+
+        first = planner.reserve("SMS", "a", start)
+        second = planner.reserve("SMS", "b", start)
+
+        assert second - first == timedelta(minutes=1)
+        assert sender_for(LIMITS, "SMS", "a") == sender_for(LIMITS, "SMS", "a")
+
+    def test_reserve_many_fills_each_minute(self):
+        """A batch takes each minute's spare capacity at once, around earlier bookings"""
+        planner = SendPlanner(LIMITS)
+        start = TZ.localize(datetime(2025, 10, 21, 19, 58))
+        planner.reserve("Email", "a", start)
+
+        slots = planner.reserve_many("Email", None, 12, int(start.timestamp()), TZ)
+
+        minutes = [datetime.fromtimestamp(slot, TZ).strftime("%d %H:%M") for slot in slots]
+        assert minutes == ["21 19:58"] * 4 + ["21 19:59"] * 5 + ["22 08:00"] * 3
+
+    def test_window_across_dst_change(self):
+        """The next morning is 8am local time even when the clocks change overnight"""
+        planner = SendPlanner(LIMITS)
+        la = pytz.timezone("America/Los_Angeles")
+
+        fall = planner.reserve("Email", "1", la.localize(datetime(2025, 11, 1, 21, 30)))
+        spring = planner.reserve("Email", "1", la.localize(datetime(2025, 3, 8, 21, 30)))
+
+        assert fall.isoformat() == "2025-11-02T08:00:00-08:00"
+        assert spring.isoformat() == "2025-03-09T08:00:00-07:00"
+
+
+class TestSmoothedScheduling:
+    """Test CampaignManager scheduling under limits"""
+
+    def test_import_burst_is_spread_in_order(self, temp_storage_dir):
+        """Many campaigns created at once stay within limits and keep per-lead order"""
+        limits = {"SMS": {"per_minute": 3, "senders": {}}, "Email": {"per_minute": 3, "senders": {}},
+                  "VM": {"per_minute": 3, "senders": {}}}
+        manager = CampaignManager(campaigns_file=os.path.join(temp_storage_dir, "campaigns.json"), send_limits=limits)
+        for i in range(10):
+            manager.create_campaign(str(i), "new_lead_cashout", {"name": f"Lead {i}"})
+
+        per_minute = {}
+        for campaign in manager.get_all_campaigns().values():
+            times = [datetime.fromisoformat(tp["scheduled_time"]) for tp in campaign["scheduled_touchpoints"]]
+            assert times == sorted(times)
+            assert all(8 <= t.hour < 20 for t in times)
+            for tp, when in zip(campaign["scheduled_touchpoints"], times):
+                key = (tp["type"], when.replace(second=0, microsecond=0))
+                per_minute[key] = per_minute.get(key, 0) + 1
+
+        assert max(per_minute.values()) <= 3
+
+    def test_enroll_notifies_once(self, temp_storage_dir):
+        """A batch is published as one notification that an attached queue follows"""
+        manager = CampaignManager(campaigns_file=os.path.join(temp_storage_dir, "campaigns.json"))
+        queue = TouchpointQueue()
+        queue.attach(manager)
+        events = []
+        manager.subscribe(lambda event, key, version: events.append((event, key)))
+
+        manager.enroll_leads({str(i): {"name": f"Lead {i}"} for i in range(3)})
+
+        assert events == [("enroll", ["0", "1", "2"])]
+        total = len(manager.campaign_templates["new_lead_cashout"])
+        assert len(queue.due(datetime.now() + timedelta(days=365))) == 3 * total
+
+    def test_existing_campaigns_count(self, temp_storage_dir):
+        """A new manager books the pending touchpoints already on file"""
+        path = os.path.join(temp_storage_dir, "campaigns.json")
+        limits = {"SMS": {"per_minute": 1, "senders": {}}}
+        CampaignManager(campaigns_file=path, send_limits=limits).create_campaign("1", "responded", {"name": "A"})
+
+        manager = CampaignManager(campaigns_file=path, send_limits=limits)
+        manager.create_campaign("2", "responded", {"name": "B"})
+
+        first = {tp["scheduled_time"] for tp in manager.get_campaign("1")["scheduled_touchpoints"] if tp["type"] == "SMS"}
+        second = {tp["scheduled_time"] for tp in manager.get_campaign("2")["scheduled_touchpoints"] if tp["type"] == "SMS"}
+        assert not first & second
+
+    def test_campaign_across_dst_change(self, temp_storage_dir):
+        """Every touchpoint of a campaign started the evening before fall-back is 8am-8pm local"""
+        la = pytz.timezone("America/Los_Angeles")
+        start = la.localize(datetime(2025, 11, 1, 21, 30)).timestamp()
+        manager = CampaignManager(campaigns_file=os.path.join(temp_storage_dir, "campaigns.json"), clock=lambda: start)
+
+        campaign = manager.create_campaign("1", "new_lead_cashout", {"name": "A", "timezone": "America/Los_Angeles"})
+
+        times = [datetime.fromisoformat(tp["scheduled_time"]) for tp in campaign["scheduled_touchpoints"]]
+        assert times[0].isoformat() == "2025-11-02T08:00:00-08:00"
+        assert all(8 <= t.astimezone(la).hour < 20 for t in times)
+
+
+class TestBulkEnrollment:
+    """Test enrolling many leads at once"""
+
+    def test_enroll_filters_and_skips_existing(self, temp_storage_dir):
+        """Selected leads without a campaign are enrolled with one write"""
+        manager = CampaignManager(campaigns_file=os.path.join(temp_storage_dir, "campaigns.json"))
+        manager.create_campaign("1", "new_lead_cashout", {"name": "A", "cash_out_amount": 50000})
+        leads = {str(i): {"name": f"Lead {i}", "cash_out_amount": i * 10000} for i in range(1, 6)}
+        log = events_path(manager.store.path)
+        before = os.path.getsize(log)
+
+        enrolled = manager.enroll_leads(leads, where=lambda lead: lead["cash_out_amount"] >= 20000)
+
+        assert enrolled == ["2", "3", "4", "5"]
+        assert manager.get_campaign("1")["lead_data"]["cash_out_amount"] == 50000
+        with open(log) as f:
+            f.seek(before)
+            assert [json.loads(line)["op"] for line in f] == ["created"] * 4
+        assert manager.enroll_leads(leads) == []
+        assert manager.enroll_leads(leads, restart=True) == list(leads)
+
+    def test_enrolled_schedule_matches_create_campaign(self, temp_storage_dir):
+        """Bulk campaigns get the same schedule, within limits and in order"""
+        limits = {"SMS": {"per_minute": 3, "senders": {}}, "Email": {"per_minute": 3, "senders": {}},
+                  "VM": {"per_minute": 3, "senders": {}}}
+        manager = CampaignManager(campaigns_file=os.path.join(temp_storage_dir, "campaigns.json"), send_limits=limits)
+        manager.enroll_leads({str(i): {"name": f"Lead {i}", "timezone": "America/Chicago"} for i in range(10)})
+
+        per_minute = {}
+        for campaign in manager.get_all_campaigns().values():
+            touchpoints = campaign["scheduled_touchpoints"]
+            times = [datetime.fromisoformat(tp["scheduled_time"]) for tp in touchpoints]
+            assert [tp["template"] for tp in touchpoints] == [
+                tp["template"] for tp in manager.campaign_templates["new_lead_cashout"]]
+            assert times == sorted(times)
+            assert all(8 <= t.hour < 20 and t.utcoffset() in (timedelta(hours=-6), timedelta(hours=-5)) for t in times)
+            for tp, when in zip(touchpoints, times):
+                key = (tp["type"], when.replace(second=0, microsecond=0))
+                per_minute[key] = per_minute.get(key, 0) + 1
+
+        assert max(per_minute.values()) <= 3
+
+    def test_enroll_notifies_once(self, temp_storage_dir):
+        """A batch is published as one notification that an attached queue follows"""
+        manager = CampaignManager(campaigns_file=os.path.join(temp_storage_dir, "campaigns.json"))
+        queue = TouchpointQueue()
+        queue.attach(manager)
+        events = []
+        manager.subscribe(lambda event, key, version: events.append((event, key)))
+
+        manager.enroll_leads({str(i): {"name": f"Lead {i}"} for i in range(3)})
+
+        assert events == [("enroll", ["0", "1", "2"])]
+        total = len(manager.campaign_templates["new_lead_cashout"])
+        assert len(queue.due(datetime.now() + timedelta(days=365))) == 3 * total
+
+
+class TestRateLimiter:
+    """Test send-time token buckets"""
+
+    def test_bucket_refills(self):
+        """Tokens come back at the configured rate"""
+        clock = FakeClock()
+        bucket = TokenBucket(rate=1, capacity=2, clock=clock)
+
+        assert bucket.try_acquire() and bucket.try_acquire()
+        assert not bucket.try_acquire()
+        assert bucket.wait_time() == 1
+
+        clock.now += 1
+        assert bucket.try_acquire()
+
+    def test_acquire_waits_for_channel_and_sender(self):
+        """Sends beyond the burst wait for both buckets"""
+        clock = FakeClock()
+        limiter = RateLimiter(LIMITS, clock=clock, sleep=clock.sleep)
+
+        senders = [limiter.acquire("SMS", "a") for _ in range(3)]
+
+        assert set(senders) == {sender_for(LIMITS, "SMS", "a")}
+        assert clock.now == pytest.approx(30)
+        assert limiter.acquire("VM", "a") is None
+
+
+class TestBacklog:
+    """Test queue depth and lag reporting"""
+
+    def test_backlog(self):
+        """Depth, oldest wait and drain time per channel"""
+        now = datetime(2025, 10, 21, 9, 0).astimezone()
+        due = [{"lead_id": str(i), "index": 0, "touchpoint": {
+            "type": "SMS", "scheduled_time": (now - timedelta(minutes=i)).isoformat()}} for i in range(4)]
+        due.append({"lead_id": "9", "index": 1, "touchpoint": {
+            "type": "SMS", "manual": True, "scheduled_time": now.isoformat()}})
+
+        report = backlog(due, LIMITS, now)
+
+        assert report["SMS"]["depth"] == 4
+        assert report["SMS"]["oldest_wait_minutes"] == 3
+        assert report["SMS"]["drain_minutes"] == 2
+        assert report["SMS"]["expected_lag_minutes"] == 5
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
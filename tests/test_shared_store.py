@@ -0,0 +1,96 @@
+"""
+Test Cases for Shared Stores - Locking, snapshots and change notifications
+"""
+import os
+import threading
+import pytest
+from utils.conversation_manager import ConversationManager
+from utils.lead_manager import LeadDataManager
+
+
+class TestChangeNotifications:
+    """Test subscriber notifications and version counters"""
+
+    def test_listener_receives_events(self, temp_storage_dir):
+        """Subscribers see add/update/delete with increasing versions"""
+        manager = LeadDataManager(data_file=os.path.join(temp_storage_dir, "leads.json"))
+        events = []
+        manager.subscribe(lambda event, key, version: events.append((event, key, version)))
+
+        manager.add_lead({"lead_id": "1", "name": "Ronnie Yates"})
+        manager.update_lead("1", {"cash_out_amount": 20000})
+        manager.delete_lead("1")
+
+        assert events == [("add", "1", 1), ("update", "1", 2), ("delete", "1", 3)]
+
+    def test_unsubscribe(self, temp_storage_dir):
+        """Unsubscribed listeners are no longer called"""
+        manager = ConversationManager(data_file=os.path.join(temp_storage_dir, "conversations.json"))
+        events = []
+        unsubscribe = manager.subscribe(lambda *args: events.append(args))
+        unsubscribe()
+
+        manager.save_conversation("1", "Ronnie Yates", [], {})
+
+        assert events == []
+        assert manager.changed_since(0)
+
+    def test_failing_listener_does_not_break_writes(self, temp_storage_dir):
+        """A listener raising an exception does not fail the write"""
+        manager = LeadDataManager(data_file=os.path.join(temp_storage_dir, "leads.json"))
+        manager.subscribe(lambda *args: 1 / 0)
+
+        assert manager.add_lead({"lead_id": "1"}) == "1"
+
+
+class TestSharedAccess:
+    """Test concurrent use of one store"""
+
+    def test_snapshot_is_stable(self, temp_storage_dir):
+        """The dict returned by get_all_leads is not resized by later writes"""
+        manager = LeadDataManager(data_file=os.path.join(temp_storage_dir, "leads.json"))
+        manager.add_lead({"lead_id": "1"})
+        snapshot = manager.get_all_leads()
+
+        manager.add_lead({"lead_id": "2"})
+
+        assert list(snapshot) == ["1"]
+        assert list(manager.get_all_leads()) == ["1", "2"]
+
+    def test_concurrent_adds(self, temp_storage_dir):
+        """Writes from many threads are all kept"""
+        data_file = os.path.join(temp_storage_dir, "leads.json")
+        manager = LeadDataManager(data_file=data_file)
+
+        def worker(start):
+            for i in range(start, start + 20):
+                manager.add_lead({"lead_id": str(i)})
+
+        threads = [threading.Thread(target=worker, args=(n * 20,)) for n in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(manager.get_all_leads()) == 100
+        assert len(LeadDataManager(data_file=data_file).get_all_leads()) == 100
+
+    def test_bulk_add_publishes_once(self, temp_storage_dir):
+        """add_leads saves once and readers see the batch only when it is complete"""
+        data_file = os.path.join(temp_storage_dir, "leads.json")
+        manager = LeadDataManager(data_file=data_file)
+        manager.add_lead({"lead_id": "0"})
+        before = manager.get_all_leads()
+        seen = []
+        manager.subscribe(lambda event, key, version: seen.append((key, len(manager.get_all_leads()))))
+
+        lead_ids = manager.add_leads({"lead_id": str(i)} for i in range(1, 4))
+
+        assert lead_ids == ["1", "2", "3"]
+        assert list(before) == ["0"]
+        assert seen == [("1", 4), ("2", 4), ("3", 4)]
+        assert list(LeadDataManager(data_file=data_file).get_all_leads()) == ["0", "1", "2", "3"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,116 @@
+"""
+Test Cases for Timezone Resolution - Bonzo labels, states and zip prefixes
+"""
+import json
+import os
+import pytest
+import pytz
+from utils.campaign_manager import CampaignManager
+from utils.lead_manager import LeadDataManager
+from utils.timezones import load_zone, resolve_timezone
+
+
+class TestResolveTimezone:
+    """Test label, zip and state lookups"""
+
+    def test_labels(self):
+        """Bonzo labels and abbreviations map to IANA zones"""
+        assert resolve_timezone("Eastern") == "America/New_York"
+        assert resolve_timezone("Pacific Standard Time") == "America/Los_Angeles"
+        assert resolve_timezone("Central Time (US & Canada)") == "America/Chicago"
+        assert resolve_timezone("MST") == "America/Denver"
+        assert resolve_timezone("America/Phoenix") == "America/Phoenix"
+
+    def test_zip_prefix_before_state(self):
+        """Split states are resolved by zip prefix, the rest by state"""
+        assert resolve_timezone(None, "KY", "40422") == "America/New_York"
+        assert resolve_timezone(None, "KY", "42001") == "America/Chicago"
+        assert resolve_timezone(None, "Texas", "79901") == "America/Denver"
+        assert resolve_timezone(None, "ca") == "America/Los_Angeles"
+        assert resolve_timezone("unknown", None, None) == "America/New_York"
+
+    def test_load_zone_accepts_labels(self):
+        """Labels load the same memoized zone object; unknown names still raise"""
+        assert load_zone("Eastern") is load_zone("America/New_York")
+        with pytest.raises(pytz.UnknownTimeZoneError):
+            load_zone("Mars/Olympus_Mons")
+
+
+class TestLeadTimezones:
+    """Test resolution at import and its use in scheduling"""
+
+    def test_parsed_lead_gets_zone(self, temp_storage_dir):
+        """parse_bonzo_lead stores an IANA zone, from the label or the property zip"""
+        manager = LeadDataManager(data_file=os.path.join(temp_storage_dir, "leads.json"))
+
+        labelled = manager.parse_bonzo_lead({"lead_id": "1", "timezone": "Pacific", "state": "KY"})
+        located = manager.parse_bonzo_lead({"lead_id": "2", "property_state": "FL", "property_zip": "32501"})
+
+        assert labelled["timezone"] == "America/Los_Angeles"
+        assert located["timezone"] == "America/Chicago"
+
+    def test_added_lead_gets_zone(self, temp_storage_dir):
+        """Leads added without parse_bonzo_lead (manual form, other sources) are resolved too"""
+        manager = LeadDataManager(data_file=os.path.join(temp_storage_dir, "leads.json"))
+
+        manager.add_lead({"lead_id": "1", "name": "Dana Cole", "timezone": "Mountain"})
+        manager.add_lead({"lead_id": "2", "name": "Ronnie Yates", "property_state": "KY", "property_zip": "42001"})
+        manager.add_lead({"lead_id": "3", "name": "Sam Lee"})
+
+        assert manager.get_lead("1")["timezone"] == "America/Denver"
+        assert manager.get_lead("2")["timezone"] == "America/Chicago"
+        assert manager.get_lead("3")["timezone"] == "America/New_York"
+
+    def test_add_lead_leaves_caller_dict(self, temp_storage_dir):
+        """The zone is resolved on a copy of the lead passed in"""
+        manager = LeadDataManager(data_file=os.path.join(temp_storage_dir, "leads.json"))
+        lead = {"lead_id": "1", "name": "Dana Cole", "timezone": "Mountain"}
+
+        manager.add_lead(lead)
+
+        assert lead == {"lead_id": "1", "name": "Dana Cole", "timezone": "Mountain"}
+
+    def test_update_reresolves_on_move(self, temp_storage_dir):
+        """A new property state or zip replaces the zone resolved from the old one"""
+        manager = LeadDataManager(data_file=os.path.join(temp_storage_dir, "leads.json"))
+        manager.add_lead({"lead_id": "1", "name": "Ronnie Yates", "property_state": "KY", "property_zip": "42001"})
+
+        manager.update_lead("1", {"property_state": "CA", "property_zip": "92630"})
+        assert manager.get_lead("1")["timezone"] == "America/Los_Angeles"
+
+        manager.update_lead("1", {"timezone": "Eastern"})
+        assert manager.get_lead("1")["timezone"] == "America/New_York"
+
+    def test_stored_leads_resolved_on_load(self, temp_storage_dir):
+        """Leads saved with a raw label or no zone are migrated when the file is loaded"""
+        data_file = os.path.join(temp_storage_dir, "leads.json")
+        with open(data_file, 'w') as f:
+            json.dump({"1": {"lead_id": "1", "timezone": "Pacific"},
+                       "2": {"lead_id": "2", "timezone": "Moon Standard", "property_state": "TX"}}, f)
+
+        manager = LeadDataManager(data_file=data_file)
+
+        assert manager.get_lead("1")["timezone"] == "America/Los_Angeles"
+        assert manager.get_lead("2")["timezone"] == "America/Chicago"
+        with open(data_file) as f:
+            assert json.load(f)["1"]["timezone"] == "America/Los_Angeles"
+
+    def test_unknown_label_schedules_in_default_zone(self, temp_storage_dir):
+        """A campaign for a lead with an unresolvable label falls back instead of raising"""
+        campaigns = CampaignManager(campaigns_file=os.path.join(temp_storage_dir, "campaigns.json"))
+
+        campaign = campaigns.create_campaign("1", "responded", {"name": "A", "timezone": "Moon Standard"})
+
+        assert campaign.tz == "America/New_York"
+
+    def test_campaign_for_labelled_lead(self, temp_storage_dir):
+        """A lead still carrying a Bonzo label is scheduled in its zone"""
+        campaigns = CampaignManager(campaigns_file=os.path.join(temp_storage_dir, "campaigns.json"))
+
+        campaign = campaigns.create_campaign("1", "responded", {"name": "A", "timezone": "Central"})
+
+        assert campaign.tz == "America/Chicago"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,126 @@
+"""
+Test Cases for the Touchpoint Dispatcher - Rendering, channel senders and batched commits
+"""
+import json
+import os
+from datetime import datetime, timedelta
+import pytest
+from utils.campaign_manager import CampaignManager
+from utils.touchpoint_dispatcher import CHANNELS, TouchpointDispatcher, TouchpointSender, file_senders
+
+
+LEAD = {"name": "Ronnie Yates", "email": "ronnie@example.com", "phone": "555-0100",
+        "property_value": 450000, "cash_out_amount": 50000}
+
+
+class RecordingSender(TouchpointSender):
+    """Sender that remembers what it was asked to deliver"""
+
+    def __init__(self, fail_template=None):
+        self.sent = []
+        self.fail_template = fail_template
+
+    def send(self, lead_data, touchpoint, message):
+        if touchpoint["template"] == self.fail_template:
+            raise ConnectionError("provider unavailable")
+        self.sent.append((lead_data["name"], touchpoint["template"], message))
+
+
+class TestDispatcher:
+    """Test dispatching due touchpoints"""
+
+    def setup_method(self):
+        """Cutoff after the whole 30-day campaign"""
+        self.later = datetime.now() + timedelta(days=60)
+
+    def make_manager(self, temp_storage_dir):
+        """Manager with one cash-out campaign"""
+        manager = CampaignManager(campaigns_file=os.path.join(temp_storage_dir, "campaigns.json"))
+        manager.create_campaign("1", "new_lead_cashout", LEAD)
+        return manager
+
+    def test_sends_and_commits_in_batches(self, temp_storage_dir):
+        """Automatic touchpoints are rendered, sent in order and marked sent"""
+        manager = self.make_manager(temp_storage_dir)
+        senders = {channel: RecordingSender() for channel in CHANNELS}
+        dispatcher = TouchpointDispatcher(manager, senders, max_workers=2, batch_size=10)
+        touchpoints = manager.get_campaign("1")["scheduled_touchpoints"]
+        manual = sum(1 for tp in touchpoints if tp.get("manual"))
+
+        result = dispatcher.run_once(self.later)
+
+        assert result == {"due": len(touchpoints) - manual, "sent": len(touchpoints) - manual, "failed": 0, "manual": manual}
+        assert senders["SMS"].sent[0][1] == "initial_contact"
+        assert "Ronnie" in senders["SMS"].sent[0][2]["body"]
+        reopened = CampaignManager(campaigns_file=manager.campaigns_file)
+        statuses = [tp["status"] for tp in reopened.get_campaign("1")["scheduled_touchpoints"]]
+        assert statuses.count("sent") == len(touchpoints) - manual
+        assert dispatcher.run_once(self.later)["sent"] == 0
+
+    def test_failure_holds_later_touchpoints(self, temp_storage_dir):
+        """A failed delivery stays pending and blocks that lead's later touchpoints"""
+        manager = self.make_manager(temp_storage_dir)
+        senders = {channel: RecordingSender() for channel in CHANNELS}
+        senders["SMS"].fail_template = "purpose_question"
+        dispatcher = TouchpointDispatcher(manager, senders)
+
+        result = dispatcher.run_once(self.later)
+
+        assert result["failed"] == 1
+        sent = [tp["template"] for tp in manager.get_campaign("1")["scheduled_touchpoints"] if tp["status"] == "sent"]
+        assert sent == ["initial_contact", "confirmation_email", "vm1_long_honest"]
+
+    def test_paused_campaigns_are_skipped(self, temp_storage_dir):
+        """Nothing is sent for a paused campaign"""
+        manager = self.make_manager(temp_storage_dir)
+        manager.update_campaign_status("1", "paused")
+        dispatcher = TouchpointDispatcher(manager, {channel: RecordingSender() for channel in CHANNELS})
+
+        assert dispatcher.run_once(self.later)["due"] == 0
+
+    def test_campaign_paused_after_queue_read(self, temp_storage_dir):
+        """Touchpoints already taken from the queue are not sent once the campaign stops"""
+        manager = self.make_manager(temp_storage_dir)
+        senders = {channel: RecordingSender() for channel in CHANNELS}
+        dispatcher = TouchpointDispatcher(manager, senders)
+        items = [item for item in dispatcher.queue.due(self.later) if not item["touchpoint"].get("manual")]
+
+        manager.update_campaign_status("1", "stopped")
+
+        assert dispatcher._deliver("1", items) == ([], [])
+        assert dispatcher._deliver("missing", items) == ([], [])
+        assert all(not sender.sent for sender in senders.values())
+
+    def test_lookup_error_is_reported(self, temp_storage_dir):
+        """A failing campaign lookup is a delivery error, not a crashed poll"""
+        manager = self.make_manager(temp_storage_dir)
+        dispatcher = TouchpointDispatcher(manager, {channel: RecordingSender() for channel in CHANNELS})
+        items = dispatcher.queue.due(self.later)
+
+        def broken(lead_id):
+            raise IOError("store unavailable")
+        manager.get_campaign = broken
+
+        sent, errors = dispatcher._deliver("1", items)
+        assert sent == [] and errors == [("1", items[0]["index"], "store unavailable")]
+
+    def test_sender_must_implement_send(self):
+        """TouchpointSender is abstract"""
+        with pytest.raises(TypeError):
+            TouchpointSender()
+
+    def test_file_senders(self, temp_storage_dir):
+        """The file stand-ins write one JSON line per message and channel"""
+        manager = self.make_manager(temp_storage_dir)
+        outbox = os.path.join(temp_storage_dir, "outbox")
+        TouchpointDispatcher(manager, file_senders(outbox)).run_once(self.later)
+
+        with open(os.path.join(outbox, "sms.jsonl")) as f:
+            messages = [json.loads(line) for line in f]
+        assert messages[0]["to"] == "555-0100"
+        assert messages[0]["template"] == "initial_contact"
+        assert os.path.exists(os.path.join(outbox, "email.jsonl"))
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,86 @@
+"""
+Test Cases for the Touchpoint Queue - Global due-time index over campaigns
+"""
+import os
+from datetime import datetime, timedelta, timezone
+import pytest
+from utils.campaign_manager import CampaignManager
+from utils.touchpoint_queue import TouchpointQueue
+
+
+START = datetime(2025, 10, 21, 9, 0, tzinfo=timezone.utc)
+
+
+def make_campaign(lead_id, offsets_minutes, status="active"):
+    """Campaign whose pending touchpoints are the given minutes after START"""
+    return {
+        "lead_id": lead_id,
+        "status": status,
+        "scheduled_touchpoints": [
+            {"day": 1, "type": "SMS", "template": f"t{i}", "status": "pending",
+             "scheduled_time": (START + timedelta(minutes=m)).isoformat()}
+            for i, m in enumerate(offsets_minutes)
+        ],
+    }
+
+
+class TestTouchpointQueue:
+    """Test the heap-based due index"""
+
+    def test_due_across_campaigns(self):
+        """Due touchpoints come back earliest first, including several per campaign"""
+        queue = TouchpointQueue()
+        queue.build({
+            "a": make_campaign("a", [5, 1, 60]),
+            "b": make_campaign("b", [3]),
+            "c": make_campaign("c", [2], status="paused"),
+        })
+
+        due = queue.due(START + timedelta(minutes=10))
+
+        assert [(d["lead_id"], d["index"]) for d in due] == [("a", 1), ("b", 0), ("a", 0)]
+        assert [(d["lead_id"], d["index"]) for d in queue.due(START + timedelta(minutes=10), limit=2)] == [("a", 1), ("b", 0)]
+        assert queue.next_due()[1] == "a"
+        assert len(queue) == 2
+
+    def test_updates_reorder(self):
+        """Re-indexing one campaign moves or drops its entry"""
+        queue = TouchpointQueue()
+        queue.build({"a": make_campaign("a", [1]), "b": make_campaign("b", [2])})
+
+        queue.update("a", make_campaign("a", [1], status="paused"))
+        queue.update("b", make_campaign("b", [30]))
+
+        assert queue.due(START + timedelta(minutes=10)) == []
+        assert queue.next_due()[1] == "b"
+
+
+class TestFollowsCampaignManager:
+    """Test an attached queue"""
+
+    def test_pause_resume_stop_and_sent(self, temp_storage_dir):
+        """Campaign changes are reflected without a rebuild"""
+        manager = CampaignManager(campaigns_file=os.path.join(temp_storage_dir, "campaigns.json"))
+        queue = TouchpointQueue()
+        queue.attach(manager)
+        manager.create_campaign("1", "new_lead_cashout", {"name": "Ronnie Yates"})
+        far_future = datetime.now() + timedelta(days=365)
+        total = len(manager.get_campaign("1")["scheduled_touchpoints"])
+
+        assert len(queue.due(far_future)) == total
+
+        manager.update_campaign_status("1", "paused")
+        assert queue.due(far_future) == []
+
+        manager.update_campaign_status("1", "active")
+        first = queue.due(far_future, limit=1)[0]
+        manager.mark_touchpoint_sent("1", first["index"])
+        assert len(queue.due(far_future)) == total - 1
+        assert first["index"] not in [d["index"] for d in queue.due(far_future)]
+
+        manager.update_campaign_status("1", "stopped")
+        assert queue.next_due() is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
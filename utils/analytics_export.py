@@ -0,0 +1,376 @@
+"""
+Analytics Export - Typed columnar snapshots of leads, conversations and campaigns
+
+Writes four tables for BI tools (pandas, DuckDB, Spark, ...):
+
+    <output_dir>/
+        leads/part-00001.parquet          one row per lead version
+        conversations/part-00001.parquet  conversation metadata
+        messages/part-00001.parquet       one row per chat message
+        touchpoints/part-00001.parquet    "scheduled" and "sent" touchpoint events
+        _export_state.json                watermarks of the last run
+
+Each run only appends what changed since the previous run as a new part file:
+leads changed according to the lead change feed, conversations saved after the
+last run, and touchpoints scheduled or sent according to the campaign events
+since the last run (CampaignManager.events_since). Parquet
+(zstd) is written when pyarrow.parquet is available, Arrow IPC files otherwise.
+
+Usage:
+    python -m utils.analytics_export [output_dir]
+"""
+import glob
+import json
+import os
+import sys
+from datetime import datetime, timezone
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+from .campaign_model import CampaignRecord, touchpoint_at
+from .change_feed import ChangeFeedConsumer
+
+
+TABLES = ("leads", "conversations", "messages", "touchpoints")
+
+# Lead columns and their types (everything else is exported as a string)
+LEAD_FLOAT_FIELDS = ("property_value", "current_balance", "cash_out_amount", "annual_income")
+LEAD_STRING_FIELDS = (
+    "lead_id", "name", "email", "phone", "is_veteran", "credit_score", "loan_purpose",
+    "property_type", "property_address", "property_city", "property_state", "property_zip",
+    "lead_source", "application_date", "timezone",
+)
+
+
+def _schemas():
+    """Arrow schemas of the exported tables"""
+    timestamp = pa.timestamp("us", tz="UTC")
+    return {
+        "leads": pa.schema(
+            [(f, pa.string()) for f in LEAD_STRING_FIELDS]
+            + [(f, pa.float64()) for f in LEAD_FLOAT_FIELDS]
+            + [("deleted", pa.bool_()), ("change_seq", pa.int64()), ("exported_at", timestamp)]
+        ),
+        "conversations": pa.schema([
+            ("conversation_id", pa.string()),
+            ("lead_id", pa.string()),
+            ("lead_name", pa.string()),
+            ("session_id", pa.string()),
+            ("timestamp", pa.timestamp("us")),
+            ("message_count", pa.int32()),
+            ("proposal_generated", pa.bool_()),
+            ("property_value", pa.float64()),
+            ("cash_out_amount", pa.float64()),
+            ("is_veteran", pa.string()),
+        ]),
+        "messages": pa.schema([
+            ("conversation_id", pa.string()),
+            ("lead_id", pa.string()),
+            ("message_index", pa.int32()),
+            ("role", pa.string()),
+            ("content", pa.string()),
+            ("timestamp", pa.timestamp("us")),
+        ]),
+        "touchpoints": pa.schema([
+            ("lead_id", pa.string()),
+            ("campaign_type", pa.string()),
+            ("touchpoint_index", pa.int32()),
+            ("day", pa.int32()),
+            ("channel", pa.string()),
+            ("template", pa.string()),
+            ("manual", pa.bool_()),
+            ("event", pa.string()),
+            ("scheduled_time", timestamp),
+            ("sent_at", pa.timestamp("us")),
+            ("campaign_created_at", pa.timestamp("us")),
+        ]),
+    }
+
+
+def _to_float(value):
+    """Numeric value or None"""
+    try:
+        return float(str(value).replace(",", "").replace("$", "")) if value not in (None, "") else None
+    except ValueError:
+        return None
+
+
+def _to_string(value):
+    """String value or None"""
+    return None if value is None else str(value)
+
+
+def _to_datetime(value):
+    """Parse an ISO timestamp (aware ones are converted to UTC) or None"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+    return parsed.astimezone(timezone.utc) if parsed.tzinfo else parsed
+
+
+class AnalyticsExporter:
+    """Incremental columnar export of the data stores"""
+
+    def __init__(self, output_dir="data/analytics", lead_manager=None, conversation_manager=None, campaign_manager=None):
+        """
+        Initialize the exporter
+
+        Args:
+            output_dir: Directory of the columnar dataset
+            lead_manager: LeadDataManager to export (optional)
+            conversation_manager: ConversationManager to export (optional)
+            campaign_manager: CampaignManager to export (optional)
+        """
+        if pa is None:
+            raise ImportError("pyarrow is required for the analytics export (pip install pyarrow)")
+
+        self.output_dir = output_dir
+        self.lead_manager = lead_manager
+        self.conversation_manager = conversation_manager
+        self.campaign_manager = campaign_manager
+        self.format = "parquet" if pq is not None else "arrow"
+        self.schemas = _schemas()
+        self.state_file = os.path.join(output_dir, "_export_state.json")
+        self.state = self._load_state()
+
+    def _load_state(self):
+        """Load watermarks of the previous run"""
+        try:
+            with open(self.state_file, 'r') as f:
+                return json.load(f)
+        except:
+            return {"run": 0, "conversations_since": None, "campaigns_since": None}
+
+    def _save_state(self):
+        """Persist watermarks atomically"""
+        temp_path = f"{self.state_file}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(temp_path, self.state_file)
+
+    def _write(self, table, rows):
+        """Append rows to a table as a new part file"""
+        if not rows:
+            return 0
+        directory = os.path.join(self.output_dir, table)
+        os.makedirs(directory, exist_ok=True)
+        arrow_table = pa.Table.from_pylist(rows, schema=self.schemas[table])
+        path = os.path.join(directory, f"part-{self.state['run']:05d}.{self.format}")
+
+        if self.format == "parquet":
+            pq.write_table(arrow_table, path, compression="zstd")
+        else:
+            options = pa.ipc.IpcWriteOptions(compression="zstd" if pa.Codec.is_available("zstd") else None)
+            with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, arrow_table.schema, options=options) as writer:
+                writer.write_table(arrow_table)
+        return len(rows)
+
+    def export(self):
+        """
+        Run one incremental export
+
+        Returns:
+            Dictionary of table -> rows appended
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.state["run"] += 1
+        started = datetime.now().isoformat()
+
+        counts = {table: 0 for table in TABLES}
+        consumer = None
+        if self.lead_manager is not None:
+            counts["leads"], consumer = self._export_leads()
+        if self.conversation_manager is not None:
+            conversations, messages = self._export_conversations(started)
+            counts["conversations"], counts["messages"] = conversations, messages
+        if self.campaign_manager is not None:
+            counts["touchpoints"] = self._export_touchpoints(started)
+
+        self._save_state()
+        # Only now are the lead changes done; a crash before this re-exports them
+        if consumer is not None:
+            consumer.commit()
+        return counts
+
+    def _lead_row(self, lead_id, lead, seq, exported_at):
+        """Typed row of a lead (None = deleted)"""
+        lead = lead or {}
+        row = {f: _to_string(lead.get(f)) for f in LEAD_STRING_FIELDS}
+        row.update({f: _to_float(lead.get(f)) for f in LEAD_FLOAT_FIELDS})
+        row.update({"lead_id": str(lead_id), "deleted": not lead, "change_seq": seq, "exported_at": exported_at})
+        return row
+
+    def _export_leads(self):
+        """
+        Full snapshot on the first run, then only leads named by the change feed
+
+        Returns:
+            (rows written, change feed consumer to commit once the run's state is saved)
+        """
+        consumer = ChangeFeedConsumer(
+            self.lead_manager.change_feed, "analytics",
+            checkpoint_file=os.path.join(self.output_dir, "_leads.checkpoint"),
+        )
+        events = consumer.poll()
+        exported_at = datetime.now(timezone.utc)
+
+        if not self.state.get("leads_snapshot"):
+            seq = self.lead_manager.change_feed.last_seq
+            leads = self.lead_manager.get_all_leads()
+            rows = [self._lead_row(lead_id, lead, seq, exported_at) for lead_id, lead in leads.items()]
+        else:
+            latest = {}
+            for event in events:
+                latest[event["lead_id"]] = event["seq"]
+            rows = [
+                self._lead_row(lead_id, self.lead_manager.get_lead(lead_id), seq, exported_at)
+                for lead_id, seq in latest.items()
+            ]
+
+        written = self._write("leads", rows)
+        self.state["leads_snapshot"] = True
+        return written, consumer
+
+    def _export_conversations(self, started):
+        """Conversations (and their messages) saved since the previous run"""
+        since = self.state["conversations_since"]
+        conversation_rows = []
+        message_rows = []
+        for record in self.conversation_manager.iter_conversations(since=since):
+            if (record.get("timestamp") or "") > started:
+                continue
+            lead_data = record.get("lead_data") or {}
+            timestamp = _to_datetime(record.get("timestamp"))
+            conversation_rows.append({
+                "conversation_id": record.get("conversation_id"),
+                "lead_id": _to_string(record.get("lead_id")),
+                "lead_name": _to_string(record.get("lead_name")),
+                "session_id": record.get("session_id"),
+                "timestamp": timestamp,
+                "message_count": record.get("message_count") or 0,
+                "proposal_generated": bool(record.get("proposal_generated")),
+                "property_value": _to_float(lead_data.get("property_value")),
+                "cash_out_amount": _to_float(lead_data.get("cash_out_amount")),
+                "is_veteran": _to_string(lead_data.get("is_veteran")),
+            })
+            for index, message in enumerate(record.get("messages") or []):
+                message_rows.append({
+                    "conversation_id": record.get("conversation_id"),
+                    "lead_id": _to_string(record.get("lead_id")),
+                    "message_index": index,
+                    "role": message.get("role"),
+                    "content": _to_string(message.get("content")),
+                    "timestamp": timestamp,
+                })
+
+        self.state["conversations_since"] = started
+        return self._write("conversations", conversation_rows), self._write("messages", message_rows)
+
+    def _export_touchpoints(self, started):
+        """
+        Touchpoints of campaigns created, and touchpoints sent, since the previous run
+
+        Follows the campaign events from the sequence number the previous run
+        saved; the first run (or one whose events are no longer kept) scans
+        every campaign instead.
+        """
+        with self.campaign_manager.lock:
+            events, seq = self.campaign_manager.events_since(self.state.get("campaign_seq"))
+            if events is None:
+                rows = self._scan_touchpoints()
+            else:
+                rows = []
+                catalog = self.campaign_manager.store.catalog
+                for event in events:
+                    lead_id = event["lead_id"]
+                    if event["op"] == "created":
+                        campaign = CampaignRecord.from_dict(event["changes"], catalog)
+                        for index, touchpoint in enumerate(campaign.scheduled_touchpoints()):
+                            rows.append(self._touchpoint_row(lead_id, campaign, index, touchpoint, "scheduled"))
+                    elif event["op"] == "touchpoint_sent":
+                        campaign = self.campaign_manager.get_campaign(lead_id)
+                        index = event["changes"]["index"]
+                        if campaign is not None:
+                            rows.append(self._touchpoint_row(
+                                lead_id, campaign, index, touchpoint_at(campaign, index), "sent", event["changes"]["sent_at"]
+                            ))
+
+        self.state["campaign_seq"] = seq
+        self.state["campaigns_since"] = started
+        return self._write("touchpoints", rows)
+
+    def _scan_touchpoints(self):
+        """Touchpoint rows of every campaign created or sent after the previous run"""
+        since = self.state["campaigns_since"] or ""
+        rows = []
+        for lead_id, campaign in self.campaign_manager.get_all_campaigns().items():
+            created = campaign.get("created_at") or ""
+            new_campaign = since < created
+            for index, touchpoint in enumerate(campaign.get("scheduled_touchpoints", [])):
+                sent_at = touchpoint.get("sent_at") or ""
+                if new_campaign:
+                    rows.append(self._touchpoint_row(lead_id, campaign, index, touchpoint, "scheduled"))
+                if since < sent_at:
+                    rows.append(self._touchpoint_row(lead_id, campaign, index, touchpoint, "sent", sent_at))
+        return rows
+
+    def _touchpoint_row(self, lead_id, campaign, index, touchpoint, event, sent_at=None):
+        """Typed row of a touchpoint event ("scheduled" or "sent")"""
+        return {
+            "lead_id": str(lead_id),
+            "campaign_type": campaign.get("campaign_type"),
+            "touchpoint_index": index,
+            "day": touchpoint.get("day"),
+            "channel": touchpoint.get("type"),
+            "template": touchpoint.get("template"),
+            "manual": bool(touchpoint.get("manual")),
+            "event": event,
+            "scheduled_time": _to_datetime(touchpoint.get("scheduled_time")),
+            "sent_at": _to_datetime(sent_at),
+            "campaign_created_at": _to_datetime(campaign.get("created_at")),
+        }
+
+    def read_table(self, table):
+        """
+        Load an exported table (all part files) into a pandas DataFrame
+
+        Args:
+            table: One of TABLES
+        """
+        paths = sorted(glob.glob(os.path.join(self.output_dir, table, "part-*.*")))
+        if not paths:
+            return self.schemas[table].empty_table().to_pandas()
+        tables = []
+        for path in paths:
+            if path.endswith(".parquet"):
+                tables.append(pq.read_table(path))
+            else:
+                with pa.memory_map(path) as source:
+                    tables.append(pa.ipc.open_file(source).read_all())
+        return pa.concat_tables(tables).to_pandas()
+
+
+def main(output_dir="data/analytics"):
+    """Export the default data stores"""
+    from .campaign_manager import CampaignManager
+    from .conversation_manager import ConversationManager
+    from .lead_manager import LeadDataManager
+
+    exporter = AnalyticsExporter(output_dir, LeadDataManager(), ConversationManager(), CampaignManager())
+    for table, count in exporter.export().items():
+        print(f"{table:15s} +{count:,} rows")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2])
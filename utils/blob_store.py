@@ -0,0 +1,111 @@
+"""
+Blob Store - Append-only file of opaque byte records addressed by (offset, length)
+"""
+import os
+import time
+
+from .jsonl_store import FSYNC_POLICIES
+
+
+class BlobStore:
+    """
+    Append-only blob file
+
+    The store keeps no index of its own: callers remember the (offset, length)
+    returned by append() (e.g. in a JsonlStore record) and read blobs back on
+    demand. Bytes of blobs that are no longer referenced are reclaimed by
+    compact().
+    """
+
+    def __init__(self, path, fsync="never", fsync_interval=1.0):
+        """
+        Initialize the store
+
+        Args:
+            path: Path of the blob file (created on first write)
+            fsync: "always", "interval" or "never" (see JsonlStore)
+            fsync_interval: Seconds between fsyncs for the "interval" policy
+        """
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync}")
+
+        self.path = path
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self._handle = None
+        self._last_fsync = 0.0
+
+    def append(self, data):
+        """Append a blob and return its (offset, length)"""
+        if self._handle is None:
+            self._handle = open(self.path, 'ab')
+        offset = self._handle.seek(0, os.SEEK_END)
+        self._handle.write(data)
+        self._handle.flush()
+
+        if self.fsync == "always":
+            os.fsync(self._handle.fileno())
+        elif self.fsync == "interval":
+            now = time.monotonic()
+            if now - self._last_fsync >= self.fsync_interval:
+                os.fsync(self._handle.fileno())
+                self._last_fsync = now
+        return offset, len(data)
+
+    def read(self, location):
+        """Read the blob stored at (offset, length)"""
+        offset, length = location
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            return f.read(length)
+
+    def read_many(self, locations):
+        """Yield the blobs at several locations (in the given order) using one read handle"""
+        with open(self.path, 'rb') as f:
+            for offset, length in locations:
+                f.seek(offset)
+                yield f.read(length)
+
+    def sync(self):
+        """Force buffered appends to disk"""
+        if self._handle is not None:
+            self._handle.flush()
+            os.fsync(self._handle.fileno())
+            self._last_fsync = time.monotonic()
+
+    def close(self):
+        """Close the append handle (reopened automatically on the next write)"""
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+    def size(self):
+        """Current size of the blob file in bytes"""
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def compact(self, locations):
+        """
+        Rewrite the file keeping only the given blobs
+
+        Args:
+            locations: Dictionary of key -> (offset, length) of the live blobs
+
+        Returns:
+            Dictionary of key -> new (offset, length)
+        """
+        self.close()
+        if not os.path.exists(self.path):
+            return {}
+
+        temp_path = f"{self.path}.compact"
+        moved = {}
+        with open(self.path, 'rb') as src, open(temp_path, 'wb') as dst:
+            for key, (offset, length) in sorted(locations.items(), key=lambda item: item[1][0]):
+                src.seek(offset)
+                moved[key] = (dst.tell(), length)
+                dst.write(src.read(length))
+            dst.flush()
+            os.fsync(dst.fileno())
+
+        os.replace(temp_path, self.path)
+        return moved
@@ -2,26 +2,82 @@
 Campaign Manager - Automated drip campaigns for lead nurturing
 Based on Phil Gustin's 57-step campaign schedule
 """
-import json
+import functools
+import time
 from datetime import datetime, timedelta
 from pathlib import Path
-import pytz
 
+from .campaign_model import CAMPAIGN_LEAD_FIELDS, CampaignRecord, touchpoint_counts
+from .campaign_store import CAMPAIGN_BACKENDS, JsonCampaignStore, SqliteCampaignStore
+from .message_templates import TemplateRegistry, lead_tokens
+from .send_capacity import SendPlanner
+from .shared_store import SharedStore, synchronized
+from .timezones import lead_timezone, load_zone
 
-class CampaignManager:
+
+# Event recorded for a status change (see campaign_store.py)
+STATUS_EVENTS = {"active": "resumed", "paused": "paused", "stopped": "stopped"}
+
+
+@functools.lru_cache(maxsize=4096)
+def _localized(zone_name, day, time_of_day):
+    """
+    A local date and time in a timezone (leads enrolled together share these)
+
+    Returns:
+        Seconds since the epoch
+    """
+    return int(load_zone(zone_name).localize(datetime.combine(day, time_of_day)).timestamp())
+
+class CampaignManager(SharedStore):
     """
     Manages automated drip campaigns with SMS, Email, and Voicemail touchpoints
+
+    Campaigns are cached in memory by a campaign store (see
+    utils/campaign_store.py) as compact CampaignRecords (see
+    utils/campaign_model.py). Every state change is recorded as an event
+    (created, touchpoint_sent, paused, resumed, stopped, ...) that the store
+    applies to a copy of the campaign and appends to its log, so a write
+    never rewrites the campaigns file.
     """
     
-    def __init__(self):
-        self.campaigns_file = Path("data/campaigns.json")
+    def __init__(self, campaigns_file="data/campaigns.json", backend="json", send_limits=None, clock=time.time):
+        """
+        Initialize the campaign manager
+
+        Args:
+            campaigns_file: Campaigns JSON file
+            backend: "json" keeps campaigns in campaigns_file, "sqlite" in a
+                database next to it (<campaigns_file>.db, imported from the
+                JSON file on first use)
+            send_limits: Per-minute channel/sender limits new touchpoints are
+                spread under (defaults to send_capacity.DEFAULT_SEND_LIMITS)
+            clock: Function returning seconds since the epoch (a virtual
+                clock lets utils/campaign_simulator.py replay weeks of
+                campaigns in minutes)
+        """
+        if backend not in CAMPAIGN_BACKENDS:
+            raise ValueError(f"Unknown campaign backend: {backend}")
+
+        super().__init__()
+        self.campaigns_file = Path(campaigns_file)
         self.campaigns_file.parent.mkdir(exist_ok=True)
+        if backend == "sqlite":
+            self.store = SqliteCampaignStore(self.campaigns_file.with_suffix(".db"), migrate_from=self.campaigns_file)
+        else:
+            self.store = JsonCampaignStore(self.campaigns_file)
+        self.clock = clock
+        self.send_planner = SendPlanner(send_limits, clock)
+        # Compiled once; a bad placeholder fails here rather than mid-campaign
+        self.templates = TemplateRegistry(self.get_message_templates())
         
         # Campaign definitions (from your detailed schedule)
         self.campaign_templates = {
             "new_lead_cashout": self.get_cashout_campaign(),
             "responded": self.get_responded_campaign()
         }
+        self._plans = {}            # campaign_type -> parsed touchpoint timing
+        self._template_refs = {}    # campaign_type -> catalogued (version, definition)
     
     def get_cashout_campaign(self):
         """Campaign for new cash-out leads (Days 1-30)"""
@@ -334,6 +390,11 @@ class CampaignManager:
             },
         }
     
+    def now(self, tz=None):
+        """Current time from the manager's clock (naive local time unless tz is given)"""
+        return datetime.fromtimestamp(self.clock(), tz)
+    
+    @synchronized
     def create_campaign(self, lead_id, campaign_type, lead_data):
         """
         Create a new campaign for a lead
@@ -343,123 +404,314 @@ class CampaignManager:
             campaign_type: Type of campaign ("new_lead_cashout", "responded")
             lead_data: Lead information for personalization
         """
-        campaign = {
+        campaign = self._new_campaign(lead_id, campaign_type, lead_data, self.now().isoformat())
+        
+        self.store.append([("created", str(lead_id), campaign.to_dict())])
+        self._notify("create", lead_id)
+        
+        return self.store.get(lead_id)
+    
+    @synchronized
+    def enroll_leads(self, leads, campaign_type="new_lead_cashout", where=None, restart=False):
+        """
+        Start campaigns for many leads with a single write
+        
+        Args:
+            leads: Dictionary of lead_id -> lead data (e.g. get_all_leads())
+            campaign_type: Type of campaign to start
+            where: Optional function lead data -> bool selecting the leads
+            restart: Also replace campaigns leads already have (by default
+                those leads are skipped)
+        
+        Returns:
+            List of the lead IDs enrolled
+        """
+        campaigns = self._load_all_campaigns()
+        selected = {}
+        for lead_id, lead_data in leads.items():
+            lead_id = str(lead_id)
+            if (lead_id in campaigns and not restart) or (where is not None and not where(lead_data)):
+                continue
+            selected[lead_id] = lead_data
+        if not selected:
+            return []
+        
+        created_at = self.now().isoformat()
+        schedules = self._schedule_many(campaign_type, selected)
+        events = [
+            ("created", lead_id, self._new_campaign(lead_id, campaign_type, lead_data, created_at, *schedules[lead_id]).to_dict())
+            for lead_id, lead_data in selected.items()
+        ]
+        
+        self.store.append(events)
+        enrolled = list(selected)
+        # One notification for the whole batch (key = the enrolled lead IDs)
+        self._notify("enroll", enrolled)
+        return enrolled
+    
+    def _new_campaign(self, lead_id, campaign_type, lead_data, created_at, zone=None, epochs=None):
+        """CampaignRecord of a campaign starting now (scheduled here unless zone and epochs are given)"""
+        version, definition = self._catalogued_template(campaign_type)
+        if epochs is None:
+            zone, times = self._schedule_times(campaign_type, lead_data, lead_id)
+            epochs = [epoch for _, epoch in times]
+        return CampaignRecord.from_schedule(self.store.catalog, version, definition, epochs, zone.zone, {
             "lead_id": lead_id,
             "campaign_type": campaign_type,
             "status": "active",
-            "created_at": datetime.now().isoformat(),
+            "created_at": created_at,
             "lead_data": lead_data,
-            "scheduled_touchpoints": self._schedule_touchpoints(campaign_type, lead_data),
-            "completed_touchpoints": [],
-            "tags": [campaign_type]
-        }
+            "tags": [campaign_type],
+        })
+    
+    def _catalogued_template(self, campaign_type):
+        """(version, shared definition list) of a campaign type's schedulable touchpoints"""
+        if campaign_type not in self._template_refs:
+            touchpoints = [touchpoint for touchpoint, _ in self._schedule_plan(campaign_type)]
+            self._template_refs[campaign_type] = self.store.catalog.intern(campaign_type, touchpoints)
+        return self._template_refs[campaign_type]
+    
+    def _schedule_plan(self, campaign_type):
+        """
+        Touchpoints of a campaign type with their timing parsed once
         
-        # Save to file
-        self._save_campaign(campaign)
+        Returns:
+            List of (touchpoint, ("delay", minutes) or ("time", day offset, time))
+        """
+        if campaign_type not in self._plans:
+            plan = []
+            for touchpoint in self.campaign_templates.get(campaign_type, []):
+                if "delay_minutes" in touchpoint:
+                    plan.append((touchpoint, ("delay", touchpoint["delay_minutes"])))
+                elif "time" in touchpoint:
+                    # Parse time (e.g., "9:02am")
+                    time_str = touchpoint["time"]
+                    time_obj = datetime.strptime(time_str, "%I:%M%p" if ":" in time_str else "%I%p").time()
+                    plan.append((touchpoint, ("time", touchpoint["day"] - 1, time_obj)))
+            self._plans[campaign_type] = plan
+        return self._plans[campaign_type]
+    
+    def _schedule_touchpoints(self, campaign_type, lead_data, lead_id=None):
+        """
+        Calculate exact send times for all touchpoints based on lead's timezone
         
-        return campaign
+        Returns:
+            List of expanded touchpoints (see _schedule_times)
+        """
+        zone, times = self._schedule_times(campaign_type, lead_data, lead_id)
+        return [
+            {**touchpoint, "scheduled_time": datetime.fromtimestamp(epoch, zone).isoformat(),
+             "status": "pending", "sent_at": None}
+            for touchpoint, epoch in times
+        ]
     
-    def _schedule_touchpoints(self, campaign_type, lead_data):
-        """Calculate exact send times for all touchpoints based on lead's timezone"""
-        template = self.campaign_templates.get(campaign_type, [])
+    def _schedule_times(self, campaign_type, lead_data, lead_id=None):
+        """
+        Send time of each touchpoint of a new campaign, in the lead's timezone
+        
+        Each touchpoint gets the first minute at or after its nominal time in
+        which its channel and sending number/domain have capacity left (see
+        utils/send_capacity.py), and never goes before the lead's previous
+        touchpoint, so bursts are spread out without reordering a campaign.
+        
+        Times are kept in epoch seconds so scheduling a lead costs no
+        datetime arithmetic beyond reading the clock once.
+        
+        Returns:
+            (lead's timezone, list of (touchpoint, seconds since the epoch))
+        """
         scheduled = []
+        if lead_id is None:
+            lead_id = lead_data.get("lead_id")
+        if not self.send_planner.seeded:
+            self.send_planner.seed(self._load_all_campaigns())
+        previous_time = None
         
-        # Get lead's timezone (default to EST if not specified)
-        timezone_str = lead_data.get("timezone", "America/New_York")
-        lead_tz = pytz.timezone(timezone_str)
+        # Get lead's timezone (resolved to an IANA zone when the lead was
+        # imported, see utils/timezones.py; anything else resolves here, with
+        # EST when nothing is known)
+        lead_tz = load_zone(lead_timezone(lead_data))
         
-        # Campaign start time (now in lead's timezone)
-        start_time = datetime.now(lead_tz)
+        plan = self._schedule_plan(campaign_type)
+        for (touchpoint, _), epoch in zip(plan, self._nominal_times(campaign_type, lead_tz, self.clock())):
+            # Only schedule during allowed hours (8am - 8pm local time), in a
+            # minute with spare send capacity, after the previous touchpoint
+            if previous_time is not None and epoch < previous_time:
+                epoch = previous_time
+            epoch = self.send_planner.reserve_epoch(touchpoint["type"], lead_id, epoch, lead_tz)
+            previous_time = epoch
+            scheduled.append((touchpoint, epoch))
         
-        for touchpoint in template:
-            scheduled_time = None
-            
-            if "delay_minutes" in touchpoint:
-                # Delay-based (from campaign start or previous touchpoint)
-                scheduled_time = start_time + timedelta(minutes=touchpoint["delay_minutes"])
-            elif "time" in touchpoint:
+        return lead_tz, scheduled
+    
+    def _schedule_many(self, campaign_type, leads):
+        """
+        _schedule_times for many leads starting together
+        
+        Leads are scheduled one touchpoint at a time: the leads whose next
+        touchpoint has the same earliest time, timezone and sender reserve
+        their slots together (SendPlanner.reserve_many), which fills each
+        minute in one step instead of probing it once per lead.
+        
+        Args:
+            campaign_type: Type of campaign
+            leads: Dictionary of lead_id -> lead data
+        
+        Returns:
+            Dictionary of lead_id -> (lead's timezone, list of seconds since
+            the epoch, one per touchpoint of the campaign type)
+        """
+        if not self.send_planner.seeded:
+            self.send_planner.seed(self._load_all_campaigns())
+        zones = {lead_id: load_zone(lead_timezone(lead_data)) for lead_id, lead_data in leads.items()}
+        epochs = {lead_id: [] for lead_id in leads}
+        
+        # Nominal times depend only on the timezone (one clock read for the batch)
+        now = self.clock()
+        nominal = {}
+        for zone in zones.values():
+            if zone.zone not in nominal:
+                nominal[zone.zone] = (zone, self._nominal_times(campaign_type, zone, now))
+        
+        senders = {}    # channel -> lead_id -> sender the lead is pinned to
+        for index, (touchpoint, _) in enumerate(self._schedule_plan(campaign_type)):
+            channel = touchpoint["type"]
+            if channel not in senders:
+                senders[channel] = {lead_id: self.send_planner.sender(channel, lead_id) for lead_id in leads}
+            groups = {}
+            for lead_id, zone in zones.items():
+                earliest = nominal[zone.zone][1][index]
+                if index and epochs[lead_id][-1] > earliest:
+                    earliest = epochs[lead_id][-1]
+                groups.setdefault((earliest, zone.zone, senders[channel][lead_id]), []).append(lead_id)
+            for key in sorted(groups):
+                earliest, zone_name, sender = key
+                lead_ids = groups[key]
+                reserved = self.send_planner.reserve_many(channel, sender, len(lead_ids), earliest, nominal[zone_name][0])
+                for lead_id, epoch in zip(lead_ids, reserved):
+                    epochs[lead_id].append(epoch)
+        
+        return {lead_id: (zones[lead_id], epochs[lead_id]) for lead_id in leads}
+    
+    def _nominal_times(self, campaign_type, zone, now):
+        """
+        Touchpoint times of a campaign starting at `now` in a timezone, before
+        the send window and capacity are applied
+        
+        Returns:
+            List of seconds since the epoch (whole seconds, the resolution
+            CampaignRecord keeps), one per touchpoint
+        """
+        start_epoch = int(now)
+        start_date = datetime.fromtimestamp(now, zone).date()
+        times = []
+        for _, timing in self._schedule_plan(campaign_type):
+            if timing[0] == "delay":
+                # Delay-based (from campaign start)
+                times.append(start_epoch + timing[1] * 60)
+            else:
                 # Specific time of day
-                day_offset = touchpoint["day"] - 1
-                target_date = start_time.date() + timedelta(days=day_offset)
-                
-                # Parse time (e.g., "9:02am")
-                time_str = touchpoint["time"]
-                time_obj = datetime.strptime(time_str, "%I:%M%p" if ":" in time_str else "%I%p").time()
-                
-                scheduled_time = lead_tz.localize(datetime.combine(target_date, time_obj))
-            
-            # Only schedule if during allowed hours (8am - 8pm local time)
-            if scheduled_time:
-                hour = scheduled_time.hour
-                if hour < 8:
-                    scheduled_time = scheduled_time.replace(hour=8, minute=0)
-                elif hour >= 20:
-                    scheduled_time = scheduled_time + timedelta(days=1)
-                    scheduled_time = scheduled_time.replace(hour=8, minute=0)
-                
-                scheduled.append({
-                    **touchpoint,
-                    "scheduled_time": scheduled_time.isoformat(),
-                    "status": "pending",
-                    "sent_at": None
-                })
-        
-        return scheduled
+                _, day_offset, time_obj = timing
+                times.append(_localized(zone.zone, start_date + timedelta(days=day_offset), time_obj))
+        return times
     
-    def _save_campaign(self, campaign):
-        """Save campaign to JSON file"""
-        campaigns = self._load_all_campaigns()
-        campaigns[campaign["lead_id"]] = campaign
+    def refresh(self):
+        """
+        Pick up changes other processes wrote (the app and the dispatcher share
+        the store); readers call this once per render or poll, reads do not
         
-        with open(self.campaigns_file, 'w') as f:
-            json.dump(campaigns, f, indent=2)
+        Returns:
+            True if any campaign changed
+        """
+        with self.lock:
+            if self.store.refresh():
+                self._notify("reload")
+                return True
+            return False
     
     def _load_all_campaigns(self):
-        """Load all campaigns from file"""
-        if not self.campaigns_file.exists():
-            return {}
-        
-        try:
-            with open(self.campaigns_file, 'r') as f:
-                return json.load(f)
-        except:
-            return {}
+        """All campaigns, including changes other processes wrote (for writes that check state first)"""
+        with self.lock:
+            self.refresh()
+            return self.store.all()
     
     def get_campaign(self, lead_id):
-        """Get campaign for a specific lead"""
-        campaigns = self._load_all_campaigns()
-        return campaigns.get(lead_id)
+        """Get campaign for a specific lead (as of the last refresh())"""
+        return self.store.get(lead_id)
     
-    def update_campaign_status(self, lead_id, new_status, new_tags=None):
-        """Update campaign status (active, paused, stopped)"""
-        campaigns = self._load_all_campaigns()
+    def get_all_campaigns(self):
+        """Get all campaigns (lead_id -> campaign, as of the last refresh())"""
+        return self.store.all()
+
+    def events_since(self, seq):
+        """
+        Campaign events after a sequence number, for consumers that follow campaigns
+
+        Picks up other processes' changes first. Call with self.lock held to
+        rescan get_all_campaigns() consistently with the returned sequence number.
+
+        Args:
+            seq: Sequence number returned by the previous call (None on the first)
+
+        Returns:
+            (list of events, or None when the consumer must rescan
+            get_all_campaigns(); sequence number to pass next time)
+        """
+        with self.lock:
+            self.refresh()
+            events = None if seq is None else self.store.events_since(seq)
+            return events, self.store.seq
+
+    @synchronized
+    def update_campaign_status(self, lead_id, new_status, new_tags=None, fields=None):
+        """Update campaign status (active, paused, stopped), optionally setting extra fields"""
+        campaign = self._load_all_campaigns().get(str(lead_id))
         
-        if lead_id in campaigns:
-            campaigns[lead_id]["status"] = new_status
+        if campaign:
+            changes = {"status": new_status, **(fields or {})}
             
             if new_tags:
-                if "tags" not in campaigns[lead_id]:
-                    campaigns[lead_id]["tags"] = []
-                campaigns[lead_id]["tags"].extend(new_tags)
-                campaigns[lead_id]["tags"] = list(set(campaigns[lead_id]["tags"]))  # Remove duplicates
+                tags = list(changes.get("tags", campaign.get("tags", [])))
+                tags.extend(new_tags)
+                changes["tags"] = list(set(tags))  # Remove duplicates
             
-            with open(self.campaigns_file, 'w') as f:
-                json.dump(campaigns, f, indent=2)
+            self.store.append([(STATUS_EVENTS.get(new_status, "status"), str(lead_id), changes)])
+            self._notify("status", lead_id)
     
     def mark_touchpoint_sent(self, lead_id, touchpoint_index):
         """Mark a touchpoint as sent"""
+        self.mark_touchpoints_sent([(lead_id, touchpoint_index)])
+    
+    @synchronized
+    def mark_touchpoints_sent(self, sent):
+        """
+        Mark several touchpoints as sent with a single write
+        
+        Args:
+            sent: Iterable of (lead_id, touchpoint_index) or
+                (lead_id, touchpoint_index, sent_at) tuples
+        
+        Returns:
+            Number of touchpoints marked
+        """
         campaigns = self._load_all_campaigns()
+        events = []
+        queued = set()
+        for item in sent:
+            lead_id, touchpoint_index = str(item[0]), item[1]
+            campaign = campaigns.get(lead_id)
+            if not campaign or (lead_id, touchpoint_index) in queued:
+                continue
+            if touchpoint_index >= touchpoint_counts(campaign)[1] or campaign.is_sent(touchpoint_index):
+                continue
+            sent_at = item[2] if len(item) > 2 else self.now().isoformat()
+            events.append(("touchpoint_sent", lead_id, {"index": touchpoint_index, "sent_at": sent_at}))
+            queued.add((lead_id, touchpoint_index))
         
-        if lead_id in campaigns:
-            if touchpoint_index < len(campaigns[lead_id]["scheduled_touchpoints"]):
-                touchpoint = campaigns[lead_id]["scheduled_touchpoints"][touchpoint_index]
-                touchpoint["status"] = "sent"
-                touchpoint["sent_at"] = datetime.now().isoformat()
-                
-                campaigns[lead_id]["completed_touchpoints"].append(touchpoint)
-            
-            with open(self.campaigns_file, 'w') as f:
-                json.dump(campaigns, f, indent=2)
+        self.store.append(events)
+        for lead_id in dict.fromkeys(lead_id for _, lead_id, _ in events):
+            self._notify("touchpoint_sent", lead_id)
+        return len(events)
     
     def get_pending_touchpoints(self, lead_id):
         """Get all pending touchpoints that should be sent now"""
@@ -468,24 +720,65 @@ class CampaignManager:
         if not campaign or campaign["status"] != "active":
             return []
         
-        now = datetime.now()
         pending = []
         
         for i, touchpoint in enumerate(campaign["scheduled_touchpoints"]):
             if touchpoint["status"] == "pending":
                 scheduled_time = datetime.fromisoformat(touchpoint["scheduled_time"])
                 
-                if scheduled_time <= now:
+                # Scheduled times carry the lead's UTC offset
+                if scheduled_time <= self.now(scheduled_time.tzinfo):
                     pending.append({"index": i, "touchpoint": touchpoint})
         
         return pending
     
+    @synchronized
+    def sync_lead_changes(self, consumer):
+        """
+        Apply lead changes from the lead store's change feed to campaign lead_data
+
+        Args:
+            consumer: ChangeFeedConsumer tailing LeadDataManager.change_feed
+
+        Returns:
+            Number of campaigns updated
+        """
+        events = consumer.poll()
+        if not events:
+            return 0
+
+        campaigns = self._load_all_campaigns()
+        changes = []
+        lead_data = {}
+        touched = {}
+        for event in events:
+            lead_id = event["lead_id"]
+            campaign = campaigns.get(str(lead_id))
+            if not campaign:
+                continue
+            if event["op"] == "delete":
+                # Lead removed from the book - stop nurturing it
+                changes.append(("stopped", str(lead_id), {"status": "stopped"}))
+            else:
+                data = lead_data.setdefault(lead_id, dict(campaign.get("lead_data", {})))
+                for field, (_, new_value) in event["changes"].items():
+                    if field in CAMPAIGN_LEAD_FIELDS:
+                        data[field] = new_value
+                changes.append(("lead_updated", str(lead_id), {"lead_data": dict(data)}))
+            touched[lead_id] = True
+
+        self.store.append(changes)
+        consumer.commit()
+        for lead_id in touched:
+            self._notify("lead_data", lead_id)
+        return len(touched)
+    
     def stop_campaign_on_response(self, lead_id):
         """
         Stop current campaign when lead responds
         Optionally start a new "responded" campaign
         """
-        self.update_campaign_status(lead_id, "stopped", ["responded"])
+        self.update_campaign_status(lead_id, "stopped", ["responded"], {"responded_at": self.now().isoformat()})
         
         # Could automatically start "responded" campaign here if needed
         # self.create_campaign(lead_id, "responded", lead_data)
@@ -498,28 +791,4 @@ class CampaignManager:
             template_key: Key for the message template
             lead_data: Lead information for personalization
         """
-        templates = self.get_message_templates()
-        template = templates.get(template_key, {})
-        
-        # Personalization tokens
-        tokens = {
-            "first_name": lead_data.get("name", "").split()[0] if lead_data.get("name") else "there",
-            "last_name": " ".join(lead_data.get("name", "").split()[1:]) if lead_data.get("name") else "",
-            "email": lead_data.get("email", "[email]"),
-            "property_value": f"${lead_data.get('property_value', 0):,}",
-            "cash_out": f"${lead_data.get('cash_out_amount', 0):,}",
-            "wc_reviews": "https://westcapitallending.com/reviews",
-            "phil_reviews": "https://www.philthemortgagepro.com/reviews",
-            "review_link": "https://www.philthemortgagepro.com/reviews",
-            "calendly_link": "https://calendly.com/philgustin",
-        }
-        
-        # Replace tokens in body and subject
-        result = {}
-        for key, value in template.items():
-            if isinstance(value, str):
-                result[key] = value.format(**tokens)
-            else:
-                result[key] = value
-        
-        return result
+        return self.templates.render(template_key, lead_tokens(lead_data))
@@ -0,0 +1,390 @@
+"""
+Campaign Model - Compact campaign records with lazily expanded touchpoints
+
+A campaign used to be stored with all ~57 touchpoints fully expanded (day,
+type, template, timing, status, sent_at) and the sent ones copied again into
+completed_touchpoints. CampaignRecord keeps instead:
+
+    template_version  which touchpoint definitions the campaign was built
+                      from; the definition list itself lives once in the
+                      TemplateCatalog and is shared by every campaign using it
+    anchor, tz        campaign start (epoch seconds) and the lead's timezone
+    offsets           seconds from the anchor to each touchpoint
+    sent, sent_at     bitmap of sent touchpoints and their send times
+
+"scheduled_touchpoints" and "completed_touchpoints" are expanded from these
+whenever they are read, so callers keep the dict shape they had before.
+
+Stored form (one campaign in campaigns.json):
+
+    {"lead_id": "1", "campaign_type": "new_lead_cashout", "template_version": "3f9c1a2b",
+     "status": "active", "created_at": "...", "lead_data": {...}, "tags": [...],
+     "anchor": "2025-10-21T09:00:00-04:00", "tz": "America/New_York",
+     "offsets": [0, 0, 180, ...], "sent": "3", "sent_at": {"0": "...", "1": "..."}}
+"""
+import hashlib
+import json
+import os
+from collections.abc import MutableMapping
+from datetime import datetime
+
+from .timezones import DEFAULT_TIMEZONE, lead_timezone, load_zone
+
+
+# Keys of an expanded touchpoint that are per-campaign rather than definition
+TOUCHPOINT_STATE_FIELDS = ("scheduled_time", "status", "sent_at")
+
+# Lead fields campaigns need for scheduling and personalization; the lead
+# store keeps the rest
+CAMPAIGN_LEAD_FIELDS = (
+    "lead_id", "name", "email", "phone", "property_value", "current_balance", "cash_out_amount", "timezone",
+)
+
+_COMPACT_FIELDS = ("lead_id", "campaign_type", "status", "created_at", "lead_data", "tags")
+_DERIVED_FIELDS = ("scheduled_touchpoints", "completed_touchpoints")
+_MISSING = object()
+
+
+def _trim_lead(lead_data):
+    """The part of a lead a campaign keeps"""
+    return {k: v for k, v in (lead_data or {}).items() if k in CAMPAIGN_LEAD_FIELDS}
+
+
+def template_version(definition):
+    """Short content hash of a touchpoint definition list"""
+    return hashlib.sha1(json.dumps(definition, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:8]
+
+
+def pending_touchpoints(campaign):
+    """
+    Pending touchpoints of a campaign, without expanding a CampaignRecord
+
+    Returns:
+        List of (scheduled epoch, touchpoint index, touchpoint definition)
+    """
+    if isinstance(campaign, CampaignRecord):
+        return campaign.pending()
+    return [
+        (datetime.fromisoformat(touchpoint["scheduled_time"]).timestamp(), index, touchpoint)
+        for index, touchpoint in enumerate(campaign.get("scheduled_touchpoints", []))
+        if touchpoint.get("status") == "pending" and touchpoint.get("scheduled_time")
+    ]
+
+
+def touchpoint_at(campaign, index):
+    """One expanded touchpoint of a campaign, without expanding the rest of a CampaignRecord"""
+    if isinstance(campaign, CampaignRecord):
+        return campaign.touchpoint(index)
+    return campaign["scheduled_touchpoints"][index]
+
+
+def touchpoint_counts(campaign):
+    """(sent, total) touchpoints of a campaign, without expanding a CampaignRecord"""
+    if isinstance(campaign, CampaignRecord):
+        return bin(campaign.sent).count("1"), len(campaign.offsets)
+    return len(campaign.get("completed_touchpoints", [])), len(campaign.get("scheduled_touchpoints", []))
+
+
+class TemplateCatalog:
+    """Touchpoint definition lists by campaign type and version, stored once"""
+
+    def __init__(self, path=None):
+        """
+        Initialize the catalog
+
+        Args:
+            path: JSON file holding the definitions (None = memory only)
+        """
+        self.path = path
+        self.definitions = {}   # "campaign_type@version" -> [touchpoint definition, ...]
+        if path:
+            try:
+                with open(path, 'r') as f:
+                    self.definitions = json.load(f)
+            except:
+                self.definitions = {}
+
+    def intern(self, campaign_type, definition):
+        """
+        Register a definition list
+
+        Returns:
+            (version, shared definition list)
+        """
+        version = template_version(definition)
+        key = f"{campaign_type}@{version}"
+        if key not in self.definitions:
+            self.definitions[key] = [dict(touchpoint) for touchpoint in definition]
+            self._save()
+        return version, self.definitions[key]
+
+    def get(self, campaign_type, version):
+        """Definition list of a campaign type and version"""
+        key = f"{campaign_type}@{version}"
+        if key not in self.definitions and self.path:
+            # Possibly added by another process since the catalog was loaded
+            try:
+                with open(self.path, 'r') as f:
+                    self.definitions = {**json.load(f), **self.definitions}
+            except:
+                pass
+        try:
+            return self.definitions[key]
+        except KeyError:
+            raise KeyError(f"Unknown campaign template {key}") from None
+
+    def _save(self):
+        """Persist the catalog atomically"""
+        if not self.path:
+            return
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(self.definitions, f, indent=2)
+        os.replace(temp_path, self.path)
+
+
+class CampaignRecord(MutableMapping):
+    """
+    Compact campaign that behaves like the expanded campaign dict
+
+    Campaign records are treated as immutable once stored: CampaignManager
+    modifies a copy() and puts it back.
+    """
+
+    __slots__ = _COMPACT_FIELDS + (
+        "template_version", "anchor", "tz", "offsets", "sent", "sent_at", "_definition", "_catalog", "_extra",
+    )
+
+    def __init__(self, catalog):
+        """
+        Initialize an empty record
+
+        Args:
+            catalog: TemplateCatalog holding touchpoint definitions
+        """
+        for field in _COMPACT_FIELDS:
+            object.__setattr__(self, field, _MISSING)
+        self._catalog = catalog
+        self._extra = None
+        self.template_version = None
+        self._definition = ()
+        self.tz = DEFAULT_TIMEZONE
+        self.anchor = 0
+        self.offsets = []
+        self.sent = 0
+        self.sent_at = {}
+
+    @classmethod
+    def from_expanded(cls, data, catalog):
+        """Build a record from an expanded campaign dictionary (older files, plain dicts put)"""
+        record = cls(catalog)
+        for key, value in data.items():
+            if key != "scheduled_touchpoints":
+                record[key] = value
+        if "scheduled_touchpoints" in data:
+            # After campaign_type, which the definition is catalogued under
+            record["scheduled_touchpoints"] = data["scheduled_touchpoints"]
+        return record
+
+    @classmethod
+    def from_schedule(cls, catalog, version, definition, epochs, tz, fields):
+        """
+        Build a new campaign from its catalogued definition and send times
+
+        Args:
+            catalog: TemplateCatalog
+            version, definition: From catalog.intern()
+            epochs: Send time (epoch seconds) of each touchpoint in definition
+            tz: Lead's timezone name
+            fields: lead_id, campaign_type, status, created_at, lead_data, tags
+        """
+        record = cls(catalog)
+        for key, value in fields.items():
+            record[key] = value
+        record.template_version = version
+        record._definition = definition
+        record.tz = tz
+        record._set_epochs(epochs)
+        return record
+
+    @classmethod
+    def from_dict(cls, data, catalog):
+        """Build a record from its stored (compact) form"""
+        record = cls(catalog)
+        data = dict(data)
+        version = data.pop("template_version")
+        if version is not None:
+            record.template_version = version
+            record._definition = catalog.get(data.get("campaign_type"), version)
+        record.tz = data.pop("tz", DEFAULT_TIMEZONE)
+        anchor = data.pop("anchor", None)
+        record.anchor = int(datetime.fromisoformat(anchor).timestamp()) if anchor else 0
+        record.offsets = data.pop("offsets", [])
+        record.sent = int(data.pop("sent", "0"), 16)
+        record.sent_at = {int(index): when for index, when in data.pop("sent_at", {}).items()}
+        for key, value in data.items():
+            record[key] = value
+        return record
+
+    @staticmethod
+    def is_compact(data):
+        """Whether a stored campaign is compact (as opposed to fully expanded)"""
+        return "template_version" in data
+
+    def to_dict(self):
+        """Compact, JSON-serializable form"""
+        data = {}
+        for field in _COMPACT_FIELDS:
+            value = getattr(self, field)
+            if value is not _MISSING:
+                data[field] = value
+        data.update({
+            "template_version": self.template_version,
+            "anchor": datetime.fromtimestamp(self.anchor, load_zone(self.tz)).isoformat(),
+            "tz": self.tz,
+            "offsets": self.offsets,
+            "sent": format(self.sent, "x"),
+            "sent_at": {str(index): when for index, when in sorted(self.sent_at.items())},
+        })
+        if self._extra:
+            data.update(self._extra)
+        return data
+
+    def copy(self):
+        """Independent copy to modify"""
+        record = CampaignRecord(self._catalog)
+        for field in _COMPACT_FIELDS:
+            value = getattr(self, field)
+            if isinstance(value, (dict, list)):
+                value = type(value)(value)
+            object.__setattr__(record, field, value)
+        record.template_version = self.template_version
+        record._definition = self._definition
+        record.anchor = self.anchor
+        record.tz = self.tz
+        record.offsets = list(self.offsets)
+        record.sent = self.sent
+        record.sent_at = dict(self.sent_at)
+        record._extra = dict(self._extra) if self._extra else None
+        return record
+
+    def _set_touchpoints(self, touchpoints):
+        """Compact a list of expanded touchpoints"""
+        definition = [
+            {k: v for k, v in touchpoint.items() if k not in TOUCHPOINT_STATE_FIELDS} for touchpoint in touchpoints
+        ]
+        campaign_type = self.campaign_type if self.campaign_type is not _MISSING else None
+        self.template_version, self._definition = self._catalog.intern(campaign_type, definition)
+
+        times = [datetime.fromisoformat(touchpoint["scheduled_time"]) for touchpoint in touchpoints]
+        if times and getattr(times[0].tzinfo, "zone", None):
+            self.tz = times[0].tzinfo.zone
+        elif self.lead_data is not _MISSING and self.lead_data.get("timezone"):
+            self.tz = load_zone(lead_timezone(self.lead_data)).zone
+        self._set_epochs([int(when.timestamp()) for when in times])
+        self.sent = 0
+        self.sent_at = {}
+        for index, touchpoint in enumerate(touchpoints):
+            if touchpoint.get("status") == "sent":
+                self.sent |= 1 << index
+                self.sent_at[index] = touchpoint.get("sent_at")
+
+    def _set_epochs(self, epochs):
+        """Anchor and offsets from the touchpoint send times (epoch seconds)"""
+        self.anchor = min(epochs) if epochs else 0
+        self.offsets = [epoch - self.anchor for epoch in epochs]
+
+    def scheduled_touchpoints(self):
+        """Expanded touchpoints, in schedule order"""
+        zone = load_zone(self.tz)
+        return [self.touchpoint(index, zone) for index in range(len(self.offsets))]
+
+    def touchpoint(self, index, zone=None):
+        """One expanded touchpoint"""
+        return {
+            **self._definition[index],
+            "scheduled_time": datetime.fromtimestamp(self.anchor + self.offsets[index], zone or load_zone(self.tz)).isoformat(),
+            "status": "sent" if self.sent >> index & 1 else "pending",
+            "sent_at": self.sent_at.get(index),
+        }
+
+    def completed_touchpoints(self):
+        """Expanded sent touchpoints, in the order they were sent"""
+        scheduled = self.scheduled_touchpoints()
+        order = sorted(self.sent_at, key=lambda index: (self.sent_at[index] or "", index))
+        return [scheduled[index] for index in order]
+
+    def is_sent(self, index):
+        """Whether a touchpoint was sent"""
+        return bool(self.sent >> index & 1)
+
+    def mark_sent(self, index, sent_at):
+        """Record a touchpoint as sent (False if out of range or already sent)"""
+        if index >= len(self.offsets) or self.is_sent(index):
+            return False
+        self.sent |= 1 << index
+        self.sent_at[index] = sent_at
+        return True
+
+    def pending(self):
+        """(scheduled epoch, index, definition) of every pending touchpoint, without expanding"""
+        return [
+            (self.anchor + offset, index, definition)
+            for index, (definition, offset) in enumerate(zip(self._definition, self.offsets))
+            if not self.sent >> index & 1
+        ]
+
+    def __getitem__(self, key):
+        if key in _COMPACT_FIELDS:
+            value = getattr(self, key)
+            if value is _MISSING:
+                raise KeyError(key)
+            return value
+        if key == "scheduled_touchpoints":
+            return self.scheduled_touchpoints()
+        if key == "completed_touchpoints":
+            return self.completed_touchpoints()
+        if self._extra and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key == "lead_data":
+            object.__setattr__(self, key, _trim_lead(value))
+        elif key in _COMPACT_FIELDS:
+            object.__setattr__(self, key, value)
+        elif key == "scheduled_touchpoints":
+            self._set_touchpoints(value)
+        elif key == "completed_touchpoints":
+            # Derived from the touchpoint statuses
+            pass
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+        if key in _COMPACT_FIELDS:
+            if getattr(self, key) is _MISSING:
+                raise KeyError(key)
+            object.__setattr__(self, key, _MISSING)
+        elif self._extra and key in self._extra:
+            del self._extra[key]
+        else:
+            raise KeyError(key)
+
+    def __iter__(self):
+        for field in ("lead_id", "campaign_type", "status", "created_at", "lead_data"):
+            if getattr(self, field) is not _MISSING:
+                yield field
+        yield from _DERIVED_FIELDS
+        if self.tags is not _MISSING:
+            yield "tags"
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"CampaignRecord({self.to_dict()!r})"
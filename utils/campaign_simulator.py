@@ -0,0 +1,433 @@
+"""
+Campaign Simulator - Replays weeks of campaigns against a virtual clock
+
+Drives a real CampaignManager, TouchpointQueue and TouchpointDispatcher with
+a VirtualClock instead of the wall clock: leads arrive and get campaigns
+(create_campaign), the dispatcher polls every `step` seconds for due
+touchpoints and sends them through a recording sender, some leads reply
+(stop_campaign_on_response) and some campaigns are paused and resumed.
+Manual touchpoints (quotes Phil sends himself) are marked sent on the poll
+they come due, as if he kept up with them. Idle stretches are skipped, so
+a month of thousands of leads takes minutes rather than a month.
+
+The run reports throughput, storage growth, peak memory and scheduling lag,
+and checks the invariants campaigns must keep (see CampaignSimulator.check),
+so the same run works as a load benchmark and as a correctness harness.
+
+Usage:
+    python -m utils.campaign_simulator [--leads 1000] [--days 30] [--arrival-days 7]
+        [--reply-rate 0.01] [--pause-rate 0.05] [--step 60] [--seed 1]
+        [--backend json] [--trace-memory]
+"""
+import argparse
+import heapq
+import math
+import os
+import random
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+from .campaign_manager import CampaignManager
+from .campaign_model import touchpoint_counts
+from .send_capacity import RateLimiter, sender_for
+from .touchpoint_dispatcher import CHANNELS, TouchpointDispatcher, TouchpointSender
+
+
+TIMEZONES = ["America/New_York", "America/Chicago", "America/Denver", "America/Los_Angeles"]
+
+# A Monday morning, so runs are reproducible
+DEFAULT_START = datetime(2025, 10, 20, 8, 0)
+
+
+class VirtualClock:
+    """Clock that only moves when told to (usable as a clock and as sleep)"""
+
+    def __init__(self, start):
+        """
+        Initialize the clock
+
+        Args:
+            start: Seconds since the epoch
+        """
+        self.now = float(start)
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        return self.now
+
+    def advance_to(self, when):
+        """Move the clock forward to `when` (never backwards)"""
+        with self.lock:
+            self.now = max(self.now, float(when))
+
+    def sleep(self, seconds):
+        """Pass `seconds` of virtual time"""
+        with self.lock:
+            self.now += seconds
+
+
+class RecordingSender(TouchpointSender):
+    """Records every delivery with the virtual time it happened at"""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.sent = []          # (virtual time, lead_id, channel, template)
+        self.lock = threading.Lock()
+
+    def send(self, lead_data, touchpoint, message):
+        """Record the message"""
+        with self.lock:
+            self.sent.append((self.clock(), lead_data.get("lead_id"), touchpoint.get("type"), touchpoint.get("template")))
+
+
+def make_lead(i, rng):
+    """Lead with contact details, spread over the US timezones"""
+    lead_id = str(50000000 + i)
+    return {
+        "lead_id": lead_id,
+        "name": f"Borrower {i}",
+        "email": f"borrower{i}@example.com",
+        "phone": f"{5550000000 + i}",
+        "property_value": rng.randrange(300000, 1500000, 5000),
+        "cash_out_amount": rng.randrange(10000, 150000, 1000),
+        "timezone": TIMEZONES[i % len(TIMEZONES)],
+    }
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list (0 if empty)"""
+    if not values:
+        return 0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(math.ceil(fraction * len(ordered))) - 1)]
+
+
+class CampaignSimulator:
+    """
+    Runs campaigns for many leads against a virtual clock
+
+    Usage:
+        simulator = CampaignSimulator(leads=1000, days=30)
+        report = simulator.run()
+        assert not report["violations"]
+    """
+
+    def __init__(self, leads=1000, days=30, arrival_days=7, reply_rate=0.01, pause_rate=0.05, pause_days=2,
+                 step=60, seed=1, campaigns_file=None, backend="json", send_limits=None, start=None,
+                 campaign_type="new_lead_cashout"):
+        """
+        Initialize the simulation
+
+        Args:
+            leads: Number of leads that arrive
+            days: Simulated days
+            arrival_days: Leads arrive uniformly over this many days
+            reply_rate: Chance that a sent touchpoint gets a reply (stops the campaign)
+            pause_rate: Chance that a campaign is paused once
+            pause_days: How long paused campaigns stay paused
+            step: Seconds between dispatcher polls
+            seed: Random seed (same seed, same run)
+            campaigns_file: Campaigns file (defaults to a temporary directory)
+            backend: Campaign store backend ("json" or "sqlite")
+            send_limits: Send limits (defaults to send_capacity.DEFAULT_SEND_LIMITS)
+            start: Start datetime (naive = local time)
+            campaign_type: Campaign every lead gets
+        """
+        self.lead_count = leads
+        self.days = days
+        self.arrival_days = arrival_days
+        self.reply_rate = reply_rate
+        self.pause_rate = pause_rate
+        self.pause_days = pause_days
+        self.step = step
+        self.campaign_type = campaign_type
+        self.rng = random.Random(seed)
+        self.start = (start or DEFAULT_START).timestamp()
+        self.end = self.start + days * 86400
+
+        self.campaigns_file = campaigns_file or os.path.join(tempfile.mkdtemp(), "campaigns.json")
+        self.backend = backend
+        self.clock = VirtualClock(self.start)
+        self.manager = CampaignManager(self.campaigns_file, backend=backend, send_limits=send_limits, clock=self.clock)
+        self.limits = self.manager.send_planner.limits
+        self.sender = RecordingSender(self.clock)
+        self.dispatcher = TouchpointDispatcher(
+            self.manager, {channel: self.sender for channel in CHANNELS}, max_workers=1,
+            limiter=RateLimiter(self.limits, clock=self.clock, sleep=self.clock.sleep),
+        )
+
+        self.actions = []       # heap of (virtual time, seq, action, lead_id)
+        self._seq = 0
+        self.leads = {}
+        self.inactive = {}      # lead_id -> [(from, until or None)] when sends are not allowed
+        self.timings = {"dispatch": 0.0, "actions": 0.0}
+        self.manual_sent = 0
+        self.storage = []       # (simulated day, bytes on disk)
+        self.polls = 0
+
+    def _schedule(self, when, action, lead_id):
+        """Queue an action for a virtual time"""
+        self._seq += 1
+        heapq.heappush(self.actions, (when, self._seq, action, lead_id))
+
+    def _apply(self, action, lead_id, now):
+        """Apply one lead action at virtual time `now`"""
+        campaign = self.manager.get_campaign(lead_id)
+        if action == "create":
+            self.manager.create_campaign(lead_id, self.campaign_type, self.leads[lead_id])
+            if self.rng.random() < self.pause_rate:
+                self._schedule(now + self.rng.uniform(0, 10 * 86400), "pause", lead_id)
+        elif not campaign or campaign["status"] == "stopped":
+            return
+        elif action == "reply":
+            self.manager.stop_campaign_on_response(lead_id)
+            self.inactive.setdefault(lead_id, []).append((now, None))
+        elif action == "pause" and campaign["status"] == "active":
+            self.manager.update_campaign_status(lead_id, "paused")
+            self.inactive.setdefault(lead_id, []).append((now, now + self.pause_days * 86400))
+            self._schedule(now + self.pause_days * 86400, "resume", lead_id)
+        elif action == "resume" and campaign["status"] == "paused":
+            self.manager.update_campaign_status(lead_id, "active")
+
+    def _send_manual(self, now):
+        """Mark the manual touchpoints due by `now` sent (Phil's part of the campaign)"""
+        due = [(item["lead_id"], item["index"], self.manager.now().isoformat())
+               for item in self.dispatcher.queue.due(datetime.fromtimestamp(now)) if item["touchpoint"].get("manual")]
+        self.manual_sent += self.manager.mark_touchpoints_sent(due)
+
+    def _next_poll(self, now, due):
+        """First poll time at or after `due` and strictly after `now`"""
+        ticks = math.ceil((max(now, due) - self.start) / self.step)
+        if self.start + ticks * self.step <= now:
+            ticks = math.floor((now - self.start) / self.step) + 1
+        return self.start + ticks * self.step
+
+    def _storage_bytes(self):
+        """Size of the campaign files (snapshot, event log, template catalog or database)"""
+        directory = os.path.dirname(os.path.abspath(self.campaigns_file))
+        stem = os.path.splitext(os.path.basename(self.campaigns_file))[0]
+        return sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory)
+                   if name.startswith(stem))
+
+    def run(self, trace_memory=False):
+        """
+        Run the simulation to the end
+
+        Args:
+            trace_memory: Measure peak Python memory with tracemalloc (slower)
+
+        Returns:
+            Report dictionary (see report())
+        """
+        for i in range(self.lead_count):
+            lead = make_lead(i, self.rng)
+            self.leads[lead["lead_id"]] = lead
+            self._schedule(self.start + self.rng.uniform(0, self.arrival_days * 86400), "create", lead["lead_id"])
+
+        if trace_memory:
+            tracemalloc.start()
+        wall_start = time.perf_counter()
+        next_poll = self.start
+        next_day = self.start
+        sent_seen = 0
+        while True:
+            now = self.clock()
+            if now >= next_day:
+                self.storage.append((round((now - self.start) / 86400), self._storage_bytes()))
+                next_day += 86400
+            if now >= self.end:
+                break
+
+            started = time.perf_counter()
+            while self.actions and self.actions[0][0] <= now:
+                _, _, action, lead_id = heapq.heappop(self.actions)
+                self._apply(action, lead_id, now)
+            self.timings["actions"] += time.perf_counter() - started
+
+            if now >= next_poll:
+                started = time.perf_counter()
+                self.dispatcher.run_once(datetime.fromtimestamp(now))
+                self._send_manual(now)
+                self.timings["dispatch"] += time.perf_counter() - started
+                self.polls += 1
+                for sent_time, lead_id, _, _ in self.sender.sent[sent_seen:]:
+                    if self.rng.random() < self.reply_rate:
+                        self._schedule(sent_time + self.rng.uniform(60, 4 * 3600), "reply", lead_id)
+                sent_seen = len(self.sender.sent)
+
+            # Skip to the next thing that happens
+            now = self.clock()
+            upcoming = self.dispatcher.queue.next_due()
+            next_poll = self._next_poll(now, upcoming[0].timestamp() if upcoming else self.end)
+            wake = min(next_poll, next_day, self.actions[0][0] if self.actions else self.end)
+            self.clock.advance_to(wake)
+
+        wall_seconds = time.perf_counter() - wall_start
+        peak_memory = None
+        if trace_memory:
+            peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        return self.report(wall_seconds, peak_memory)
+
+    def report(self, wall_seconds, peak_memory=None):
+        """
+        Summary of a finished run
+
+        Returns:
+            Dictionary with "leads", "simulated_days", "wall_seconds",
+            "touchpoints_sent", "sends_per_second", "simulated_days_per_second",
+            "polls", "dispatch_seconds", "action_seconds", "storage" [(day, bytes)],
+            "peak_memory_bytes", "lag_seconds" {"p50", "p95", "max"},
+            "campaigns" {status: count} and "violations" (see check())
+        """
+        lags = self._lags()
+        statuses = {}
+        for campaign in self.manager.get_all_campaigns().values():
+            statuses[campaign["status"]] = statuses.get(campaign["status"], 0) + 1
+        sent = len(self.sender.sent)
+        return {
+            "leads": self.lead_count,
+            "simulated_days": self.days,
+            "wall_seconds": wall_seconds,
+            "touchpoints_sent": sent,
+            "manual_touchpoints": self.manual_sent,
+            "sends_per_second": sent / wall_seconds if wall_seconds else 0.0,
+            "simulated_days_per_second": self.days / wall_seconds if wall_seconds else 0.0,
+            "polls": self.polls,
+            "dispatch_seconds": self.timings["dispatch"],
+            "action_seconds": self.timings["actions"],
+            "storage": list(self.storage),
+            "peak_memory_bytes": peak_memory,
+            "lag_seconds": {"p50": percentile(lags, 0.5), "p95": percentile(lags, 0.95),
+                            "max": max(lags) if lags else 0},
+            "campaigns": statuses,
+            "violations": self.check(),
+        }
+
+    def _lags(self):
+        """Seconds between scheduled and actual send of every touchpoint sent (those held by a pause aside)"""
+        lags = []
+        campaigns = self.manager.get_all_campaigns()
+        for lead_id, campaign in campaigns.items():
+            for touchpoint in campaign["completed_touchpoints"]:
+                scheduled = datetime.fromisoformat(touchpoint["scheduled_time"]).timestamp()
+                if any(start <= scheduled < until for start, until in self.inactive.get(lead_id, []) if until):
+                    continue
+                lags.append(datetime.fromisoformat(touchpoint["sent_at"]).timestamp() - scheduled)
+        return lags
+
+    def check(self):
+        """
+        Invariants of the finished run
+
+        - no touchpoint is sent before its scheduled time, twice, or out of
+          order (manual touchpoints aside, which the dispatcher skips)
+        - nothing is sent while a campaign is paused or after it stopped
+        - scheduled touchpoints stay within the per-minute channel and sender limits
+        - every active campaign's touchpoints due before the last poll were sent
+        - the stored campaigns agree with what was sent, also after a reload
+
+        Returns:
+            List of violation descriptions (empty if the run was correct)
+        """
+        violations = []
+        campaigns = self.manager.get_all_campaigns()
+
+        sends = {}
+        for sent_time, lead_id, channel, template in self.sender.sent:
+            sends.setdefault(lead_id, []).append((sent_time, channel, template))
+            for paused_from, paused_until in self.inactive.get(lead_id, []):
+                if sent_time > paused_from and (paused_until is None or sent_time < paused_until):
+                    violations.append(f"lead {lead_id}: {template} sent while paused or stopped")
+
+        booked = {}
+        cutoff = self.end - self.step
+        for lead_id, campaign in campaigns.items():
+            touchpoints = campaign["scheduled_touchpoints"]
+            completed = [(i, tp) for i, tp in enumerate(touchpoints) if tp["status"] == "sent" and not tp.get("manual")]
+            if len(sends.get(lead_id, [])) != len(completed):
+                violations.append(f"lead {lead_id}: {len(sends.get(lead_id, []))} sends but "
+                                  f"{len(completed)} touchpoints marked sent")
+            if [template for _, _, template in sends.get(lead_id, [])] != [tp["template"] for _, tp in completed]:
+                violations.append(f"lead {lead_id}: touchpoints sent out of order")
+            for index, touchpoint in enumerate(touchpoints):
+                scheduled = datetime.fromisoformat(touchpoint["scheduled_time"]).timestamp()
+                if touchpoint["status"] == "sent" and datetime.fromisoformat(touchpoint["sent_at"]).timestamp() < scheduled:
+                    violations.append(f"lead {lead_id}: touchpoint {index} sent early")
+                if campaign["status"] == "active" and touchpoint["status"] == "pending" and scheduled < cutoff:
+                    violations.append(f"lead {lead_id}: touchpoint due {touchpoint['scheduled_time']} never sent")
+                channel = touchpoint["type"]
+                minute = int(scheduled // 60)
+                for key in ((channel, None), (channel, sender_for(self.limits, channel, lead_id))):
+                    booked[key + (minute,)] = booked.get(key + (minute,), 0) + 1
+
+        for (channel, sender, minute), count in booked.items():
+            limits = self.limits.get(channel)
+            if not limits:
+                continue
+            limit = limits["per_minute"] if sender is None else limits["senders"].get(sender)
+            if limit is not None and count > limit:
+                violations.append(f"{channel} {sender or 'channel'}: {count} touchpoints booked in one minute")
+
+        reloaded = CampaignManager(self.campaigns_file, backend=self.backend, send_limits=self.limits,
+                                   clock=self.clock).get_all_campaigns()
+        for lead_id, campaign in campaigns.items():
+            stored = reloaded.get(lead_id)
+            if not stored or stored["status"] != campaign["status"] or \
+                    touchpoint_counts(stored) != touchpoint_counts(campaign):
+                violations.append(f"lead {lead_id}: reloaded campaign differs")
+        return violations
+
+
+def print_report(report):
+    """Print a report as aligned lines"""
+    lag = report["lag_seconds"]
+    print(f"Leads:                {report['leads']:,}")
+    print(f"Simulated days:       {report['simulated_days']:,}")
+    print(f"Wall time:            {report['wall_seconds']:,.1f} s "
+          f"({report['simulated_days_per_second']:,.2f} simulated days/s)")
+    print(f"Touchpoints sent:     {report['touchpoints_sent']:,} ({report['sends_per_second']:,.0f}/s), "
+          f"{report['manual_touchpoints']:,} manual")
+    print(f"Dispatcher polls:     {report['polls']:,} ({report['dispatch_seconds']:,.1f} s)")
+    print(f"Lead actions:         {report['action_seconds']:,.1f} s (create, reply, pause, resume)")
+    print(f"Send lag:             p50 {lag['p50']:,.0f} s, p95 {lag['p95']:,.0f} s, max {lag['max']:,.0f} s")
+    print(f"Campaigns:            " + ", ".join(f"{count:,} {status}" for status, count in sorted(report["campaigns"].items())))
+    if report["storage"]:
+        day, size = report["storage"][-1]
+        print(f"Storage:              {size / 1e6:,.1f} MB after {day} days "
+              f"({size / max(1, report['leads']) / 1e3:,.1f} KB per lead)")
+    if report["peak_memory_bytes"] is not None:
+        print(f"Peak memory:          {report['peak_memory_bytes'] / 1e6:,.1f} MB")
+    print(f"Violations:           {len(report['violations']):,}")
+    for violation in report["violations"][:20]:
+        print(f"    {violation}")
+
+
+def main(argv=None):
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description="Simulate campaigns against a virtual clock")
+    parser.add_argument("--leads", type=int, default=1000, help="Leads that arrive")
+    parser.add_argument("--days", type=int, default=30, help="Simulated days")
+    parser.add_argument("--arrival-days", type=float, default=7, help="Days over which leads arrive")
+    parser.add_argument("--reply-rate", type=float, default=0.01, help="Chance a sent touchpoint gets a reply")
+    parser.add_argument("--pause-rate", type=float, default=0.05, help="Chance a campaign is paused once")
+    parser.add_argument("--step", type=float, default=60, help="Seconds between dispatcher polls")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--backend", choices=["json", "sqlite"], default="json")
+    parser.add_argument("--trace-memory", action="store_true", help="Measure peak memory (slower)")
+    args = parser.parse_args(argv)
+
+    simulator = CampaignSimulator(
+        leads=args.leads, days=args.days, arrival_days=args.arrival_days, reply_rate=args.reply_rate,
+        pause_rate=args.pause_rate, step=args.step, seed=args.seed, backend=args.backend,
+    )
+    report = simulator.run(trace_memory=args.trace_memory)
+    print_report(report)
+    return 1 if report["violations"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
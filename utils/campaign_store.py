@@ -0,0 +1,575 @@
+"""
+Campaign Store - In-memory campaign cache over a JSON file or SQLite database
+
+CampaignManager used to re-parse campaigns.json on every lookup. The stores
+here keep all campaigns in a dict, so reads are dictionary lookups, and write
+back only what changed:
+
+    JsonCampaignStore    data/campaigns.json, one compact campaign per line,
+                         plus an append-only event log (see below). The file's
+                         mtime and size and the log's size are checked on
+                         refresh() to pick up other processes' writes.
+    SqliteCampaignStore  data/campaigns.db, one row per campaign. flush()
+                         upserts only dirty rows; PRAGMA data_version tells
+                         refresh() when another connection committed.
+
+Campaigns are held as CampaignRecord objects (see utils/campaign_model.py);
+touchpoint definitions they reference live in <campaigns>_templates.json.
+Campaigns still stored fully expanded are compacted on load.
+
+State changes are recorded with append(events), events being
+(op, lead_id, changes) tuples:
+
+    created          changes = the stored campaign (CampaignRecord.to_dict())
+    touchpoint_sent  changes = {"index": 3, "sent_at": "..."}
+    paused, resumed, stopped, status, lead_updated
+                     changes = {field: new value} (status, tags, lead_data, ...)
+
+The JSON backend appends them to data/campaigns_events.jsonl (a ChangeFeed)
+instead of rewriting campaigns.json, which becomes a snapshot: every
+`snapshot_every` events the in-memory projection is written to it (only
+campaigns changed since the last snapshot are re-encoded) and the log is
+rotated to data/campaigns_events.previous.jsonl. Loading reads the snapshot
+and replays the log. Every event sets
+absolute values, so replaying events a snapshot already contains (a crash
+between writing the snapshot and truncating the log) gives the same state.
+Processes sharing the files (the app and the dispatcher) serialize replay,
+append, snapshot and truncation with an flock on <campaigns>.json.lock, so
+no process truncates events it has not folded into its snapshot. The
+SQLite backend upserts the changed rows directly and records the events in an
+events table (the latest `keep_events` are kept).
+
+Event sequence numbers keep increasing across snapshots, so consumers that
+follow campaigns (funnel analytics, the analytics export) remember the `seq`
+they have seen and ask events_since(seq) for what changed after it instead of
+rescanning every campaign. Events older than the previous log are gone; then
+events_since() returns None and the consumer rescans all().
+
+Campaigns handed out are never modified in place - CampaignManager puts a
+modified copy - and adding a lead swaps in a new dict, so a dict returned by
+all() is a stable snapshot (the same contract as LeadDataManager).
+"""
+import contextlib
+import json
+import os
+import sqlite3
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None    # no flock (Windows): a single process may use the files
+
+from .campaign_model import CampaignRecord, TemplateCatalog
+from .change_feed import ChangeFeed
+
+
+CAMPAIGN_BACKENDS = ("json", "sqlite")
+
+
+def catalog_path(path):
+    """Touchpoint definition file that goes with a campaigns file or database"""
+    return f"{os.path.splitext(str(path))[0]}_templates.json"
+
+
+def events_path(path):
+    """Event log that goes with a campaigns file"""
+    return f"{os.path.splitext(str(path))[0]}_events.jsonl"
+
+
+def previous_events_path(path):
+    """Event log a campaigns file's last snapshot rotated out"""
+    return f"{os.path.splitext(str(path))[0]}_events.previous.jsonl"
+
+
+def apply_event(campaign, op, changes, catalog):
+    """
+    Campaign after one state-change event
+
+    Args:
+        campaign: Current CampaignRecord (None if the lead has none)
+        op: Event type ("created", "touchpoint_sent", "paused", ...)
+        changes: Event payload
+        catalog: TemplateCatalog the campaign's definitions are in
+
+    Returns:
+        New CampaignRecord (the current one is not modified), None if the
+        event does not apply
+    """
+    if op == "created":
+        return CampaignRecord.from_dict(changes, catalog)
+    if campaign is None:
+        return None
+    campaign = campaign.copy()
+    if op == "touchpoint_sent":
+        campaign.mark_sent(changes["index"], changes["sent_at"])
+    else:
+        campaign.update(changes)
+    return campaign
+
+
+def apply_events(campaigns, events, catalog):
+    """
+    Campaigns after a batch of state-change events
+
+    Args:
+        campaigns: Current campaigns (lead_id -> CampaignRecord, not modified)
+        events: Iterable of (op, lead_id, changes)
+        catalog: TemplateCatalog the campaigns' definitions are in
+
+    Returns:
+        Dictionary of lead_id -> new CampaignRecord of every lead the events changed
+    """
+    changed = {}
+    for op, lead_id, changes in events:
+        lead_id = str(lead_id)
+        current = changed[lead_id] if lead_id in changed else campaigns.get(lead_id)
+        campaign = apply_event(current, op, changes, catalog)
+        if campaign is not None:
+            changed[lead_id] = campaign
+    return changed
+
+
+def _encode(campaign):
+    """A campaign as one line of the campaigns file"""
+    return json.dumps(campaign.to_dict())
+
+
+def _decode(data, catalog):
+    """
+    CampaignRecord of a stored campaign
+
+    Returns:
+        (record, whether it was stored in the older expanded form)
+    """
+    if CampaignRecord.is_compact(data):
+        return CampaignRecord.from_dict(data, catalog), False
+    return CampaignRecord.from_expanded(data, catalog), True
+
+
+def _record(campaign, catalog):
+    """Campaigns put as expanded dictionaries are compacted"""
+    if isinstance(campaign, CampaignRecord):
+        return campaign
+    return CampaignRecord.from_expanded(campaign, catalog)
+
+
+def _put_all(campaigns, new, dirty, catalog):
+    """
+    Replace existing campaigns in place and mark everything put dirty
+
+    Returns:
+        Dictionary of the campaigns of leads not in `campaigns` yet (the
+        caller swaps in one new dict for all of them)
+    """
+    added = {}
+    for campaign in new:
+        campaign = _record(campaign, catalog)
+        lead_id = str(campaign["lead_id"])
+        if lead_id in campaigns:
+            campaigns[lead_id] = campaign
+        else:
+            added[lead_id] = campaign
+        dirty.add(lead_id)
+    return added
+
+
+class JsonCampaignStore:
+    """Campaigns cached from one JSON file"""
+
+    def __init__(self, path, catalog=None, snapshot_every=1000):
+        """
+        Initialize the store, load the snapshot and replay the event log
+
+        Args:
+            path: Path of the campaigns JSON file (the snapshot)
+            catalog: TemplateCatalog (defaults to the one next to the file)
+            snapshot_every: Events appended between snapshots
+        """
+        self.path = str(path)
+        self.catalog = catalog or TemplateCatalog(catalog_path(path))
+        self.events = ChangeFeed(events_path(path))
+        self.snapshot_every = snapshot_every
+        self.campaigns = {}     # lead_id -> campaign
+        self.dirty = set()      # lead_ids whose encoded JSON is stale
+        self._encoded = {}      # lead_id -> cached JSON fragment
+        self._signature = None  # (mtime_ns, size) of the file as last read/written
+        self._log_offset = 0    # end of the last event applied
+        self._log_events = 0    # events in the log (since the last snapshot)
+        self.seq = 0            # sequence number of the last event applied
+        self._lock_path = f"{self.path}.lock"
+        self._lock_file = None  # open lock file while this store holds the lock
+        self._lock_depth = 0
+        with self._locked():
+            self._drop_torn_event()
+            self._load()
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """
+        Hold the exclusive file lock shared with other processes
+
+        Re-entrant within the store (append() snapshots while holding it).
+        """
+        if fcntl is None:
+            yield
+            return
+        if self._lock_depth == 0:
+            self._lock_file = open(self._lock_path, 'a')
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+        self._lock_depth += 1
+        try:
+            yield
+        finally:
+            self._lock_depth -= 1
+            if self._lock_depth == 0:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+                self._lock_file.close()
+                self._lock_file = None
+
+    def _stat(self):
+        """(mtime_ns, size) of the file, None if it does not exist"""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _load(self):
+        """(Re)load every campaign from the file"""
+        self._signature = self._stat()
+        try:
+            with open(self.path, 'r') as f:
+                campaigns = json.load(f)
+        except:
+            campaigns = {}
+        self.campaigns = {}
+        migrated = False
+        for lead_id, data in campaigns.items():
+            self.campaigns[str(lead_id)], expanded = _decode(data, self.catalog)
+            migrated = migrated or expanded
+        self._encoded = {}
+        self.dirty = set(self.campaigns)
+        self._log_offset = 0
+        self._log_events = 0
+        # Numbering continues from the log the last snapshot rotated out
+        self.seq = ChangeFeed(previous_events_path(self.path)).last_seq
+        self._replay()
+        if migrated:
+            self.snapshot()
+
+    def _log_size(self):
+        """Size of the event log in bytes"""
+        try:
+            return os.path.getsize(self.events.path)
+        except OSError:
+            return 0
+
+    def _drop_torn_event(self):
+        """Cut an event left half-written by a crash off the end of the log"""
+        size = self._log_size()
+        if not size:
+            return
+        with open(self.events.path, 'rb+') as f:
+            f.seek(size - 1)
+            if f.read(1) == b"\n":
+                return
+            # Scan back in chunks to the last complete event (or the start)
+            end = size - 1
+            while end > 0:
+                start = max(0, end - 65536)
+                f.seek(start)
+                newline = f.read(end - start).rfind(b"\n")
+                if newline >= 0:
+                    f.truncate(start + newline + 1)
+                    return
+                end = start
+            f.truncate(0)
+
+    def _replay(self):
+        """Apply the events appended after the last one applied; returns how many"""
+        events = []
+        for event, offset in self.events.read_from(self._log_offset):
+            events.append((event["op"], event["lead_id"], event["changes"]))
+            self._log_offset = offset
+            self.seq = max(self.seq, event["seq"])
+        self.put_many(apply_events(self.campaigns, events, self.catalog).values())
+        self._log_events += len(events)
+        return len(events)
+
+    def refresh(self):
+        """
+        Pick up snapshots and events written by other processes
+
+        Returns:
+            True if any campaign changed
+        """
+        with self._locked():
+            return self._catch_up()
+
+    def _catch_up(self):
+        """Reload after another process's snapshot, else replay new events; True if anything changed"""
+        if self._stat() != self._signature or self._log_size() < self._log_offset:
+            self._load()
+            return True
+        return self._replay() > 0
+
+    def get(self, lead_id):
+        """Campaign of a lead (None if it has none)"""
+        return self.campaigns.get(str(lead_id))
+
+    def all(self):
+        """Snapshot of all campaigns (lead_id -> campaign)"""
+        return self.campaigns
+
+    def append(self, events):
+        """
+        Record state changes: apply them and append them to the log in one write
+
+        Args:
+            events: List of (op, lead_id, changes)
+        """
+        if not events:
+            return
+        with self._locked():
+            # Catch up first; nobody else can append until the lock is released
+            self._catch_up()
+            self.put_many(apply_events(self.campaigns, events, self.catalog).values())
+            self.events.last_seq = self.seq
+            self.events.append_many(events)
+            self.seq = self.events.last_seq
+            self._log_offset = self._log_size()
+            self._log_events += len(events)
+            if self._log_events >= self.snapshot_every:
+                self.snapshot()
+
+    def events_since(self, seq):
+        """
+        Events applied after a sequence number, for consumers following the store
+
+        Args:
+            seq: Sequence number of the last event the consumer has seen
+
+        Returns:
+            List of event dictionaries (see utils/change_feed.py) up to self.seq,
+            None if some of them are no longer kept (rescan all() instead)
+        """
+        if seq >= self.seq:
+            return [] if seq == self.seq else None
+        with self._locked():
+            events = [event for event, _ in self.events.read_from(0, seq) if event["seq"] <= self.seq]
+            if not events or events[0]["seq"] > seq + 1:
+                previous = ChangeFeed(previous_events_path(self.path))
+                events = [event for event, _ in previous.read_from(0, seq)] + events
+        if not events or events[0]["seq"] != seq + 1:
+            return None
+        return events
+
+    def snapshot(self):
+        """Write the projection to the campaigns file and start a new log"""
+        with self._locked():
+            # Fold in what other processes wrote, so rotating loses none of it
+            self._catch_up()
+            self._write()
+            if self._log_size():
+                os.replace(self.events.path, previous_events_path(self.path))
+                with open(self.events.path, 'w'):
+                    pass
+            self._log_offset = 0
+            self._log_events = 0
+
+    def put(self, campaign):
+        """Store a campaign (record or expanded dict); it is written on the next flush()"""
+        self.put_many([campaign])
+
+    def put_many(self, campaigns):
+        """Store several campaigns; they are written on the next flush()"""
+        added = _put_all(self.campaigns, campaigns, self.dirty, self.catalog)
+        if added:
+            # New keys - swap in one new dict so snapshots handed out are never resized
+            self.campaigns = {**self.campaigns, **added}
+
+    def flush(self):
+        """Write the file, re-encoding only dirty campaigns"""
+        if self.dirty:
+            with self._locked():
+                self._write()
+
+    def _write(self):
+        """Rewrite the file from the cached encodings, re-encoding dirty campaigns"""
+        for lead_id in self.dirty:
+            if lead_id in self.campaigns:
+                self._encoded[lead_id] = _encode(self.campaigns[lead_id])
+        self.dirty = set()
+
+        if self.campaigns:
+            body = ",\n".join(f"{json.dumps(lead_id)}: {self._encoded[lead_id]}" for lead_id in self.campaigns)
+            text = "{\n" + body + "\n}"
+        else:
+            text = "{}"
+
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w') as f:
+            f.write(text)
+        os.replace(temp_path, self.path)
+        self._signature = self._stat()
+
+    def close(self):
+        """Write a final snapshot if events were appended since the last one"""
+        if self._log_events:
+            self.snapshot()
+
+
+class SqliteCampaignStore:
+    """Campaigns cached from a SQLite table (one row per campaign)"""
+
+    def __init__(self, path, migrate_from=None, catalog=None, keep_events=10000):
+        """
+        Initialize the store and load every campaign
+
+        Args:
+            path: Path of the SQLite database
+            migrate_from: campaigns JSON file imported when the database is empty
+            catalog: TemplateCatalog (defaults to the one next to the database)
+            keep_events: Latest events kept for events_since()
+        """
+        self.path = str(path)
+        self.catalog = catalog or TemplateCatalog(catalog_path(path))
+        self.keep_events = keep_events
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS campaigns (lead_id TEXT PRIMARY KEY, campaign TEXT NOT NULL)"
+        )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS events (seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "ts TEXT NOT NULL, op TEXT NOT NULL, lead_id TEXT NOT NULL, changes TEXT NOT NULL)"
+        )
+        self.connection.commit()
+        self.campaigns = {}
+        self.dirty = set()
+        self.seq = 0            # sequence number of the last event loaded or written
+        self._data_version = None
+        self._load()
+
+        if not self.campaigns and migrate_from and os.path.exists(migrate_from):
+            self.put_many(JsonCampaignStore(migrate_from, self.catalog).all().values())
+            self.flush()
+
+    def _version(self):
+        """Counter SQLite bumps when another connection commits"""
+        return self.connection.execute("PRAGMA data_version").fetchone()[0]
+
+    def _load(self):
+        """(Re)load every campaign from the table"""
+        rows = self.connection.execute("SELECT lead_id, campaign FROM campaigns ORDER BY rowid")
+        self.campaigns = {}
+        self.dirty = set()
+        for lead_id, campaign in rows:
+            self.campaigns[lead_id], expanded = _decode(json.loads(campaign), self.catalog)
+            if expanded:
+                self.dirty.add(lead_id)
+        self.seq = self._last_seq()
+        self._data_version = self._version()
+        self.flush()
+
+    def _last_seq(self):
+        """Sequence number of the newest event in the table"""
+        return self.connection.execute("SELECT MAX(seq) FROM events").fetchone()[0] or 0
+
+    def refresh(self):
+        """
+        Reload if another connection changed the database
+
+        Returns:
+            True if the campaigns were reloaded
+        """
+        if self._version() == self._data_version:
+            return False
+        self._load()
+        return True
+
+    def get(self, lead_id):
+        """Campaign of a lead (None if it has none)"""
+        return self.campaigns.get(str(lead_id))
+
+    def all(self):
+        """Snapshot of all campaigns (lead_id -> campaign)"""
+        return self.campaigns
+
+    def append(self, events):
+        """
+        Record state changes: apply them and upsert the changed rows
+
+        Args:
+            events: List of (op, lead_id, changes)
+        """
+        self.put_many(apply_events(self.campaigns, events, self.catalog).values())
+        if not events:
+            return
+        ts = datetime.now().isoformat()
+        with self.connection:
+            self._upsert_dirty()
+            self.connection.executemany(
+                "INSERT INTO events (ts, op, lead_id, changes) VALUES (?, ?, ?, ?)",
+                [(ts, op, str(lead_id), json.dumps(changes, default=str)) for op, lead_id, changes in events],
+            )
+            self.seq = self._last_seq()
+            self.connection.execute("DELETE FROM events WHERE seq <= ?", (self.seq - self.keep_events,))
+        self._data_version = self._version()
+
+    def events_since(self, seq):
+        """
+        Events written after a sequence number, for consumers following the store
+
+        Args:
+            seq: Sequence number of the last event the consumer has seen
+
+        Returns:
+            List of event dictionaries (see utils/change_feed.py) up to self.seq,
+            None if some of them are no longer kept (rescan all() instead)
+        """
+        if seq >= self.seq:
+            return [] if seq == self.seq else None
+        rows = self.connection.execute(
+            "SELECT seq, ts, op, lead_id, changes FROM events WHERE seq > ? AND seq <= ? ORDER BY seq",
+            (seq, self.seq),
+        )
+        events = [
+            {"seq": event_seq, "ts": ts, "op": op, "lead_id": lead_id, "changes": json.loads(changes)}
+            for event_seq, ts, op, lead_id, changes in rows
+        ]
+        if not events or events[0]["seq"] != seq + 1:
+            return None
+        return events
+
+    def put(self, campaign):
+        """Store a campaign (record or expanded dict); its row is written on the next flush()"""
+        self.put_many([campaign])
+
+    def put_many(self, campaigns):
+        """Store several campaigns; their rows are written on the next flush()"""
+        added = _put_all(self.campaigns, campaigns, self.dirty, self.catalog)
+        if added:
+            self.campaigns = {**self.campaigns, **added}
+
+    def flush(self):
+        """Upsert the dirty campaigns in one transaction"""
+        if not self.dirty:
+            return
+        with self.connection:
+            self._upsert_dirty()
+        self._data_version = self._version()
+
+    def _upsert_dirty(self):
+        """Upsert the dirty campaigns (inside the caller's transaction)"""
+        rows = [(lead_id, _encode(self.campaigns[lead_id])) for lead_id in self.dirty if lead_id in self.campaigns]
+        self.connection.executemany(
+            "INSERT INTO campaigns (lead_id, campaign) VALUES (?, ?) "
+            "ON CONFLICT(lead_id) DO UPDATE SET campaign = excluded.campaign",
+            rows,
+        )
+        self.dirty = set()
+
+    def close(self):
+        """Close the database connection"""
+        self.connection.close()
@@ -0,0 +1,201 @@
+"""
+Change Feed - Append-only change-data-capture log for the lead store
+
+Every add/update/delete in LeadDataManager appends one event:
+
+    {"seq": 17, "ts": "2025-10-28T18:16:00", "op": "update", "lead_id": "36391862",
+     "changes": {"cash_out_amount": [10000, 25000]}}
+
+Downstream consumers (campaigns, repricing, search) tail the feed from their
+own checkpoint instead of rescanning the whole book.
+"""
+import json
+import os
+from datetime import datetime
+
+
+def diff_fields(before, after):
+    """
+    Field-level diff between two lead dictionaries
+
+    Returns:
+        Dictionary of field -> [old value, new value] for every changed field
+    """
+    before = before or {}
+    after = after or {}
+    changes = {}
+    for key in list(before) + [k for k in after if k not in before]:
+        old = before.get(key)
+        new = after.get(key)
+        if old != new:
+            changes[key] = [old, new]
+    return changes
+
+
+class ChangeFeed:
+    """Append-only JSONL event log with monotonically increasing sequence numbers"""
+
+    def __init__(self, path):
+        """
+        Initialize the feed
+
+        Args:
+            path: Path of the .jsonl feed file
+        """
+        self.path = path
+        self.last_seq = self._read_last_seq()
+
+    def _read_last_seq(self):
+        """Find the sequence number of the last complete event"""
+        if not os.path.exists(self.path):
+            return 0
+
+        # Only the tail of the file is needed
+        with open(self.path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            block = 4096
+            while True:
+                start = max(0, size - block)
+                f.seek(start)
+                lines = f.read(size - start).splitlines()
+                for line in reversed(lines if start == 0 else lines[1:]):
+                    try:
+                        return json.loads(line)["seq"]
+                    except (ValueError, KeyError):
+                        continue
+                if start == 0:
+                    return 0
+                block *= 2
+
+    def append(self, op, lead_id, changes):
+        """
+        Append one change event
+
+        Args:
+            op: "add", "update" or "delete"
+            lead_id: ID of the changed lead
+            changes: Field-level diff (see diff_fields)
+
+        Returns:
+            The appended event
+        """
+        return self.append_many([(op, lead_id, changes)])[0]
+
+    def append_many(self, entries):
+        """
+        Append several events with a single write
+
+        Args:
+            entries: Iterable of (op, lead_id, changes)
+
+        Returns:
+            List of the appended events
+        """
+        ts = datetime.now().isoformat()
+        events = []
+        for op, lead_id, changes in entries:
+            self.last_seq += 1
+            events.append({"seq": self.last_seq, "ts": ts, "op": op, "lead_id": lead_id, "changes": changes})
+        if events:
+            with open(self.path, 'a') as f:
+                f.write("".join(json.dumps(event, separators=(",", ":"), default=str) + "\n" for event in events))
+        return events
+
+    def read_from(self, offset=0, since_seq=0, limit=None):
+        """
+        Read events starting at a byte offset
+
+        Args:
+            offset: Byte offset to start reading at (from a checkpoint)
+            since_seq: Skip events with seq <= since_seq
+            limit: Maximum number of events to return
+
+        Yields:
+            Tuples of (event, offset just past the event)
+        """
+        if not os.path.exists(self.path):
+            return
+
+        count = 0
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                offset += len(line)
+                if not line.endswith(b"\n"):
+                    # Event still being written
+                    break
+                event = json.loads(line)
+                if event["seq"] <= since_seq:
+                    continue
+                yield event, offset
+                count += 1
+                if limit is not None and count >= limit:
+                    break
+
+    def read(self, since_seq=0, limit=None):
+        """Read events with seq > since_seq (scans from the start of the file)"""
+        return [event for event, _ in self.read_from(0, since_seq, limit)]
+
+
+class ChangeFeedConsumer:
+    """
+    Named reader that tails a ChangeFeed from a persisted checkpoint
+
+    Usage:
+        consumer = ChangeFeedConsumer(lead_manager.change_feed, "campaigns")
+        events = consumer.poll()
+        ... apply events ...
+        consumer.commit()
+    """
+
+    def __init__(self, feed, name, checkpoint_file=None):
+        """
+        Initialize the consumer
+
+        Args:
+            feed: ChangeFeed to read
+            name: Consumer name (one checkpoint per name)
+            checkpoint_file: Where to persist the checkpoint
+                (defaults to <feed path>.<name>.checkpoint)
+        """
+        self.feed = feed
+        self.name = name
+        self.checkpoint_file = checkpoint_file or f"{feed.path}.{name}.checkpoint"
+        self.checkpoint = self._load_checkpoint()
+        self._pending = None
+
+    def _load_checkpoint(self):
+        """Load the last committed {"seq", "offset"}"""
+        if os.path.exists(self.checkpoint_file):
+            try:
+                with open(self.checkpoint_file, 'r') as f:
+                    return json.load(f)
+            except ValueError:
+                pass
+        return {"seq": 0, "offset": 0}
+
+    def poll(self, limit=None):
+        """Return events after the checkpoint (call commit() once they are applied)"""
+        events = []
+        pending = None
+        for event, offset in self.feed.read_from(self.checkpoint["offset"], self.checkpoint["seq"], limit):
+            events.append(event)
+            pending = {"seq": event["seq"], "offset": offset}
+        self._pending = pending
+        return events
+
+    def commit(self):
+        """Advance the checkpoint past the events returned by the last poll()"""
+        if self._pending is None:
+            return
+        self.checkpoint = self._pending
+        self._pending = None
+        temp_path = f"{self.checkpoint_file}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(self.checkpoint, f)
+        os.replace(temp_path, self.checkpoint_file)
+
+    def lag(self):
+        """Number of events not yet committed by this consumer"""
+        return self.feed.last_seq - self.checkpoint["seq"]
@@ -0,0 +1,200 @@
+"""
+Conversation Archive - Monthly, compressed partitions of old conversations
+
+ConversationManager keeps recent ("hot") months in its log and indexes and
+moves older months here. Each month is one gzip-compressed JSONL file of full
+conversation records; a small manifest holds per-month counts, statistics and
+the leads each month contains, so statistics and lead lookups don't need to
+open cold partitions. Partitions are read lazily and the last few are cached.
+
+    <data>_archive/
+        manifest.json
+        2025-07.jsonl.gz
+        2025-08.jsonl.gz
+"""
+import gzip
+import json
+import os
+import re
+from collections import OrderedDict
+
+
+_MONTH = re.compile(r"^\d{4}-\d{2}$")
+_ID_MONTH = re.compile(r"^conv_(\d{4})(\d{2})\d{2}_")
+
+
+def month_of(timestamp):
+    """Partition key ("YYYY-MM") of an ISO timestamp (None if it has none)"""
+    month = str(timestamp or "")[:7]
+    return month if _MONTH.match(month) else None
+
+
+def month_from_id(conversation_id):
+    """Partition key encoded in a conv_YYYYMMDD_... ID (None if not encoded)"""
+    match = _ID_MONTH.match(str(conversation_id or ""))
+    return f"{match.group(1)}-{match.group(2)}" if match else None
+
+
+def months_back(now, months):
+    """Partition key of the month `months` months before now"""
+    index = now.year * 12 + now.month - 1 - months
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+class ConversationArchive:
+    """Cold tier of the conversation history"""
+
+    def __init__(self, directory, cache_size=2):
+        """
+        Initialize the archive
+
+        Args:
+            directory: Directory holding the partitions and manifest
+            cache_size: Number of loaded partitions kept in memory
+        """
+        self.directory = directory
+        self.manifest_file = os.path.join(directory, "manifest.json")
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self.partitions = self._load_manifest()
+        self.months_by_id = {}  # conversation_id -> month, for IDs that don't encode their month
+        for month, partition in self.partitions.items():
+            for conversation_id in partition["ids"]:
+                self.months_by_id[conversation_id] = month
+        self.totals = self._compute_totals()
+
+    def _load_manifest(self):
+        """Load per-month partition summaries"""
+        try:
+            with open(self.manifest_file, 'r') as f:
+                partitions = json.load(f)["partitions"]
+        except:
+            return {}
+        # Manifests written before "ids" was kept: scan those partitions once
+        missing = [month for month, partition in partitions.items() if "ids" not in partition]
+        for month in missing:
+            partitions[month]["ids"] = [
+                r.get("conversation_id") for r in self._read(month)
+                if month_from_id(r.get("conversation_id")) != month
+            ]
+        if missing:
+            self.partitions = partitions
+            self._save_manifest()
+        return partitions
+
+    def _save_manifest(self):
+        """Persist the manifest atomically"""
+        os.makedirs(self.directory, exist_ok=True)
+        temp_path = f"{self.manifest_file}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump({"partitions": self.partitions}, f)
+        os.replace(temp_path, self.manifest_file)
+        self.totals = self._compute_totals()
+
+    def _compute_totals(self):
+        """Statistics summed over all partitions"""
+        totals = {"total": 0, "with_proposals": 0, "messages": 0, "by_date": {}}
+        for partition in self.partitions.values():
+            for key in ("total", "with_proposals", "messages"):
+                totals[key] += partition[key]
+            for date, count in partition["by_date"].items():
+                totals["by_date"][date] = totals["by_date"].get(date, 0) + count
+        return totals
+
+    def _path(self, month):
+        """File of a partition"""
+        return os.path.join(self.directory, f"{month}.jsonl.gz")
+
+    def month_of_id(self, conversation_id):
+        """Partition a conversation is (or would be) archived in, from its ID"""
+        return self.months_by_id.get(conversation_id) or month_from_id(conversation_id)
+
+    def months(self):
+        """Archived partition keys, oldest first"""
+        return sorted(self.partitions)
+
+    def append(self, month, records):
+        """
+        Add full conversation records to a month's partition
+
+        Args:
+            month: Partition key ("YYYY-MM")
+            records: Full conversation dictionaries
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        # Appending writes a new gzip member; readers see one continuous stream
+        with gzip.open(self._path(month), 'at', encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, separators=(",", ":"), default=str) + "\n")
+
+        partition = self.partitions.setdefault(
+            month, {"total": 0, "with_proposals": 0, "messages": 0, "by_date": {}, "leads": {}, "ids": []}
+        )
+        for record in records:
+            if month_from_id(record.get("conversation_id")) != month:
+                # Legacy or migrated ID whose date is not the partition month
+                partition["ids"].append(record.get("conversation_id"))
+                self.months_by_id[record.get("conversation_id")] = month
+            date = (record.get("timestamp") or "")[:10]
+            lead_id = str(record.get("lead_id"))
+            partition["total"] += 1
+            partition["with_proposals"] += 1 if record.get("proposal_generated") else 0
+            partition["messages"] += record.get("message_count") or 0
+            partition["by_date"][date] = partition["by_date"].get(date, 0) + 1
+            partition["leads"][lead_id] = partition["leads"].get(lead_id, 0) + 1
+        self._cache.pop(month, None)
+        self._save_manifest()
+
+    def iter_records(self, months=None):
+        """Stream full records of the given months (None = all), oldest first"""
+        for month in (self.months() if months is None else months):
+            if month in self.partitions:
+                yield from self._read(month)
+
+    def _read(self, month):
+        """Stream the records of one partition file"""
+        with gzip.open(self._path(month), 'rt', encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+
+    def load(self, month):
+        """Full records of one partition (cached)"""
+        if month in self._cache:
+            self._cache.move_to_end(month)
+            return self._cache[month]
+        records = list(self.iter_records([month]))
+        self._cache[month] = records
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return records
+
+    def find(self, conversation_id):
+        """Full record of an archived conversation (None if not archived)"""
+        month = self.month_of_id(conversation_id)
+        if month not in self.partitions:
+            return None
+        for record in self.load(month):
+            if record.get("conversation_id") == conversation_id:
+                return record
+        return None
+
+    def records_for_lead(self, lead_id):
+        """Full records of a lead, only opening partitions that contain it"""
+        records = []
+        for month in self.months():
+            if str(lead_id) in self.partitions[month]["leads"]:
+                records.extend(r for r in self.load(month) if r.get("lead_id") == lead_id)
+        return records
+
+    def drop(self, month):
+        """Delete a partition (retention)"""
+        if month not in self.partitions:
+            return False
+        if os.path.exists(self._path(month)):
+            os.remove(self._path(month))
+        for conversation_id in self.partitions[month]["ids"]:
+            self.months_by_id.pop(conversation_id, None)
+        del self.partitions[month]
+        self._cache.pop(month, None)
+        self._save_manifest()
+        return True
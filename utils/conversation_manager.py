@@ -1,38 +1,417 @@
 """
 Conversation Manager - Tracks and saves chat conversations
 """
+import bisect
+import hashlib
+import io
+import itertools
 import json
 import os
+import zlib
 from datetime import datetime
 import csv
 
+from .blob_store import BlobStore
+from .conversation_archive import ConversationArchive, month_of, months_back
+from .jsonl_store import JsonlStore
+from .shared_store import SharedStore, synchronized
 
-class ConversationManager:
-    """Manages conversation history storage and retrieval"""
+
+# Full conversation record layout (export order)
+CONVERSATION_FIELDS = (
+    "conversation_id", "lead_id", "lead_name", "timestamp", "message_count",
+    "messages", "lead_data", "proposal_generated", "session_duration",
+)
+
+# Stored as a compressed body, loaded only on demand
+BODY_FIELDS = ("messages", "lead_data")
+
+# Metadata keys that describe storage, not the conversation
+STORAGE_FIELDS = ("body", "segments", "lead_data_hash", "lead_summary")
+
+# Log records replayed on startup before the saved metadata index is rewritten
+INDEX_REPLAY_LIMIT = 1000
+
+# Lead fields copied into the metadata for list views and the CSV summary
+LEAD_SUMMARY_FIELDS = ("property_value", "current_balance", "cash_out_amount", "is_veteran")
+
+CSV_HEADER = [
+    "Conversation ID", "Lead ID", "Lead Name", "Timestamp",
+    "Message Count", "Proposal Generated", "Property Value",
+    "Cash Out Amount", "Veteran Status"
+]
+
+
+def message_hash(value):
+    """Short content hash of a message (or any JSON value)"""
+    return hashlib.sha1(json.dumps(value, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+class ConversationManager(SharedStore):
+    """
+    Manages conversation history storage and retrieval (shared by all sessions)
+
+    Conversations are stored in an append-only JSONL log (one line per saved
+    conversation) instead of rewriting the whole history on every save. An
+    existing conversations.json is imported into the log on first start.
+
+    Only metadata (IDs, timestamp, counts, proposal flag and a lead summary) is
+    kept in memory; messages and full lead_data are zlib-compressed blobs in a
+    separate file, read back when a transcript or export needs them. Saves of
+    the same chat session share message segments, so each save only writes the
+    messages added since the previous one.
+
+    The metadata and the log's offset index are saved to <log>_index.json, so
+    a start reads that one file and replays only the log records appended after
+    it instead of decoding every record.
+
+    The log only holds the hot_months most recent months. Older months are
+    moved into compressed monthly partitions (see ConversationArchive) that are
+    read only when a lookup or export reaches them, and partitions older than
+    retention_months are deleted.
+    """
     
-    def __init__(self, data_file="conversations.json"):
-        """Initialize the conversation manager"""
+    def __init__(self, data_file="conversations.json", log_file=None, fsync="interval",
+                 hot_months=3, retention_months=None):
+        """
+        Initialize the conversation manager
+
+        Args:
+            data_file: Legacy JSON history (migrated once, then renamed to <data_file>.migrated)
+            log_file: Append-only JSONL log (defaults to <data_file>.jsonl)
+            fsync: fsync policy for the log and bodies - "always", "interval" or "never"
+            hot_months: Months (including the current one) kept in the log and indexes
+            retention_months: Delete archived months older than this (None = keep forever)
+        """
+        if hot_months < 1 or (retention_months is not None and retention_months < hot_months):
+            raise ValueError("hot_months must be >= 1 and retention_months >= hot_months")
+
+        super().__init__()
+        self.hot_months = hot_months
+        self.retention_months = retention_months
         self.data_file = data_file
-        self.conversations = self._load_conversations()
-    
-    def _load_conversations(self):
-        """Load conversations from JSON file"""
-        if os.path.exists(self.data_file):
-            try:
-                with open(self.data_file, 'r') as f:
-                    return json.load(f)
-            except:
-                return []
-        return []
+        self.log_file = log_file or f"{os.path.splitext(data_file)[0]}.jsonl"
+        self.stats_file = f"{os.path.splitext(self.log_file)[0]}_stats.json"
+        self.index_file = f"{os.path.splitext(self.log_file)[0]}_index.json"
+        saved = self._load_index()
+        self.log = JsonlStore(self.log_file, fsync=fsync, index_state=saved.get("log"))
+        self.bodies = BlobStore(f"{os.path.splitext(self.log_file)[0]}_bodies.bin", fsync=fsync)
+        self.archive = ConversationArchive(f"{os.path.splitext(self.log_file)[0]}_archive")
+        self.conversations, replayed = self._load_conversations(saved.get("conversations"))
+        self._build_indexes()
+        self.stats = self._load_statistics()
+        if self.archive_old_conversations() or replayed is None or replayed >= INDEX_REPLAY_LIMIT:
+            self.save_index()
     
-    def _save_conversations(self):
-        """Save conversations to JSON file"""
-        with open(self.data_file, 'w') as f:
-            json.dump(self.conversations, f, indent=2)
+    def _load_index(self):
+        """Saved metadata and log index (see save_index), {} if there is none"""
+        try:
+            with open(self.index_file, 'r') as f:
+                return json.load(f)
+        except:
+            return {}
+
+    @synchronized
+    def save_index(self):
+        """Save the metadata and the log's offset index, so the next start skips decoding the log"""
+        temp_path = f"{self.index_file}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump({"log": self.log.index_state(), "conversations": self.conversations},
+                      f, separators=(",", ":"), default=str)
+        os.replace(temp_path, self.index_file)
+
+    def _load_conversations(self, saved=None):
+        """
+        Load conversations from the JSONL log (migrating the legacy JSON file if needed)
+
+        Args:
+            saved: Metadata saved with the log index (used if the log index was restored)
+
+        Returns:
+            (metadata list, log records replayed on top of the saved metadata,
+            None if the whole log was read)
+        """
+        # An existing log or archive means the history was migrated already,
+        # even if the hot log is empty now
+        fresh = not os.path.exists(self.log_file) and not self.archive.partitions
+        if fresh and os.path.exists(self.data_file):
+            for conversation in self._load_legacy_conversations():
+                conversation["conversation_id"] = self._unique_id(conversation.get("conversation_id", "conv_unknown"))
+                self._store(conversation)
+            self.sync()
+            # The log can be empty again later (everything archived or deleted);
+            # the renamed file is never imported a second time
+            os.replace(self.data_file, f"{self.data_file}.migrated")
+
+        if self.log.restored_size and saved is not None:
+            # Saved metadata plus the records appended after it
+            conversations = {conversation["conversation_id"]: conversation for conversation in saved}
+            records = list(self.log.records_from(self.log.restored_size))
+            replayed = len(records)
+        else:
+            conversations = {}
+            records = self.log.items()
+            replayed = None
+
+        migrated = False
+        for conversation_id, conversation in records:
+            conversations.pop(conversation_id, None)
+            if conversation is None:
+                continue
+            conversation["conversation_id"] = conversation_id
+            if "body" not in conversation:
+                # Full record from before the metadata/body split
+                conversation = self._store(conversation)
+                migrated = True
+            conversations[conversation_id] = conversation
+        if migrated:
+            self.sync()
+            self.log.maybe_compact()
+        return list(conversations.values()), replayed
+
+    def _load_legacy_conversations(self):
+        """Load conversations from the legacy JSON file"""
+        try:
+            with open(self.data_file, 'r') as f:
+                return json.load(f)
+        except:
+            return []
+
+    def _store(self, conversation, previous=None):
+        """
+        Write a conversation as compressed blobs plus a metadata record
+
+        Messages go into segment blobs; a snapshot references message ranges
+        ([offset, length, start, count]) of those segments. When `previous`
+        (the last snapshot of the same session) is given, the messages it
+        already stored are referenced instead of written again, and its
+        lead_data blob is reused if unchanged.
+
+        Returns:
+            The metadata record kept in memory
+        """
+        conv_id = conversation["conversation_id"]
+        messages = conversation.get("messages") or []
+        hashes = [message_hash(m) for m in messages]
+
+        segments = []
+        reused = 0
+        if previous is not None and "segments" in previous:
+            stored = self._segment_hashes(previous["segments"])
+            while reused < min(len(stored), len(hashes)) and stored[reused] == hashes[reused]:
+                reused += 1
+            segments = self._take_segments(previous["segments"], reused)
+
+        if len(messages) > reused:
+            prefix = conversation.get("session_id") or conv_id
+            segment = {
+                "ids": [f"{prefix}:{i}" for i in range(reused, len(messages))],
+                "hashes": hashes[reused:],
+                "messages": messages[reused:],
+            }
+            offset, length = self._append_blob(segment)
+            segments.append([offset, length, 0, len(messages) - reused])
+
+        lead_data = conversation.get("lead_data") or {}
+        lead_data_hash = message_hash(lead_data)
+        if previous is not None and previous.get("lead_data_hash") == lead_data_hash:
+            body = list(previous["body"])
+        else:
+            body = list(self._append_blob({"lead_data": lead_data}))
+
+        metadata = {k: v for k, v in conversation.items() if k not in BODY_FIELDS}
+        metadata["lead_summary"] = {f: lead_data[f] for f in LEAD_SUMMARY_FIELDS if f in lead_data}
+        metadata["body"] = body
+        metadata["segments"] = segments
+        metadata["lead_data_hash"] = lead_data_hash
+        self.log.put(conv_id, metadata)
+        return metadata
+
+    def _append_blob(self, value):
+        """Compress and append one JSON value to the blob file"""
+        return self.bodies.append(zlib.compress(json.dumps(value, default=str).encode("utf-8")))
+
+    def _take_segments(self, segments, count):
+        """Message ranges covering the first `count` messages of a snapshot"""
+        taken = []
+        for offset, length, start, size in segments:
+            if count <= 0:
+                break
+            taken.append([offset, length, start, min(size, count)])
+            count -= size
+        return taken
+
+    def _segment_hashes(self, segments):
+        """Content hashes of the messages a snapshot references"""
+        blobs = self._read_blobs(tuple(s[:2]) for s in segments)
+        hashes = []
+        for offset, length, start, size in segments:
+            hashes.extend(blobs[(offset, length)]["hashes"][start:start + size])
+        return hashes
+
+    def _locations(self, metadata):
+        """Blob locations a conversation needs"""
+        return [tuple(metadata["body"])] + [tuple(s[:2]) for s in metadata.get("segments", [])]
+
+    def _read_blobs(self, locations):
+        """Read and decode blobs (each distinct location once, in file order)"""
+        unique = sorted(set(locations))
+        with self.lock:
+            return {loc: json.loads(zlib.decompress(data)) for loc, data in zip(unique, self.bodies.read_many(unique))}
+
+    def _assemble(self, metadata, blobs):
+        """Build {"messages", "lead_data"} from decoded blobs"""
+        body = blobs[tuple(metadata["body"])]
+        if "segments" not in metadata:
+            # Body written before delta persistence holds both fields
+            return body
+        messages = []
+        for offset, length, start, size in metadata["segments"]:
+            messages.extend(blobs[(offset, length)]["messages"][start:start + size])
+        return {"messages": messages, "lead_data": body.get("lead_data")}
+
+    def _expand(self, metadata, body):
+        """Rebuild the full conversation record from metadata and body"""
+        record = {field: (body if field in BODY_FIELDS else metadata).get(field) for field in CONVERSATION_FIELDS}
+        for key, value in metadata.items():
+            if key not in record and key not in STORAGE_FIELDS:
+                record[key] = value
+        return record
+
+    def load_body(self, conversation_id):
+        """
+        Load a conversation's messages and lead_data
+
+        Returns:
+            Dictionary with "messages" and "lead_data" (None if unknown)
+        """
+        with self.lock:
+            metadata = self.by_id.get(conversation_id)
+            if metadata is None:
+                record = self.archive.find(conversation_id)
+                return {field: record.get(field) for field in BODY_FIELDS} if record else None
+            return self._assemble(metadata, self._read_blobs(self._locations(metadata)))
+
+    def iter_bodies(self, conversations=None, chunk_size=100):
+        """
+        Load bodies for many conversations, reading chunk_size conversations per file pass
+
+        Args:
+            conversations: Metadata records (None = all conversations)
+
+        Yields:
+            Tuples of (metadata, body)
+        """
+        conversations = self.conversations if conversations is None else conversations
+        for start in range(0, len(conversations), chunk_size):
+            chunk = conversations[start:start + chunk_size]
+            with self.lock:
+                blobs = self._read_blobs(loc for m in chunk for loc in self._locations(m))
+                bodies = [self._assemble(m, blobs) for m in chunk]
+            yield from zip(chunk, bodies)
+
+    def sync(self):
+        """Force buffered log and body appends to disk"""
+        self.bodies.sync()
+        self.log.sync()
+
+    def _build_indexes(self):
+        """Build the conversation_id and lead_id indexes"""
+        self.by_id = {}         # conversation_id -> conversation
+        self.by_lead = {}       # lead_id -> (timestamp, position, conversation) sorted by timestamp
+        self.positions = {}     # conversation_id -> position in history order
+        self.by_session = {}    # session_id -> latest conversation of the session
+        self._next_position = itertools.count()
+        for conversation in self.conversations:
+            self._index(conversation, insort=False)
+        for entries in self.by_lead.values():
+            entries.sort()
+
+    def _index(self, conversation, insort=True):
+        """Add one conversation to the indexes (insort=False leaves its lead's list unsorted)"""
+        conv_id = conversation.get("conversation_id")
+        self.by_id[conv_id] = conversation
+        position = self.positions[conv_id] = next(self._next_position)
+        if conversation.get("session_id"):
+            self.by_session[conversation["session_id"]] = conversation
+        # The unique position breaks timestamp ties, so dicts are never compared
+        entry = (conversation.get("timestamp") or "", position, conversation)
+        if insort:
+            bisect.insort(self.by_lead.setdefault(conversation.get("lead_id"), []), entry)
+        else:
+            self.by_lead.setdefault(conversation.get("lead_id"), []).append(entry)
+
+    def _unindex(self, conversation):
+        """Remove one conversation from the indexes"""
+        conv_id = conversation.get("conversation_id")
+        self.by_id.pop(conv_id, None)
+        self.positions.pop(conv_id, None)
+        if self.by_session.get(conversation.get("session_id")) is conversation:
+            del self.by_session[conversation["session_id"]]
+        lead_conversations = self.by_lead.get(conversation.get("lead_id"), [])
+        self.by_lead[conversation.get("lead_id")] = [e for e in lead_conversations if e[2] is not conversation]
+
+    def _select(self, conversation_ids=None):
+        """Conversations with the given IDs (None = all), in history order"""
+        if not conversation_ids:
+            return self.conversations
+        wanted = [self.by_id[c] for c in set(conversation_ids) if c in self.by_id]
+        return sorted(wanted, key=lambda c: self.positions[c["conversation_id"]])
+
+    def _archived_records(self, conversation_ids=None):
+        """Archived full records with the given IDs (None = all), oldest month first"""
+        if not conversation_ids:
+            yield from self.archive.iter_records()
+            return
+        wanted = {c for c in conversation_ids if c not in self.by_id}
+        months = sorted({self.archive.month_of_id(c) for c in wanted} & set(self.archive.partitions))
+        for record in self.archive.iter_records(months):
+            if record.get("conversation_id") in wanted:
+                yield record
+
+    def _iter_records(self, conversation_ids=None, chunk_size=100):
+        """Full records across archived and hot months, in history order"""
+        yield from self._archived_records(conversation_ids)
+        for metadata, body in self.iter_bodies(self._select(conversation_ids), chunk_size):
+            yield self._expand(metadata, body)
+
+    def iter_conversations(self, since=None):
+        """
+        Stream full records of every conversation (archived months included)
+
+        Args:
+            since: Only conversations with a timestamp after this ISO timestamp
+
+        Yields:
+            Full conversation dictionaries, oldest first
+        """
+        since_month = month_of(since)
+        for record in self.archive.iter_records([m for m in self.archive.months() if not since_month or m >= since_month]):
+            if not since or (record.get("timestamp") or "") > since:
+                yield record
+        newer = [m for m in self.conversations if not since or (m.get("timestamp") or "") > since]
+        for metadata, body in self.iter_bodies(newer):
+            yield self._expand(metadata, body)
+
+    def _iter_metadata(self, conversation_ids=None):
+        """Metadata across archived and hot months, in history order"""
+        for record in self._archived_records(conversation_ids):
+            yield self._metadata_view(record)
+        yield from self._select(conversation_ids)
+
+    def _unique_id(self, conversation_id):
+        """Suffix an ID that is already taken (two saves in the same second)"""
+        candidate = conversation_id
+        suffix = 2
+        while candidate in self.log:
+            candidate = f"{conversation_id}_{suffix}"
+            suffix += 1
+        return candidate
     
-    def save_conversation(self, lead_id, lead_name, messages, lead_data, proposal_generated=False):
+    @synchronized
+    def save_conversation(self, lead_id, lead_name, messages, lead_data, proposal_generated=False, session_id=None):
         """
-        Save a conversation session
+        Save a conversation session (one appended log record)
         
         Args:
             lead_id: ID of the lead
@@ -40,76 +419,184 @@ class ConversationManager:
             messages: List of chat messages
             lead_data: Lead information extracted
             proposal_generated: Whether proposal was generated
+            session_id: Chat session ID - repeated saves of one session only
+                store the messages added since its previous save
         """
         conversation = {
-            "conversation_id": f"conv_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{lead_id or 'unknown'}",
+            "conversation_id": self._unique_id(f"conv_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{lead_id or 'unknown'}"),
             "lead_id": lead_id,
             "lead_name": lead_name,
             "timestamp": datetime.now().isoformat(),
             "message_count": len(messages),
-            "messages": messages,
-            "lead_data": lead_data,
+            "messages": list(messages),
+            "lead_data": dict(lead_data or {}),
             "proposal_generated": proposal_generated,
             "session_duration": None  # Could be calculated if needed
         }
+        if session_id:
+            conversation["session_id"] = session_id
         
-        self.conversations.append(conversation)
-        self._save_conversations()
+        metadata = self._store(conversation, self.by_session.get(session_id) if session_id else None)
+        self.conversations.append(metadata)
+        self._index(metadata)
+        self._count(metadata, 1)
+        self._save_statistics()
+        self._notify("add", conversation["conversation_id"])
         
         return conversation["conversation_id"]
+
+    @synchronized
+    def delete_conversation(self, conversation_id):
+        """Delete a conversation (space is reclaimed by the next compaction)"""
+        if not self.log.delete(conversation_id):
+            return False
+        conversation = self.by_id[conversation_id]
+        self._unindex(conversation)
+        self.conversations = [c for c in self.conversations if c.get("conversation_id") != conversation_id]
+        self._count(conversation, -1)
+        self._save_statistics()
+        self.log.maybe_compact()
+        self._notify("delete", conversation_id)
+        return True
+
+    @synchronized
+    def compact(self):
+        """Rewrite the log and body file without deleted/superseded records"""
+        live = {loc for metadata in self.by_id.values() for loc in self._locations(metadata)}
+        moved = self.bodies.compact({loc: loc for loc in live})
+        for conv_id, metadata in self.by_id.items():
+            body = list(moved[tuple(metadata["body"])])
+            segments = [list(moved[(s[0], s[1])]) + s[2:] for s in metadata.get("segments", [])]
+            if body != metadata["body"] or segments != metadata.get("segments", []):
+                metadata["body"] = body
+                if "segments" in metadata:
+                    metadata["segments"] = segments
+                self.log.put(conv_id, metadata)
+        self.log.compact()
+
+    @synchronized
+    def archive_old_conversations(self, now=None):
+        """
+        Move conversations older than the hot window into monthly partitions
+        and apply the retention policy (runs on startup)
+
+        Returns:
+            Number of conversations archived
+        """
+        now = now or datetime.now()
+        first_hot_month = months_back(now, self.hot_months - 1)
+        by_month = {}
+        for conversation in self.conversations:
+            month = month_of(conversation.get("timestamp"))
+            if month and month < first_hot_month:
+                by_month.setdefault(month, []).append(conversation)
+
+        for month in sorted(by_month):
+            self.archive.append(month, [self._expand(m, body) for m, body in self.iter_bodies(by_month[month])])
+            for conversation in by_month[month]:
+                self.log.delete(conversation["conversation_id"])
+                self._unindex(conversation)
+
+        archived = sum(len(group) for group in by_month.values())
+        if archived:
+            self.conversations = [c for c in self.conversations if c["conversation_id"] in self.by_id]
+            for group in by_month.values():
+                for conversation in group:
+                    self._count(conversation, -1)
+            self._save_statistics()
+            self.compact()
+            for group in by_month.values():
+                for conversation in group:
+                    self._notify("archive", conversation["conversation_id"])
+
+        if self.retention_months is not None:
+            oldest_kept = months_back(now, self.retention_months - 1)
+            for month in self.archive.months():
+                if month < oldest_kept:
+                    # IDs that don't encode this month are announced one by one
+                    for conversation_id in self.archive.partitions[month]["ids"]:
+                        self._notify("delete", conversation_id)
+                    self.archive.drop(month)
+                    self._notify("drop", month)
+        return archived
+
+    def _metadata_view(self, record):
+        """Metadata-shaped copy of an archived full record"""
+        metadata = {k: v for k, v in record.items() if k not in BODY_FIELDS}
+        lead_data = record.get("lead_data") or {}
+        metadata["lead_summary"] = {f: lead_data[f] for f in LEAD_SUMMARY_FIELDS if f in lead_data}
+        metadata["archived"] = True
+        return metadata
     
-    def get_conversations_by_lead(self, lead_id):
-        """Get all conversations for a specific lead"""
-        return [c for c in self.conversations if c.get("lead_id") == lead_id]
+    def get_conversations_by_lead(self, lead_id, include_archived=True):
+        """Get metadata of all conversations for a specific lead (oldest first)"""
+        archived = []
+        if include_archived:
+            archived = [self._metadata_view(r) for r in self.archive.records_for_lead(lead_id)]
+        return archived + [entry[2] for entry in self.by_lead.get(lead_id, [])]
     
-    def get_all_conversations(self):
-        """Get all conversations"""
-        return self.conversations
+    def get_all_conversations(self, include_archived=False):
+        """
+        Get metadata of all conversations (use load_body() for messages)
+
+        Args:
+            include_archived: Also read the archived months (default: hot months only)
+        """
+        if not include_archived:
+            return self.conversations
+        return [self._metadata_view(r) for r in self.archive.iter_records()] + self.conversations
     
     def get_conversation_by_id(self, conversation_id):
-        """Get a specific conversation by ID"""
-        for conv in self.conversations:
-            if conv.get("conversation_id") == conversation_id:
-                return conv
-        return None
+        """Get a specific conversation by ID (full record, body included)"""
+        if conversation_id not in self.by_id:
+            return self.archive.find(conversation_id)
+        body = self.load_body(conversation_id)
+        if body is None:
+            return None
+        return self._expand(self.by_id[conversation_id], body)
     
-    def export_to_json(self, conversation_ids=None):
+    def iter_json(self, conversation_ids=None, chunk_size=100):
         """
-        Export conversations to JSON string
-        
+        Stream conversations as a JSON array, chunk_size records at a time
+
         Args:
             conversation_ids: List of conversation IDs to export (None = all)
+            chunk_size: Records per yielded chunk
+
+        Yields:
+            Text chunks that join to the same output as export_to_json()
         """
-        if conversation_ids:
-            conversations = [c for c in self.conversations if c.get("conversation_id") in conversation_ids]
-        else:
-            conversations = self.conversations
-        
-        return json.dumps(conversations, indent=2)
-    
-    def export_to_csv(self, conversation_ids=None):
+        records = []
+        started = False
+        for record in self._iter_records(conversation_ids, chunk_size):
+            records.append("  " + json.dumps(record, indent=2).replace("\n", "\n  "))
+            if len(records) == chunk_size:
+                yield (",\n" if started else "[\n") + ",\n".join(records)
+                started = True
+                records = []
+        if records:
+            yield (",\n" if started else "[\n") + ",\n".join(records)
+            started = True
+        yield "\n]" if started else "[]"
+
+    def iter_csv(self, conversation_ids=None, chunk_size=500):
         """
-        Export conversation summary to CSV format
-        
+        Stream the conversation summary as CSV, chunk_size rows at a time
+
         Args:
             conversation_ids: List of conversation IDs to export (None = all)
+            chunk_size: Rows per yielded chunk
+
+        Yields:
+            Text chunks that join to the same output as export_to_csv()
         """
-        if conversation_ids:
-            conversations = [c for c in self.conversations if c.get("conversation_id") in conversation_ids]
-        else:
-            conversations = self.conversations
-        
-        # Create CSV data
-        csv_data = []
-        csv_data.append([
-            "Conversation ID", "Lead ID", "Lead Name", "Timestamp", 
-            "Message Count", "Proposal Generated", "Property Value", 
-            "Cash Out Amount", "Veteran Status"
-        ])
-        
-        for conv in conversations:
-            lead_data = conv.get("lead_data", {})
-            csv_data.append([
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(CSV_HEADER)
+
+        for i, conv in enumerate(self._iter_metadata(conversation_ids), 1):
+            lead_data = conv.get("lead_summary", {})
+            writer.writerow([
                 conv.get("conversation_id", ""),
                 conv.get("lead_id", ""),
                 conv.get("lead_name", ""),
@@ -120,13 +607,46 @@ class ConversationManager:
                 lead_data.get("cash_out_amount", ""),
                 lead_data.get("is_veteran", "")
             ])
+            if i % chunk_size == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    def write_export(self, f, fmt="json", conversation_ids=None):
+        """
+        Stream an export into an open text file (or response)
+
+        Args:
+            f: Writable text file object
+            fmt: "json" or "csv"
+            conversation_ids: List of conversation IDs to export (None = all)
+        """
+        if fmt not in ("json", "csv"):
+            raise ValueError(f"Unknown export format: {fmt}")
+        chunks = self.iter_json(conversation_ids) if fmt == "json" else self.iter_csv(conversation_ids)
+        for chunk in chunks:
+            f.write(chunk)
+
+    def export_to_json(self, conversation_ids=None):
+        """
+        Export conversations to JSON string
         
-        # Convert to CSV string
-        import io
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerows(csv_data)
-        return output.getvalue()
+        Args:
+            conversation_ids: List of conversation IDs to export (None = all)
+        """
+        return "".join(self.iter_json(conversation_ids))
+    
+    def export_to_csv(self, conversation_ids=None):
+        """
+        Export conversation summary to CSV format
+        
+        Args:
+            conversation_ids: List of conversation IDs to export (None = all)
+        """
+        return "".join(self.iter_csv(conversation_ids))
     
     def export_conversation_detail(self, conversation_id):
         """
@@ -163,24 +683,66 @@ CONVERSATION
         
         return transcript
     
+    def _load_statistics(self):
+        """Load persisted statistics, rebuilding them if they don't match the log"""
+        try:
+            with open(self.stats_file, 'r') as f:
+                stats = json.load(f)
+            last = self.conversations[-1].get("conversation_id") if self.conversations else None
+            if stats.get("total") == len(self.conversations) and stats.get("last_conversation_id") == last:
+                return stats
+        except:
+            pass
+        return self.rebuild_statistics()
+
+    def _save_statistics(self):
+        """Persist the running statistics next to the log"""
+        temp_path = f"{self.stats_file}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(self.stats, f)
+        os.replace(temp_path, self.stats_file)
+
+    def _count(self, conversation, sign):
+        """Add (sign=1) or remove (sign=-1) one conversation from the running statistics"""
+        date = (conversation.get('timestamp') or '')[:10]  # YYYY-MM-DD
+        by_date = self.stats["by_date"]
+        self.stats["total"] += sign
+        self.stats["with_proposals"] += sign if conversation.get('proposal_generated') else 0
+        self.stats["messages"] += sign * (conversation.get('message_count') or 0)
+        by_date[date] = by_date.get(date, 0) + sign
+        if not by_date[date]:
+            del by_date[date]
+        if self.conversations:
+            self.stats["last_conversation_id"] = self.conversations[-1].get("conversation_id")
+        else:
+            self.stats["last_conversation_id"] = None
+
+    @synchronized
+    def rebuild_statistics(self):
+        """Recompute the statistics from every conversation (normally never needed)"""
+        self.stats = {"total": 0, "with_proposals": 0, "messages": 0, "by_date": {}, "last_conversation_id": None}
+        for conversation in self.conversations:
+            self._count(conversation, 1)
+        self._save_statistics()
+        return self.stats
+
     def get_statistics(self):
-        """Get conversation statistics"""
-        total = len(self.conversations)
-        with_proposals = sum(1 for c in self.conversations if c.get('proposal_generated'))
+        """Get conversation statistics (maintained incrementally on save/delete, archive included)"""
+        stats = self.stats
+        archived = self.archive.totals
+        total = stats["total"] + archived["total"]
+        with_proposals = stats["with_proposals"] + archived["with_proposals"]
         
         # Average messages per conversation
-        avg_messages = sum(c.get('message_count', 0) for c in self.conversations) / total if total > 0 else 0
+        avg_messages = (stats["messages"] + archived["messages"]) / total if total > 0 else 0
         
-        # Conversations by date
-        dates = {}
-        for conv in self.conversations:
-            date = conv.get('timestamp', '')[:10]  # YYYY-MM-DD
-            dates[date] = dates.get(date, 0) + 1
+        # Archived and hot months don't overlap
+        by_date = {**archived["by_date"], **stats["by_date"]} if archived["by_date"] else stats["by_date"]
         
         return {
             "total_conversations": total,
             "with_proposals": with_proposals,
             "without_proposals": total - with_proposals,
             "avg_messages_per_conversation": round(avg_messages, 2),
-            "conversations_by_date": dates
+            "conversations_by_date": by_date
         }
@@ -0,0 +1,267 @@
+"""
+Conversation Search - Inverted index over chat transcripts
+
+Every message is a document. The index maps each token to the messages it
+occurs in and its positions there, so multi-word queries intersect posting
+lists, quoted phrases check adjacent positions, and hits are ranked with BM25.
+
+    search = ConversationSearch()
+    search.attach(conversation_manager)
+    search.search('"debt consolidation" 92630', role="user")
+
+attach() does not read any transcript. The first search() indexes the whole
+history, archived months included, and later saves, deletes and retention
+drops update the index incrementally.
+"""
+import heapq
+import math
+import re
+import threading
+
+from .conversation_archive import month_from_id
+
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+_QUERY = re.compile(r'"([^"]*)"|(\S+)')
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+SNIPPET_CHARS = 80
+
+
+def tokenize(text):
+    """Lowercase word/number tokens of a text"""
+    return _TOKEN.findall(str(text or "").lower())
+
+
+def parse_query(query):
+    """
+    Split a query into clauses
+
+    Returns:
+        List of token lists - one token for a plain word, several for a
+        "quoted phrase"
+    """
+    clauses = []
+    for phrase, word in _QUERY.findall(query or ""):
+        tokens = tokenize(phrase if phrase else word)
+        if phrase and tokens:
+            clauses.append(tokens)
+        else:
+            clauses.extend([token] for token in tokens)
+    return clauses
+
+
+def make_snippet(text, tokens, width=SNIPPET_CHARS):
+    """Cut a window of text around the first occurrence of any query token"""
+    text = str(text or "")
+    wanted = set(tokens)
+    for match in _TOKEN.finditer(text.lower()):
+        if match.group() in wanted:
+            start = max(0, match.start() - width // 2)
+            end = min(len(text), start + width)
+            snippet = " ".join(text[start:end].split())
+            return ("..." if start > 0 else "") + snippet + ("..." if end < len(text) else "")
+    return " ".join(text[:width].split())
+
+
+class ConversationSearch:
+    """Incrementally maintained inverted index over conversation messages"""
+
+    def __init__(self):
+        """Initialize an empty index"""
+        self.lock = threading.RLock()
+        self.postings = {}      # token -> {doc_id: [positions]}
+        self.docs = {}          # doc_id -> (conversation_id, message_index, role, length)
+        self.doc_terms = {}     # doc_id -> distinct tokens (for removal)
+        self.conv_docs = {}     # conversation_id -> [doc_id]
+        self.total_length = 0
+        self.texts = {}         # conversation_id -> messages (only when no loader is set)
+        self.loader = None      # conversation_id -> messages, used for snippets
+        self.source = None      # attached ConversationManager until the first query indexes it
+        self._next_doc = 0
+
+    def add_conversation(self, conversation_id, messages):
+        """
+        Index (or re-index) the messages of one conversation
+
+        Args:
+            conversation_id: ID of the conversation
+            messages: List of {"role", "content"} messages
+        """
+        with self.lock:
+            self.remove_conversation(conversation_id)
+            doc_ids = []
+            for index, message in enumerate(messages or []):
+                tokens = tokenize(message.get("content"))
+                if not tokens:
+                    continue
+                doc_id = self._next_doc
+                self._next_doc += 1
+                positions = {}
+                for position, token in enumerate(tokens):
+                    positions.setdefault(token, []).append(position)
+                for token, token_positions in positions.items():
+                    self.postings.setdefault(token, {})[doc_id] = token_positions
+                self.docs[doc_id] = (conversation_id, index, message.get("role", "unknown"), len(tokens))
+                self.doc_terms[doc_id] = tuple(positions)
+                self.total_length += len(tokens)
+                doc_ids.append(doc_id)
+            self.conv_docs[conversation_id] = doc_ids
+            if self.loader is None:
+                self.texts[conversation_id] = messages
+
+    def remove_conversation(self, conversation_id):
+        """Drop a conversation from the index"""
+        with self.lock:
+            for doc_id in self.conv_docs.pop(conversation_id, []):
+                for token in self.doc_terms.pop(doc_id):
+                    postings = self.postings[token]
+                    del postings[doc_id]
+                    if not postings:
+                        del self.postings[token]
+                self.total_length -= self.docs.pop(doc_id)[3]
+            self.texts.pop(conversation_id, None)
+
+    def remove_month(self, month):
+        """Drop every conversation of a monthly partition (see month_from_id)"""
+        with self.lock:
+            for conversation_id in [c for c in self.conv_docs if month_from_id(c) == month]:
+                self.remove_conversation(conversation_id)
+
+    def _ensure_built(self):
+        """Index the attached history on the first query"""
+        source = self.source
+        if source is None:
+            return
+        with source.lock, self.lock:
+            if self.source is None:
+                return
+            for record in source.iter_conversations():
+                self.add_conversation(record["conversation_id"], record.get("messages"))
+            self.source = None
+
+    def _matches_phrase(self, doc_id, tokens):
+        """Whether the tokens occur consecutively in a message"""
+        starts = set(self.postings[tokens[0]][doc_id])
+        for offset, token in enumerate(tokens[1:], 1):
+            starts &= {p - offset for p in self.postings[token][doc_id]}
+            if not starts:
+                return False
+        return True
+
+    def search(self, query, role=None, limit=20):
+        """
+        Find messages matching every word and phrase of a query
+
+        Args:
+            query: Words and/or "quoted phrases"
+            role: Only match messages with this role ("user" / "assistant")
+            limit: Maximum number of hits
+
+        Returns:
+            List of hit dictionaries (conversation_id, message_index, role,
+            score, snippet), best first
+        """
+        clauses = parse_query(query)
+        if not clauses:
+            return []
+
+        self._ensure_built()
+        with self.lock:
+            tokens = {token for clause in clauses for token in clause}
+            if any(token not in self.postings for token in tokens):
+                return []
+
+            # Intersect posting lists, smallest first
+            ordered = sorted(tokens, key=lambda t: len(self.postings[t]))
+            candidates = set(self.postings[ordered[0]])
+            for token in ordered[1:]:
+                candidates.intersection_update(self.postings[token])
+                if not candidates:
+                    return []
+
+            doc_count = len(self.docs)
+            avg_length = self.total_length / doc_count
+            idf = {
+                t: math.log(1 + (doc_count - len(self.postings[t]) + 0.5) / (len(self.postings[t]) + 0.5))
+                for t in tokens
+            }
+
+            scored = []
+            for doc_id in candidates:
+                conversation_id, index, doc_role, length = self.docs[doc_id]
+                if role and doc_role != role:
+                    continue
+                if any(len(clause) > 1 and not self._matches_phrase(doc_id, clause) for clause in clauses):
+                    continue
+                norm = K1 * (1 - B + B * length / avg_length)
+                score = 0.0
+                for token in tokens:
+                    tf = len(self.postings[token][doc_id])
+                    score += idf[token] * tf * (K1 + 1) / (tf + norm)
+                scored.append((score, doc_id))
+
+            top = heapq.nlargest(limit, scored)
+            hits = [
+                {
+                    "conversation_id": self.docs[doc_id][0],
+                    "message_index": self.docs[doc_id][1],
+                    "role": self.docs[doc_id][2],
+                    "score": round(score, 3),
+                }
+                for score, doc_id in top
+            ]
+
+        # Snippets only for the hits returned
+        loaded = {}
+        for hit in hits:
+            if hit["conversation_id"] not in loaded:
+                loaded[hit["conversation_id"]] = self._messages(hit["conversation_id"])
+            messages = loaded[hit["conversation_id"]]
+            content = messages[hit["message_index"]].get("content") if hit["message_index"] < len(messages) else ""
+            hit["snippet"] = make_snippet(content, tokens)
+        return hits
+
+    def _messages(self, conversation_id):
+        """Messages of a conversation (for snippets)"""
+        if self.loader is not None:
+            return self.loader(conversation_id) or []
+        return self.texts.get(conversation_id, [])
+
+    def __len__(self):
+        return len(self.docs)
+
+    def attach(self, conversation_manager):
+        """
+        Search a ConversationManager's history, archived months included
+
+        Nothing is read until the first search(); from then on saves, deletes
+        and dropped partitions update the index.
+
+        Returns:
+            Function that detaches the index again
+        """
+        def load_messages(conversation_id):
+            body = conversation_manager.load_body(conversation_id)
+            return (body.get("messages") or []) if body else []
+
+        with conversation_manager.lock:
+            self.loader = load_messages
+            self.texts = {}
+            self.source = conversation_manager
+
+            def on_change(event, key, version):
+                if self.source is not None:
+                    return      # not built yet - the first query reads the current history
+                if event == "delete":
+                    self.remove_conversation(key)
+                elif event == "drop":
+                    self.remove_month(key)
+                elif event != "archive":
+                    # Archived conversations stay indexed; snippets load them from the archive
+                    self.add_conversation(key, load_messages(key))
+
+            return conversation_manager.subscribe(on_change)
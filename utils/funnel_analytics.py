@@ -0,0 +1,277 @@
+"""
+Funnel Analytics - Conversion metrics over conversations and campaigns
+
+Each conversation is reduced once to a small feature row (session, lead, turns,
+proposal flag, last speaker). New and deleted conversations are applied from
+ConversationManager change notifications, so refresh() only reads the bodies of
+conversations saved since the previous refresh. Campaigns are reduced the same
+way to a row and their sent touchpoints; only leads named by campaign events
+since the previous refresh (CampaignManager.events_since) are re-read. Metrics
+are pandas group-bys over those rows, cached until either store changes.
+"""
+import threading
+from datetime import datetime
+
+import pandas as pd
+
+
+# Borrower messages a chat needs to count as "engaged"
+ENGAGED_TURNS = 2
+
+CONVERSATION_COLUMNS = ["conversation_id", "session", "lead_id", "timestamp", "proposal", "user_turns", "last_role"]
+CAMPAIGN_COLUMNS = ["lead_id", "campaign_type", "responded", "responded_at"]
+TOUCHPOINT_COLUMNS = ["lead_id", "campaign_type", "template", "channel", "sent_at"]
+
+
+def _timestamp(value):
+    """Naive datetime from an ISO timestamp (NaT when missing)"""
+    if not value:
+        return pd.NaT
+    try:
+        parsed = datetime.fromisoformat(str(value))
+    except ValueError:
+        return pd.NaT
+    return parsed.replace(tzinfo=None)
+
+
+def conversation_features(record):
+    """Reduce a full conversation record to its funnel feature row"""
+    messages = record.get("messages") or []
+    return {
+        "conversation_id": record.get("conversation_id"),
+        "session": record.get("session_id") or record.get("conversation_id"),
+        "lead_id": record.get("lead_id"),
+        "timestamp": _timestamp(record.get("timestamp")),
+        "proposal": bool(record.get("proposal_generated")),
+        "user_turns": sum(1 for m in messages if m.get("role") == "user"),
+        "last_role": messages[-1].get("role") if messages else None,
+    }
+
+
+def campaign_features(lead_id, campaign):
+    """Reduce a campaign to its funnel row and the rows of its sent touchpoints"""
+    row = {
+        "lead_id": lead_id,
+        "campaign_type": campaign.get("campaign_type"),
+        "responded": "responded" in (campaign.get("tags") or []),
+        "responded_at": _timestamp(campaign.get("responded_at")),
+    }
+    sent = [
+        {
+            "lead_id": lead_id,
+            "campaign_type": campaign.get("campaign_type"),
+            "template": touchpoint.get("template"),
+            "channel": touchpoint.get("type"),
+            "sent_at": _timestamp(touchpoint.get("sent_at")),
+        }
+        for touchpoint in campaign.get("scheduled_touchpoints", [])
+        if touchpoint.get("status") == "sent"
+    ]
+    return row, sent
+
+
+class FunnelAnalytics:
+    """Cached, incrementally refreshed funnel metrics"""
+
+    def __init__(self, conversation_manager, campaign_manager):
+        """
+        Initialize the engine and follow conversation changes
+
+        Args:
+            conversation_manager: ConversationManager to analyze
+            campaign_manager: CampaignManager to analyze
+        """
+        self.conversation_manager = conversation_manager
+        self.campaign_manager = campaign_manager
+        self.lock = threading.RLock()
+        self.rows = None            # conversation_id -> feature row (None until first refresh)
+        self._added = set()
+        self._deleted = set()
+        self._dropped_months = set()    # archive partitions deleted by retention ("YYYY-MM")
+        self.campaign_rows = {}     # lead_id -> (campaign row, sent touchpoint rows)
+        self._campaign_seq = None   # campaign event sequence number the rows reflect
+        self._results = None
+        self._unsubscribe = conversation_manager.subscribe(self._on_conversation_change)
+
+    def _on_conversation_change(self, event, conversation_id, version):
+        """Queue a changed conversation for the next refresh"""
+        with self.lock:
+            if event == "add":
+                self._added.add(conversation_id)
+                self._deleted.discard(conversation_id)
+            elif event == "delete":
+                self._deleted.add(conversation_id)
+                self._added.discard(conversation_id)
+            elif event == "drop":
+                # Retention deleted a whole archived month (the key is the month)
+                self._dropped_months.add(conversation_id)
+
+    def refresh(self):
+        """
+        Bring the metrics up to date
+
+        Returns:
+            True if anything was recomputed
+        """
+        with self.lock:
+            changed = False
+            if self.rows is None:
+                self.rows = {
+                    record["conversation_id"]: conversation_features(record)
+                    for record in self.conversation_manager.iter_conversations()
+                }
+                self._added.clear()
+                self._deleted.clear()
+                self._dropped_months.clear()
+                changed = True
+
+            if self._dropped_months:
+                dropped = [
+                    conversation_id for conversation_id, row in self.rows.items()
+                    if not pd.isna(row["timestamp"]) and row["timestamp"].strftime("%Y-%m") in self._dropped_months
+                ]
+                for conversation_id in dropped:
+                    del self.rows[conversation_id]
+                changed = changed or bool(dropped)
+                self._dropped_months.clear()
+
+            for conversation_id in self._deleted:
+                self.rows.pop(conversation_id, None)
+                changed = True
+            for conversation_id in self._added:
+                record = self.conversation_manager.get_conversation_by_id(conversation_id)
+                if record is not None:
+                    self.rows[conversation_id] = conversation_features(record)
+                    changed = True
+            self._added.clear()
+            self._deleted.clear()
+
+            if self._refresh_campaigns() or self._results is None:
+                changed = True
+            if changed:
+                self._results = self._compute()
+            return changed
+
+    def _refresh_campaigns(self):
+        """Re-read the campaigns named by events since the last refresh; True if any changed"""
+        with self.campaign_manager.lock:
+            events, seq = self.campaign_manager.events_since(self._campaign_seq)
+            if events is None:
+                # First refresh, or the events were no longer kept
+                self.campaign_rows = {
+                    str(lead_id): campaign_features(str(lead_id), campaign)
+                    for lead_id, campaign in self.campaign_manager.get_all_campaigns().items()
+                }
+                changed = True
+            else:
+                changed = bool(events)
+                for lead_id in {str(event["lead_id"]) for event in events}:
+                    campaign = self.campaign_manager.get_campaign(lead_id)
+                    if campaign is None:
+                        self.campaign_rows.pop(lead_id, None)
+                    else:
+                        self.campaign_rows[lead_id] = campaign_features(lead_id, campaign)
+            self._campaign_seq = seq
+            return changed
+
+    def metrics(self):
+        """Refresh if needed and return the cached metrics dictionary"""
+        self.refresh()
+        return self._results
+
+    def _campaign_frames(self):
+        """(campaigns, sent touchpoints) as DataFrames"""
+        campaigns = [row for row, _ in self.campaign_rows.values()]
+        touchpoints = [touchpoint for _, sent in self.campaign_rows.values() for touchpoint in sent]
+        return pd.DataFrame(campaigns, columns=CAMPAIGN_COLUMNS), pd.DataFrame(touchpoints, columns=TOUCHPOINT_COLUMNS)
+
+    def _compute(self):
+        """Compute every metric from the feature rows and campaign store"""
+        conversations = pd.DataFrame(list(self.rows.values()), columns=CONVERSATION_COLUMNS)
+        # Typed even when empty (e.g. after retention dropped every month)
+        conversations = conversations.astype({"proposal": bool, "user_turns": int})
+        conversations["timestamp"] = pd.to_datetime(conversations["timestamp"])
+        campaigns, sent = self._campaign_frames()
+
+        # One row per chat session (a session may be saved several times)
+        conversations = conversations.sort_values("timestamp")
+        sessions = conversations.groupby("session").agg(
+            lead_id=("lead_id", "first"),
+            started=("timestamp", "min"),
+            proposal=("proposal", "any"),
+            user_turns=("user_turns", "max"),
+        )
+        proposal_rows = conversations[conversations["proposal"]]
+        sessions["turns_to_proposal"] = proposal_rows.groupby("session")["user_turns"].min()
+        sessions["proposal_at"] = proposal_rows.groupby("session")["timestamp"].min()
+
+        # Funnel
+        proposal_leads = set(sessions.loc[sessions["proposal"], "lead_id"].dropna())
+        campaign_leads = proposal_leads & set(campaigns["lead_id"])
+        responded_leads = campaign_leads & set(campaigns.loc[campaigns["responded"], "lead_id"])
+        funnel = pd.DataFrame({
+            "stage": ["Chats started", f"Engaged ({ENGAGED_TURNS}+ replies)", "Proposal generated",
+                      "Lead in campaign", "Lead responded"],
+            "count": [
+                len(sessions),
+                int((sessions["user_turns"] >= ENGAGED_TURNS).sum()),
+                int(sessions["proposal"].sum()),
+                len(campaign_leads),
+                len(responded_leads),
+            ],
+        })
+
+        # Where chats without a proposal stopped
+        dropped = sessions[~sessions["proposal"]]
+        drop_off = (
+            dropped.groupby("user_turns").size().rename("sessions").reset_index()
+            if len(dropped) else pd.DataFrame(columns=["user_turns", "sessions"])
+        )
+
+        # Time to proposal - in borrower turns, and hours from the lead's first chat
+        turns = sessions["turns_to_proposal"].dropna()
+        first_chat = sessions.groupby("lead_id")["started"].min()
+        first_proposal = sessions.dropna(subset=["proposal_at"]).groupby("lead_id")["proposal_at"].min()
+        hours = ((first_proposal - first_chat.reindex(first_proposal.index)).dt.total_seconds() / 3600).dropna()
+        time_to_proposal = {
+            "median_turns": float(turns.median()) if len(turns) else None,
+            "p25_turns": float(turns.quantile(0.25)) if len(turns) else None,
+            "p75_turns": float(turns.quantile(0.75)) if len(turns) else None,
+            "turns_histogram": turns.astype(int).value_counts().sort_index().rename_axis("user_turns").rename("sessions").reset_index(),
+            "median_hours": float(hours.median()) if len(hours) else None,
+        }
+
+        return {
+            "sessions": len(sessions),
+            "funnel": funnel,
+            "drop_off": drop_off,
+            "time_to_proposal": time_to_proposal,
+            "template_response": self._template_response(campaigns, sent),
+        }
+
+    def _template_response(self, campaigns, sent):
+        """Sends, attributed replies and reply rate per template"""
+        columns = ["template", "channel", "sends", "replies", "reply_rate"]
+        if sent.empty:
+            return pd.DataFrame(columns=columns)
+
+        sends = sent.groupby(["template", "channel"]).size().rename("sends")
+
+        # A reply is credited to the last touchpoint sent before it
+        responses = campaigns[campaigns["responded"]][["lead_id", "responded_at"]]
+        # Sends without a time cannot be ordered (idxmax fails on an all-NaT lead)
+        candidates = sent.dropna(subset=["sent_at"]).merge(responses, on="lead_id")
+        candidates = candidates[candidates["responded_at"].isna() | (candidates["sent_at"] <= candidates["responded_at"])]
+        if candidates.empty:
+            replies = pd.Series(0, index=sends.index, name="replies")
+        else:
+            credited = candidates.loc[candidates.groupby("lead_id")["sent_at"].idxmax()]
+            replies = credited.groupby(["template", "channel"]).size().rename("replies")
+
+        table = pd.concat([sends, replies], axis=1).fillna(0).astype(int)
+        table["reply_rate"] = (table["replies"] / table["sends"]).round(3)
+        return table.reset_index().sort_values(["reply_rate", "sends"], ascending=False)[columns].reset_index(drop=True)
+
+    def close(self):
+        """Stop following conversation changes"""
+        self._unsubscribe()
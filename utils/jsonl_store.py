@@ -0,0 +1,256 @@
+"""
+JSONL Store - Append-only keyed records with an in-memory offset index
+"""
+import json
+import os
+import time
+import zlib
+
+
+FSYNC_POLICIES = ("always", "interval", "never")
+
+_KEY_PREFIX = b'{"key":'
+_TOMBSTONE_SUFFIX = b',"deleted":true}\n'
+_decoder = json.JSONDecoder()
+
+
+class JsonlStore:
+    """
+    Keyed record store backed by an append-only JSON Lines file
+
+    Every put/delete appends one line; the latest line for a key wins. Only the
+    byte offsets of live records are kept in memory, values are read back from
+    disk on demand.
+
+    The offset index can be saved with index_state() and handed back to a new
+    store, which then only scans the lines appended after it was saved.
+    """
+
+    def __init__(self, path, fsync="never", fsync_interval=1.0, compact_ratio=0.5, index_state=None):
+        """
+        Initialize the store and build the offset index
+
+        Args:
+            path: Path of the .jsonl file (created on first write)
+            fsync: "always" fsyncs every append, "interval" at most once per
+                fsync_interval seconds, "never" leaves flushing to the OS
+            fsync_interval: Seconds between fsyncs for the "interval" policy
+            compact_ratio: maybe_compact() rewrites the file once this share of
+                its lines are superseded or deleted
+            index_state: Saved index_state() to start from (ignored if the
+                file was rewritten or cut short since)
+        """
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync}")
+
+        self.path = path
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.compact_ratio = compact_ratio
+        self.index = {}         # key -> (offset, length) of the latest record
+        self.dead_records = 0   # superseded/deleted lines reclaimable by compact()
+        self._valid_size = 0    # end of the last complete line
+        self._handle = None
+        self._last_fsync = 0.0
+        self.restored_size = 0  # end of the lines covered by index_state (0 = full scan)
+        self._build_index(index_state)
+
+    def _build_index(self, index_state=None):
+        """Scan the file once, remembering where each key's latest record lives"""
+        self.index = {}
+        self.dead_records = 0
+        self._valid_size = 0
+        self.restored_size = 0
+        if not os.path.exists(self.path):
+            return
+
+        offset = 0
+        if index_state and self._check(index_state["size"]) == index_state["check"]:
+            self.index = {key: tuple(location) for key, location in index_state["index"].items()}
+            self.dead_records = index_state["dead_records"]
+            offset = self._valid_size = self.restored_size = index_state["size"]
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                length = len(line)
+                if not line.endswith(b"\n"):
+                    # Torn write at the end of the file - dropped on the next append
+                    break
+                offset += length
+                self._valid_size = offset
+                try:
+                    key, deleted = self._scan_line(line)
+                except ValueError:
+                    self.dead_records += 1
+                    continue
+
+                if key in self.index:
+                    self.dead_records += 1
+                if deleted:
+                    if self.index.pop(key, None) is not None:
+                        self.dead_records += 1
+                else:
+                    self.index[key] = (offset - length, length)
+
+    def _check(self, size):
+        """Checksum of the last bytes before `size` (None if the file is shorter)"""
+        if not size or os.path.getsize(self.path) < size:
+            return None
+        with open(self.path, 'rb') as f:
+            f.seek(max(0, size - 4096))
+            return zlib.crc32(f.read(size - f.tell()))
+
+    def index_state(self):
+        """Offset index as a JSON-serializable dictionary (see index_state in __init__)"""
+        return {
+            "size": self._valid_size,
+            "check": self._check(self._valid_size),
+            "dead_records": self.dead_records,
+            "index": {key: list(location) for key, location in self.index.items()},
+        }
+
+    def records_from(self, offset):
+        """
+        Yield (key, value) for the lines from a byte offset to the current end
+
+        Deletions yield (key, None). Used to catch up from restored_size.
+        """
+        if offset >= self._valid_size:
+            return
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            data = f.read(self._valid_size - offset)
+        for line in data.splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            yield record.get("key"), None if record.get("deleted") else record.get("value")
+
+    def _scan_line(self, line):
+        """Return (key, is_tombstone) without decoding the value"""
+        if line.startswith(_KEY_PREFIX):
+            text = line.decode("utf-8")
+            key, end = _decoder.raw_decode(text, len(_KEY_PREFIX))
+            if text.startswith(',"value":', end):
+                return key, False
+            if line.endswith(_TOMBSTONE_SUFFIX):
+                return key, True
+        # Not written by _append - fall back to a full parse
+        record = json.loads(line)
+        return record.get("key"), bool(record.get("deleted"))
+
+    def _writer(self):
+        """Open (once) the append handle, cutting off any torn tail first"""
+        if self._handle is None:
+            if os.path.exists(self.path) and os.path.getsize(self.path) > self._valid_size:
+                with open(self.path, 'r+b') as f:
+                    f.truncate(self._valid_size)
+            self._handle = open(self.path, 'ab')
+        return self._handle
+
+    def _append(self, record):
+        """Append one record and return its (offset, length)"""
+        line = (json.dumps(record, separators=(",", ":"), default=str) + "\n").encode("utf-8")
+        handle = self._writer()
+        offset = self._valid_size
+        handle.write(line)
+        handle.flush()
+        self._valid_size += len(line)
+
+        if self.fsync == "always":
+            os.fsync(handle.fileno())
+        elif self.fsync == "interval":
+            now = time.monotonic()
+            if now - self._last_fsync >= self.fsync_interval:
+                os.fsync(handle.fileno())
+                self._last_fsync = now
+        return offset, len(line)
+
+    def sync(self):
+        """Force buffered appends to disk"""
+        if self._handle is not None:
+            self._handle.flush()
+            os.fsync(self._handle.fileno())
+            self._last_fsync = time.monotonic()
+
+    def close(self):
+        """Close the append handle (reopened automatically on the next write)"""
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+    def put(self, key, value):
+        """Store a value under a key"""
+        if key in self.index:
+            self.dead_records += 1
+        self.index[key] = self._append({"key": key, "value": value})
+
+    def get(self, key, default=None):
+        """Read a value back from disk (default if the key is unknown)"""
+        location = self.index.get(key)
+        if location is None:
+            return default
+
+        offset, length = location
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            return json.loads(f.read(length))["value"]
+
+    def delete(self, key):
+        """Delete a key (returns False if it was not stored)"""
+        if key not in self.index:
+            return False
+        self._append({"key": key, "deleted": True})
+        del self.index[key]
+        self.dead_records += 2
+        return True
+
+    def keys(self):
+        """Keys of all live records"""
+        return self.index.keys()
+
+    def items(self):
+        """Yield (key, value) for all live records in file order, using one read handle"""
+        if not self.index:
+            return
+        locations = sorted((location, key) for key, location in self.index.items())
+        with open(self.path, 'rb') as f:
+            for (offset, length), key in locations:
+                f.seek(offset)
+                yield key, json.loads(f.read(length))["value"]
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def compact(self):
+        """Rewrite the file with only the latest record for each live key"""
+        if not os.path.exists(self.path):
+            return
+
+        self.close()
+        temp_path = f"{self.path}.compact"
+        new_index = {}
+        with open(self.path, 'rb') as src, open(temp_path, 'wb') as dst:
+            for key, (offset, length) in sorted(self.index.items(), key=lambda item: item[1][0]):
+                src.seek(offset)
+                new_index[key] = (dst.tell(), length)
+                dst.write(src.read(length))
+            dst.flush()
+            os.fsync(dst.fileno())
+
+        os.replace(temp_path, self.path)
+        self.index = new_index
+        self.dead_records = 0
+        self._valid_size = os.path.getsize(self.path)
+
+    def maybe_compact(self):
+        """Compact when superseded/deleted lines exceed compact_ratio of the file"""
+        total = len(self.index) + self.dead_records
+        if self.dead_records and self.dead_records >= self.compact_ratio * total:
+            self.compact()
+            return True
+        return False
@@ -0,0 +1,275 @@
+"""
+Lead Deduplication - Detect borrowers re-sent by Bonzo under new lead IDs
+"""
+import re
+
+
+# Street suffix / direction abbreviations applied before building address keys
+ADDRESS_ABBREVIATIONS = {
+    "street": "st",
+    "avenue": "ave",
+    "boulevard": "blvd",
+    "road": "rd",
+    "drive": "dr",
+    "lane": "ln",
+    "court": "ct",
+    "place": "pl",
+    "circle": "cir",
+    "parkway": "pkwy",
+    "highway": "hwy",
+    "terrace": "ter",
+    "apartment": "apt",
+    "suite": "ste",
+    "north": "n",
+    "south": "s",
+    "east": "e",
+    "west": "w",
+}
+
+# Mail providers that ignore dots in the local part of the address
+DOTLESS_EMAIL_DOMAINS = {"gmail.com", "googlemail.com"}
+
+_NON_DIGITS = re.compile(r"\D")
+_NON_ALNUM = re.compile(r"[^a-z0-9 ]")
+
+
+def normalize_phone(phone):
+    """Reduce a phone number to its 10 digit US form (None if not a valid number)"""
+    if not phone:
+        return None
+    digits = _NON_DIGITS.sub("", str(phone))
+    if len(digits) == 11 and digits.startswith("1"):
+        digits = digits[1:]
+    if len(digits) != 10:
+        return None
+    return digits
+
+
+def normalize_email(email):
+    """Lowercase an email, dropping +tags (and dots for Gmail)"""
+    if not email:
+        return None
+    email = str(email).strip().lower()
+    if email.count("@") != 1:
+        return None
+    local, domain = email.split("@")
+    local = local.split("+", 1)[0]
+    if domain in DOTLESS_EMAIL_DOMAINS:
+        local = local.replace(".", "")
+        domain = "gmail.com"
+    if not local or not domain:
+        return None
+    return f"{local}@{domain}"
+
+
+def normalize_address(address, zip_code=None, city=None, state=None):
+    """
+    Normalize a street address into a comparable key
+
+    The street line is lowercased, stripped of punctuation and abbreviated, then
+    qualified with the 5 digit zip (or city/state when no zip is known).
+    """
+    if not address:
+        return None
+    words = _NON_ALNUM.sub(" ", str(address).lower()).split()
+    if not words:
+        return None
+    street = " ".join(ADDRESS_ABBREVIATIONS.get(word, word) for word in words)
+
+    zip5 = _NON_DIGITS.sub("", str(zip_code or ""))[:5]
+    if len(zip5) == 5:
+        return f"{street}|{zip5}"
+    if city and state:
+        return f"{street}|{str(city).strip().lower()}|{str(state).strip().lower()}"
+    return None
+
+
+def normalize_name(lead):
+    """Lowercased borrower name without punctuation (None if the lead has no name)"""
+    name = lead.get("name") or f"{lead.get('first_name') or ''} {lead.get('last_name') or ''}"
+    words = _NON_ALNUM.sub(" ", str(name).lower()).split()
+    return " ".join(words) or None
+
+
+def is_strong_key(key):
+    """
+    Whether a blocking key identifies a borrower on its own (phone, email)
+
+    An address is shared by households and offices, so an address match only
+    counts when the names match too.
+    """
+    return not key.startswith("addr:")
+
+
+def blocking_keys(lead):
+    """
+    Build the blocking keys for a lead
+
+    Args:
+        lead: Lead dictionary (parsed or manual format)
+
+    Returns:
+        List of "kind:value" strings, one per identifying field present
+    """
+    keys = []
+
+    phone = normalize_phone(lead.get("phone"))
+    if phone:
+        keys.append(f"phone:{phone}")
+
+    email = normalize_email(lead.get("email"))
+    if email:
+        keys.append(f"email:{email}")
+
+    address = normalize_address(
+        lead.get("property_address") or lead.get("address"),
+        zip_code=lead.get("property_zip") or lead.get("zip"),
+        city=lead.get("property_city") or lead.get("city"),
+        state=lead.get("property_state") or lead.get("state"),
+    )
+    if address:
+        keys.append(f"addr:{address}")
+
+    return keys
+
+
+def merge_leads(existing, incoming):
+    """
+    Merge a duplicate lead into an existing one
+
+    Non-empty values from the incoming lead win (Bonzo re-sends carry the latest
+    numbers), the existing lead_id is kept and the incoming ID is remembered in
+    "duplicate_lead_ids".
+
+    Returns:
+        New merged lead dictionary
+    """
+    merged = dict(existing)
+    for key, value in incoming.items():
+        if key in ("lead_id", "duplicate_lead_ids", "duplicate_of"):
+            continue
+        if value in (None, "", [], {}):
+            continue
+        merged[key] = value
+
+    aliases = list(existing.get("duplicate_lead_ids") or [])
+    for alias in [incoming.get("lead_id")] + list(incoming.get("duplicate_lead_ids") or []):
+        if alias and alias != existing.get("lead_id") and alias not in aliases:
+            aliases.append(alias)
+    if aliases:
+        merged["duplicate_lead_ids"] = aliases
+
+    return merged
+
+
+class LeadDeduplicator:
+    """
+    Hash indexes from normalized phone/email/address to the lead that owns them
+
+    Each incoming lead costs one dict lookup per blocking key, so duplicate
+    checks stay O(1) no matter how large the book is.
+    """
+
+    def __init__(self):
+        """Initialize empty indexes"""
+        self.index = {}            # blocking key -> lead_id
+        self.keys_by_lead = {}     # lead_id -> blocking keys owned by that lead
+        self.names = {}            # lead_id -> normalized name (for address matches)
+
+    def build(self, leads):
+        """Index an existing book of leads (dict of lead_id -> lead)"""
+        self.index = {}
+        self.keys_by_lead = {}
+        self.names = {}
+        for lead_id, lead in leads.items():
+            self.add(lead_id, lead)
+
+    def find_duplicate(self, lead, lead_id=None):
+        """
+        Find an indexed lead that is the same borrower as this lead
+
+        A phone or email match is enough; an address match also needs the
+        names to match (see possible_duplicate for the rest).
+
+        Args:
+            lead: Incoming lead dictionary
+            lead_id: ID of the incoming lead (matches against itself are ignored)
+
+        Returns:
+            Tuple of (existing lead_id, matching key) or None
+        """
+        lead_id = lead_id or lead.get("lead_id")
+        name = normalize_name(lead)
+        for key in blocking_keys(lead):
+            owner = self.index.get(key)
+            if owner is None or owner == lead_id:
+                continue
+            if is_strong_key(key) or (name and self.names.get(owner) == name):
+                return owner, key
+        return None
+
+    def possible_duplicate(self, lead, lead_id=None):
+        """
+        Find an indexed lead at the same address under a different (or no) name
+
+        Returns:
+            Tuple of (existing lead_id, matching key) or None
+        """
+        lead_id = lead_id or lead.get("lead_id")
+        for key in blocking_keys(lead):
+            owner = self.index.get(key)
+            if owner is not None and owner != lead_id and not is_strong_key(key):
+                return owner, key
+        return None
+
+    def add(self, lead_id, lead):
+        """Register a lead's blocking keys (keys already owned by another lead are kept)"""
+        self.remove(lead_id)
+        owned = []
+        for key in blocking_keys(lead):
+            if key not in self.index:
+                self.index[key] = lead_id
+                owned.append(key)
+        self.keys_by_lead[lead_id] = owned
+        self.names[lead_id] = normalize_name(lead)
+
+    def remove(self, lead_id):
+        """Drop all blocking keys owned by a lead"""
+        self.names.pop(lead_id, None)
+        for key in self.keys_by_lead.pop(lead_id, []):
+            if self.index.get(key) == lead_id:
+                del self.index[key]
+
+    def find_duplicates(self, leads):
+        """
+        Batch mode - dedup a whole book in a single linear pass
+
+        Leads are visited in insertion order, so the first lead seen for a
+        borrower becomes the canonical record. Address matches count only
+        when the names match, as in find_duplicate.
+
+        Args:
+            leads: Dictionary of lead_id -> lead
+
+        Returns:
+            Dictionary of duplicate lead_id -> canonical lead_id
+        """
+        seen = {}
+        names = {}
+        duplicates = {}
+        for lead_id, lead in leads.items():
+            keys = blocking_keys(lead)
+            name = normalize_name(lead)
+            canonical = None
+            for key in keys:
+                if key in seen and (is_strong_key(key) or (name and names[seen[key]] == name)):
+                    canonical = seen[key]
+                    break
+            if canonical is None:
+                canonical = lead_id
+                names[lead_id] = name
+            else:
+                duplicates[lead_id] = canonical
+            for key in keys:
+                seen.setdefault(key, canonical)
+        return duplicates
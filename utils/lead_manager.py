@@ -5,60 +5,276 @@ import json
 import os
 from datetime import datetime
 
+from .change_feed import ChangeFeed, diff_fields
+from .jsonl_store import JsonlStore
+from .lead_dedup import LeadDeduplicator, merge_leads
+from .lead_model import LeadRecord, PAYLOAD_KEY
+from .shared_store import SharedStore, synchronized
+from .timezones import TIMEZONE_FIELDS, lead_timezone
 
-class LeadDataManager:
-    """Manages lead data storage and retrieval"""
+
+class LeadDataManager(SharedStore):
+    """
+    Manages lead data storage and retrieval
+
+    One instance is shared by all app sessions. Writes hold the store lock and
+    swap in a new leads dict when keys are added or removed, so the dict handed
+    out by get_all_leads() is a stable snapshot that never needs copying.
+
+    Every change is also appended to an append-only change feed (see
+    utils/change_feed.py) that downstream consumers tail from a checkpoint.
+    """
     
-    def __init__(self, data_file="leads_data.json"):
-        """Initialize the lead data manager"""
+    def __init__(self, data_file="leads_data.json", payload_file=None, change_feed_file=None):
+        """
+        Initialize the lead data manager
+
+        Args:
+            data_file: JSON file holding the parsed lead fields
+            payload_file: JSONL file holding raw Bonzo payloads
+                (defaults to <data_file>_bonzo.jsonl)
+            change_feed_file: JSONL change feed (defaults to <data_file>_changes.jsonl)
+        """
+        super().__init__()
         self.data_file = data_file
+        base_path = os.path.splitext(data_file)[0]
+        self.payload_file = payload_file or f"{base_path}_bonzo.jsonl"
+        self.payloads = JsonlStore(self.payload_file)
+        self.change_feed = ChangeFeed(change_feed_file or f"{base_path}_changes.jsonl")
+        self._snapshot = None       # published leads while add_leads() builds the next dict
+        self._deferred = []         # (op, lead_id) notifications held back by add_leads()
         self.leads = self._load_leads()
+        self.deduplicator = LeadDeduplicator()
+        self.deduplicator.build(self.leads)
     
     def _load_leads(self):
         """Load leads from JSON file"""
         if os.path.exists(self.data_file):
             try:
                 with open(self.data_file, 'r') as f:
-                    return json.load(f)
+                    raw_leads = json.load(f)
             except:
                 return {}
+
+            # Older files keep the Bonzo payload inline - move it to the payload store -
+            # and leads stored before timezones were resolved keep a raw label or none
+            migrated = False
+            for lead_id, lead in raw_leads.items():
+                if PAYLOAD_KEY in lead and lead_id in self.payloads:
+                    lead.pop(PAYLOAD_KEY)
+                timezone = lead_timezone(lead)
+                migrated = migrated or PAYLOAD_KEY in lead or lead.get("timezone") != timezone
+                lead["timezone"] = timezone
+
+            leads = {lead_id: LeadRecord.from_dict(lead, self.payloads) for lead_id, lead in raw_leads.items()}
+            if migrated:
+                self._write_leads(leads)
+            return leads
         return {}
     
     def _save_leads(self):
-        """Save leads to JSON file"""
+        """Save leads to JSON file (once, at the end, inside add_leads())"""
+        if self._snapshot is None:
+            self._write_leads(self.leads)
+
+    def _write_leads(self, leads):
+        """Write the parsed lead fields (raw payloads live in the payload store)"""
         with open(self.data_file, 'w') as f:
-            json.dump(self.leads, f, indent=2)
+            json.dump({lead_id: lead.to_dict() for lead_id, lead in leads.items()}, f, indent=2)
+
+    def _put_lead(self, lead_id, record):
+        """
+        Store a record, copying the dict only when a new key is added
+
+        Inside add_leads() self.leads is already a private copy, so the whole
+        batch is written into it in place.
+        """
+        if lead_id in self.leads or self._snapshot is not None:
+            self.leads[lead_id] = record
+        else:
+            leads = dict(self.leads)
+            leads[lead_id] = record
+            self.leads = leads
+
+    def _pop_lead(self, lead_id):
+        """Remove a record from a fresh copy of the dict"""
+        leads = dict(self.leads)
+        record = leads.pop(lead_id)
+        self.leads = leads
+        return record
+
+    def _record_change(self, op, lead_id, before, after):
+        """Append a field-level diff to the change feed and notify subscribers"""
+        changes = diff_fields(before, after)
+        if op == "update" and not changes:
+            return None
+        event = self.change_feed.append(op, lead_id, changes)
+        if self._snapshot is not None:
+            self._deferred.append((op, lead_id))
+        else:
+            self._notify(op, lead_id)
+        return event
     
-    def add_lead(self, lead_data):
-        """Add or update a lead"""
+    @synchronized
+    def add_lead(self, lead_data, on_duplicate="merge"):
+        """
+        Add or update a lead
+
+        Args:
+            lead_data: Lead dictionary
+            on_duplicate: What to do when the lead matches an existing borrower
+                by phone, email, or address and name under a different lead_id:
+                "merge" folds it into the existing lead, "flag" stores it with
+                a "duplicate_of" marker, "insert" skips the check. A lead that
+                only shares an address is stored with a "possible_duplicate_of"
+                marker instead of being merged
+
+        The lead's "timezone" is stored resolved to an IANA zone (see
+        utils/timezones.py), whichever path imported it.
+
+        Returns:
+            ID of the stored lead (the existing ID when merged)
+        """
+        if on_duplicate not in ("merge", "flag", "insert"):
+            raise ValueError(f"Unknown on_duplicate mode: {on_duplicate}")
+
+        lead_data = {**lead_data, "timezone": lead_timezone(lead_data)}
+
         lead_id = lead_data.get("lead_id", str(datetime.now().timestamp()))
-        self.leads[lead_id] = lead_data
+
+        if lead_id not in self.leads and on_duplicate != "insert":
+            match = self.deduplicator.find_duplicate(lead_data, lead_id)
+            if match:
+                existing_id, _ = match
+                if on_duplicate == "merge":
+                    before = self.leads[existing_id].to_dict()
+                    merged = merge_leads(self.leads[existing_id], lead_data)
+                    self._put_lead(existing_id, LeadRecord.from_dict(merged, self.payloads))
+                    self.deduplicator.add(existing_id, self.leads[existing_id])
+                    self._save_leads()
+                    self._record_change("update", existing_id, before, self.leads[existing_id].to_dict())
+                    return existing_id
+                lead_data["duplicate_of"] = existing_id
+            else:
+                # Same address, different name: could be a household member
+                possible = self.deduplicator.possible_duplicate(lead_data, lead_id)
+                if possible:
+                    lead_data["possible_duplicate_of"] = possible[0]
+
+        existing = self.leads.get(lead_id)
+        before = existing.to_dict() if existing is not None else None
+        self._put_lead(lead_id, LeadRecord.from_dict(lead_data, self.payloads))
+        self.deduplicator.add(lead_id, lead_data)
         self._save_leads()
+        self._record_change("add" if before is None else "update", lead_id, before, self.leads[lead_id].to_dict())
         return lead_id
     
+    @synchronized
+    def add_leads(self, leads, on_duplicate="merge"):
+        """
+        Add many leads (a bulk import) with one copy of the lead dict and one save
+
+        Readers keep seeing the leads as they were until the whole batch is
+        in; subscribers are notified once it is.
+
+        Args:
+            leads: Iterable of lead dictionaries
+            on_duplicate: See add_lead
+
+        Returns:
+            List of the stored lead IDs (see add_lead)
+        """
+        self._snapshot = self.leads
+        self.leads = dict(self.leads)
+        try:
+            lead_ids = [self.add_lead(lead_data, on_duplicate) for lead_data in leads]
+        finally:
+            self._snapshot = None
+            self._save_leads()
+            deferred, self._deferred = self._deferred, []
+            for op, lead_id in deferred:
+                self._notify(op, lead_id)
+        return lead_ids
+    
     def get_lead(self, lead_id):
         """Get a specific lead by ID"""
-        return self.leads.get(lead_id)
+        leads = self._snapshot if self._snapshot is not None else self.leads
+        return leads.get(lead_id)
     
     def get_all_leads(self):
         """Get all leads"""
-        return self.leads
+        return self._snapshot if self._snapshot is not None else self.leads
     
+    @synchronized
     def delete_lead(self, lead_id):
         """Delete a lead"""
         if lead_id in self.leads:
-            del self.leads[lead_id]
+            record = self._pop_lead(lead_id)
+            self.payloads.delete(lead_id)
+            self.deduplicator.remove(lead_id)
             self._save_leads()
+            self._record_change("delete", lead_id, record.to_dict(), None)
             return True
         return False
     
+    @synchronized
     def update_lead(self, lead_id, updated_data):
-        """Update an existing lead"""
+        """Update an existing lead (re-resolving its timezone when its location changes)"""
         if lead_id in self.leads:
+            before = self.leads[lead_id].to_dict()
+            if any(field in updated_data for field in TIMEZONE_FIELDS):
+                # The stored zone came from the old location; a new label wins if given
+                located = {**before, **updated_data, "timezone": updated_data.get("timezone")}
+                updated_data = {**updated_data, "timezone": lead_timezone(located)}
             self.leads[lead_id].update(updated_data)
+            self.deduplicator.add(lead_id, self.leads[lead_id])
             self._save_leads()
+            self._record_change("update", lead_id, before, self.leads[lead_id].to_dict())
             return True
         return False
+
+    def find_duplicate(self, lead_data):
+        """Return the ID of an existing lead matching this borrower, or None"""
+        match = self.deduplicator.find_duplicate(lead_data)
+        return match[0] if match else None
+
+    @synchronized
+    def dedupe_leads(self, merge=True):
+        """
+        Dedup the whole book in a single linear pass
+
+        Args:
+            merge: Merge duplicates into their canonical lead and delete them
+                (False only flags them with "duplicate_of")
+
+        Returns:
+            Dictionary of duplicate lead_id -> canonical lead_id
+        """
+        duplicates = self.deduplicator.find_duplicates(self.leads)
+        if not duplicates:
+            return duplicates
+
+        leads = dict(self.leads)
+        before = {lead_id: leads[lead_id].to_dict() for lead_id in list(duplicates) + list(duplicates.values())}
+        for duplicate_id, canonical_id in duplicates.items():
+            if merge:
+                merged = merge_leads(leads[canonical_id], leads.pop(duplicate_id))
+                leads[canonical_id] = LeadRecord.from_dict(merged, self.payloads)
+                self.payloads.delete(duplicate_id)
+            else:
+                leads[duplicate_id]["duplicate_of"] = canonical_id
+        self.leads = leads
+
+        self.deduplicator.build(self.leads)
+        self._save_leads()
+        for duplicate_id in duplicates:
+            if merge:
+                self._record_change("delete", duplicate_id, before[duplicate_id], None)
+            else:
+                self._record_change("update", duplicate_id, before[duplicate_id], leads[duplicate_id].to_dict())
+        for canonical_id in dict.fromkeys(duplicates.values()):
+            self._record_change("update", canonical_id, before[canonical_id], leads[canonical_id].to_dict())
+        return duplicates
     
     def parse_bonzo_lead(self, bonzo_json):
         """
@@ -106,6 +322,12 @@ class LeadDataManager:
             except:
                 annual_income = None
         
+        # Resolve the timezone once here so scheduling never has to
+        # (Bonzo labels like "Eastern", or the property state and zip)
+        state = bonzo_json.get("property_state") or bonzo_json.get("state")
+        zip_code = bonzo_json.get("property_zip") or bonzo_json.get("zip")
+        timezone = lead_timezone(bonzo_json)
+        
         parsed_data = {
             # Original Bonzo data
             "bonzo_data": bonzo_json,
@@ -126,12 +348,13 @@ class LeadDataManager:
             "property_type": bonzo_json.get("property_type"),
             "property_address": bonzo_json.get("property_address") or bonzo_json.get("address"),
             "property_city": bonzo_json.get("property_city") or bonzo_json.get("city"),
-            "property_state": bonzo_json.get("property_state") or bonzo_json.get("state"),
-            "property_zip": bonzo_json.get("property_zip") or bonzo_json.get("zip"),
+            "property_state": state,
+            "property_zip": zip_code,
             "birthday": bonzo_json.get("birthday"),
             "annual_income": annual_income,
             "lead_source": bonzo_json.get("lead_source"),
             "application_date": bonzo_json.get("application_date"),
+            "timezone": timezone,
         }
         
         return parsed_data
@@ -0,0 +1,153 @@
+"""
+Lead Model - Compact slotted lead records with lazily loaded Bonzo payloads
+"""
+import sys
+from collections.abc import MutableMapping
+
+
+# Parsed fields every lead carries (see LeadDataManager.parse_bonzo_lead)
+LEAD_FIELDS = (
+    "lead_id",
+    "name",
+    "first_name",
+    "last_name",
+    "email",
+    "phone",
+    "property_value",
+    "current_balance",
+    "cash_out_amount",
+    "is_veteran",
+    "credit_score",
+    "loan_purpose",
+    "property_type",
+    "property_address",
+    "property_city",
+    "property_state",
+    "property_zip",
+    "birthday",
+    "annual_income",
+    "lead_source",
+    "application_date",
+    "timezone",
+)
+
+# Low-cardinality string fields shared across many leads - interned so every
+# lead with the same value points at one string object
+INTERNED_FIELDS = frozenset({
+    "is_veteran", "credit_score", "loan_purpose", "property_type",
+    "property_city", "property_state", "lead_source", "application_date", "timezone",
+})
+
+PAYLOAD_KEY = "bonzo_data"
+
+_FIELD_SET = frozenset(LEAD_FIELDS)
+_MISSING = object()
+
+
+class LeadRecord(MutableMapping):
+    """
+    Slotted lead record that behaves like the plain lead dict
+
+    Hot fields live in __slots__, anything else in a small overflow dict, and
+    the raw Bonzo payload ("bonzo_data") is kept in a separate payload store and
+    only read when that key is accessed.
+    """
+
+    __slots__ = LEAD_FIELDS + ("_extra", "_payloads")
+
+    def __init__(self, payloads=None):
+        """
+        Initialize an empty record
+
+        Args:
+            payloads: Store holding raw Bonzo payloads keyed by lead_id
+                (e.g. JsonlStore); None keeps payloads inline
+        """
+        for field in LEAD_FIELDS:
+            object.__setattr__(self, field, _MISSING)
+        self._extra = None
+        self._payloads = payloads
+
+    @classmethod
+    def from_dict(cls, data, payloads=None):
+        """Build a record from a lead dictionary"""
+        record = cls(payloads)
+        # lead_id first, so the payload can be filed under it
+        if "lead_id" in data:
+            record["lead_id"] = data["lead_id"]
+        for key, value in data.items():
+            record[key] = value
+        return record
+
+    def to_dict(self, include_payload=False):
+        """
+        Convert back to a plain dictionary
+
+        Args:
+            include_payload: Also load and include the raw Bonzo payload
+        """
+        data = {}
+        for field in LEAD_FIELDS:
+            value = getattr(self, field)
+            if value is not _MISSING:
+                data[field] = value
+        if self._extra:
+            data.update(self._extra)
+        if include_payload and self.has_payload():
+            data[PAYLOAD_KEY] = self._payloads.get(self.lead_id)
+        return data
+
+    def has_payload(self):
+        """Whether a raw Bonzo payload is held in the payload store for this lead"""
+        return self._payloads is not None and self.lead_id is not _MISSING and self.lead_id in self._payloads
+
+    def __getitem__(self, key):
+        if key in _FIELD_SET:
+            value = getattr(self, key)
+            if value is _MISSING:
+                raise KeyError(key)
+            return value
+        if key == PAYLOAD_KEY and self.has_payload():
+            return self._payloads.get(self.lead_id)
+        if self._extra and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key in _FIELD_SET:
+            if key in INTERNED_FIELDS and isinstance(value, str):
+                value = sys.intern(value)
+            object.__setattr__(self, key, value)
+        elif key == PAYLOAD_KEY and self._payloads is not None and self.lead_id not in (_MISSING, None):
+            self._payloads.put(self.lead_id, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+        if key in _FIELD_SET:
+            if getattr(self, key) is _MISSING:
+                raise KeyError(key)
+            object.__setattr__(self, key, _MISSING)
+        elif key == PAYLOAD_KEY and self.has_payload():
+            self._payloads.delete(self.lead_id)
+        elif self._extra and key in self._extra:
+            del self._extra[key]
+        else:
+            raise KeyError(key)
+
+    def __iter__(self):
+        for field in LEAD_FIELDS:
+            if getattr(self, field) is not _MISSING:
+                yield field
+        if self.has_payload():
+            yield PAYLOAD_KEY
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"LeadRecord({self.to_dict()!r})"
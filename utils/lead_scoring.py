@@ -0,0 +1,283 @@
+"""
+Lead Scoring - Rank leads for the call queue
+
+Features (equity, LTV, cash-out size, credit band, lead age and source quality)
+are computed as numpy arrays over the whole book at once; the call queue then
+keeps a heap of scores that is updated one lead at a time as leads change.
+"""
+import heapq
+import itertools
+import re
+import threading
+from datetime import datetime
+
+import numpy as np
+
+
+# Score weights (sum to 1.0) - final score is 0-100
+DEFAULT_WEIGHTS = {
+    "equity": 0.20,
+    "ltv": 0.15,
+    "cash_out": 0.20,
+    "credit": 0.15,
+    "recency": 0.20,
+    "source": 0.10,
+}
+
+# Bonzo sends either a FICO number or a band label
+CREDIT_BANDS = {
+    "EXCELLENT": 760,
+    "GOOD": 700,
+    "FAIR": 640,
+    "POOR": 580,
+}
+DEFAULT_CREDIT = 660
+
+# Lead source keywords and their quality (first match wins, checked in order)
+SOURCE_QUALITY = (
+    ("good/exc", 1.0),
+    ("excellent", 1.0),
+    ("referral", 1.0),
+    ("cashout", 0.8),
+    ("+", 0.7),
+)
+DEFAULT_SOURCE_QUALITY = 0.5
+
+# Normalization constants
+EQUITY_CAP = 500000        # equity at or above this scores 1.0
+CASH_OUT_CAP = 150000      # cash out at or above this scores 1.0
+LTV_BEST, LTV_WORST = 0.50, 0.90
+CREDIT_MIN, CREDIT_MAX = 580, 800
+RECENCY_HALF_LIFE_DAYS = 3.0
+
+_DIGITS = re.compile(r"\d+")
+
+
+def parse_credit(value):
+    """Turn a credit score or band label into a number"""
+    if value is None:
+        return DEFAULT_CREDIT
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip().upper()
+    if text in CREDIT_BANDS:
+        return CREDIT_BANDS[text]
+    match = _DIGITS.search(text)
+    if match and 300 <= int(match.group()) <= 850:
+        return float(match.group())
+    return DEFAULT_CREDIT
+
+
+def source_quality(source):
+    """Quality weight (0-1) for a lead source label"""
+    text = str(source or "").lower()
+    for keyword, quality in SOURCE_QUALITY:
+        if keyword in text:
+            return quality
+    return DEFAULT_SOURCE_QUALITY
+
+
+def _number(value):
+    """Numeric field value (0 when missing or unparseable)"""
+    try:
+        return float(str(value).replace(",", "")) if value not in (None, "") else 0.0
+    except ValueError:
+        return 0.0
+
+
+def _age_days(application_date, now):
+    """Days since the application date (None when missing or unparseable)"""
+    if not application_date:
+        return None
+    try:
+        applied = datetime.fromisoformat(str(application_date)[:10])
+    except ValueError:
+        return None
+    return max((now - applied).total_seconds() / 86400, 0.0)
+
+
+def lead_features(leads, now=None):
+    """
+    Compute feature columns for a list of leads
+
+    Args:
+        leads: List of lead dictionaries
+        now: Reference time for lead age (defaults to now)
+
+    Returns:
+        Dictionary of feature name -> numpy array (one entry per lead)
+    """
+    now = now or datetime.now()
+    property_value = np.array([_number(lead.get("property_value")) for lead in leads], dtype=float)
+    balance = np.array([_number(lead.get("current_balance")) for lead in leads], dtype=float)
+    cash_out = np.array([_number(lead.get("cash_out_amount")) for lead in leads], dtype=float)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ltv = np.where(property_value > 0, (balance + cash_out) / property_value, 1.0)
+
+    return {
+        "equity": np.maximum(property_value - balance, 0.0),
+        "ltv": ltv,
+        "cash_out": cash_out,
+        "credit": np.array([parse_credit(lead.get("credit_score")) for lead in leads], dtype=float),
+        # Unknown ages become NaN and get no recency credit
+        "age_days": np.array([_age_days(lead.get("application_date"), now) for lead in leads], dtype=float),
+        "source": np.array([source_quality(lead.get("lead_source")) for lead in leads], dtype=float),
+    }
+
+
+class LeadScorer:
+    """Vectorized lead scoring"""
+
+    def __init__(self, weights=None):
+        """
+        Initialize the scorer
+
+        Args:
+            weights: Optional override of DEFAULT_WEIGHTS
+        """
+        self.weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+
+    def score_features(self, features):
+        """Combine feature columns into 0-100 scores"""
+        components = {
+            "equity": np.clip(features["equity"] / EQUITY_CAP, 0, 1),
+            "ltv": 1 - np.clip((features["ltv"] - LTV_BEST) / (LTV_WORST - LTV_BEST), 0, 1),
+            "cash_out": np.clip(features["cash_out"] / CASH_OUT_CAP, 0, 1),
+            "credit": np.clip((features["credit"] - CREDIT_MIN) / (CREDIT_MAX - CREDIT_MIN), 0, 1),
+            "recency": np.nan_to_num(np.power(0.5, features["age_days"] / RECENCY_HALF_LIFE_DAYS), nan=0.0),
+            "source": features["source"],
+        }
+        total = sum(self.weights[name] * values for name, values in components.items())
+        return np.round(100 * total, 2)
+
+    def score_leads(self, leads, now=None):
+        """
+        Score a whole book of leads
+
+        Args:
+            leads: Dictionary of lead_id -> lead
+
+        Returns:
+            Dictionary of lead_id -> score
+        """
+        lead_ids = list(leads)
+        if not lead_ids:
+            return {}
+        scores = self.score_features(lead_features([leads[i] for i in lead_ids], now))
+        return dict(zip(lead_ids, scores.tolist()))
+
+    def score_lead(self, lead, now=None):
+        """Score a single lead"""
+        return float(self.score_features(lead_features([lead], now))[0])
+
+    def rank_leads(self, leads, now=None):
+        """Return [(lead_id, score)] sorted best first"""
+        scores = self.score_leads(leads, now)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class CallQueue:
+    """
+    Top-K call queue over the lead store
+
+    Scores live in a max-heap with lazy invalidation: a changed lead pushes a
+    new entry and its old entry is skipped when it surfaces, so an update costs
+    O(log n) and top(k) costs O(k log n). Lead age is scored as of the time a
+    lead was (re)scored, so call build() again periodically (e.g. daily) to
+    refresh the recency decay across the book.
+    """
+
+    def __init__(self, scorer=None):
+        """Initialize an empty queue"""
+        self.scorer = scorer or LeadScorer()
+        self.lock = threading.RLock()
+        self.heap = []          # (-score, entry_id, lead_id)
+        self.current = {}       # lead_id -> (score, entry_id) of the live entry
+        self._entry_ids = itertools.count()
+
+    def build(self, leads, now=None):
+        """Score the whole book once (vectorized) and heapify"""
+        scores = self.scorer.score_leads(leads, now)
+        with self.lock:
+            self.current = {}
+            self.heap = []
+            for lead_id, score in scores.items():
+                entry_id = next(self._entry_ids)
+                self.current[lead_id] = (score, entry_id)
+                self.heap.append((-score, entry_id, lead_id))
+            heapq.heapify(self.heap)
+
+    def update(self, lead_id, lead, now=None):
+        """Re-score one lead"""
+        score = self.scorer.score_lead(lead, now)
+        with self.lock:
+            entry_id = next(self._entry_ids)
+            self.current[lead_id] = (score, entry_id)
+            heapq.heappush(self.heap, (-score, entry_id, lead_id))
+            self._maybe_compact()
+        return score
+
+    def remove(self, lead_id):
+        """Drop a lead from the queue"""
+        with self.lock:
+            self.current.pop(lead_id, None)
+            self._maybe_compact()
+
+    def _is_live(self, entry):
+        """Whether a heap entry is the current one for its lead"""
+        live = self.current.get(entry[2])
+        return live is not None and live[1] == entry[1]
+
+    def _maybe_compact(self):
+        """Rebuild the heap when stale entries outnumber live ones"""
+        if len(self.heap) > 2 * len(self.current) + 64:
+            self.heap = [entry for entry in self.heap if self._is_live(entry)]
+            heapq.heapify(self.heap)
+
+    def top(self, k=10):
+        """
+        Highest scoring leads
+
+        Returns:
+            List of (lead_id, score), best first
+        """
+        popped = []
+        result = []
+        with self.lock:
+            while self.heap and len(result) < k:
+                entry = heapq.heappop(self.heap)
+                if self._is_live(entry):
+                    popped.append(entry)
+                    result.append((entry[2], -entry[0]))
+            for entry in popped:
+                heapq.heappush(self.heap, entry)
+        return result
+
+    def score_of(self, lead_id):
+        """Current score of a lead (None if not queued)"""
+        live = self.current.get(lead_id)
+        return live[0] if live else None
+
+    def __len__(self):
+        return len(self.current)
+
+    def attach(self, lead_manager):
+        """
+        Build from a LeadDataManager and follow its changes
+
+        Returns:
+            Function that detaches the queue again
+        """
+        with lead_manager.lock:
+            self.build(lead_manager.get_all_leads())
+
+            def on_change(event, lead_id, version):
+                if event == "delete":
+                    self.remove(lead_id)
+                else:
+                    lead = lead_manager.get_lead(lead_id)
+                    if lead is not None:
+                        self.update(lead_id, lead)
+
+            return lead_manager.subscribe(on_change)
@@ -0,0 +1,147 @@
+"""
+Message Templates - Compiled campaign message templates
+
+personalize_message used to rebuild the whole template dictionary and
+str.format every field on each call. TemplateRegistry compiles the templates
+once: placeholders are parsed and checked against the known tokens when the
+registry is built (a typo fails at startup, not mid-campaign), fields without
+placeholders are resolved up front, and rendering a message only formats the
+fields that actually contain tokens. Token dictionaries are computed once per
+lead with lead_tokens(), so a batch render over many leads costs one format
+per templated field.
+"""
+import string
+
+
+# Links every message may use
+STATIC_TOKENS = {
+    "wc_reviews": "https://westcapitallending.com/reviews",
+    "phil_reviews": "https://www.philthemortgagepro.com/reviews",
+    "review_link": "https://www.philthemortgagepro.com/reviews",
+    "calendly_link": "https://calendly.com/philgustin",
+}
+
+# Tokens lead_tokens() provides
+TOKEN_NAMES = ("first_name", "last_name", "email", "property_value", "cash_out") + tuple(STATIC_TOKENS)
+
+
+def _money(value):
+    """$-formatted amount (values that are not numbers are passed through)"""
+    try:
+        return f"${value:,}"
+    except (TypeError, ValueError):
+        return f"${value}"
+
+
+def lead_tokens(lead_data):
+    """Personalization tokens of a lead"""
+    name = lead_data.get("name") or ""
+    parts = name.split()
+    return {
+        "first_name": parts[0] if parts else "there",
+        "last_name": " ".join(parts[1:]),
+        "email": lead_data.get("email", "[email]"),
+        "property_value": _money(lead_data.get("property_value", 0)),
+        "cash_out": _money(lead_data.get("cash_out_amount", 0)),
+        **STATIC_TOKENS,
+    }
+
+
+def placeholders(text):
+    """
+    Token names used in a template string
+
+    Raises:
+        ValueError: For malformed braces, positional fields ("{}") or
+            attribute/index access ("{lead.name}", "{x[0]}")
+    """
+    names = []
+    for _, name, _, _ in string.Formatter().parse(text):
+        if name is None:
+            continue
+        if not name.isidentifier():
+            raise ValueError(f"Unsupported placeholder {{{name}}}")
+        names.append(name)
+    return names
+
+
+class TemplateRegistry:
+    """Message templates compiled and validated once"""
+
+    def __init__(self, templates, token_names=TOKEN_NAMES):
+        """
+        Compile every template
+
+        Args:
+            templates: Dictionary of template key -> {field: text or value}
+            token_names: Tokens a template may reference
+
+        Raises:
+            ValueError: If a template has a malformed or unknown placeholder
+        """
+        self.compiled = {}      # key -> [(field, value, whether value must be formatted)]
+        errors = []
+        for key, template in templates.items():
+            fields = []
+            for field, value in template.items():
+                if not isinstance(value, str):
+                    fields.append((field, value, False))
+                    continue
+                try:
+                    names = placeholders(value)
+                except ValueError as e:
+                    errors.append(f"{key}.{field}: {e}")
+                    continue
+                unknown = sorted(set(names) - set(token_names))
+                if unknown:
+                    errors.append(f"{key}.{field}: unknown tokens {', '.join(unknown)}")
+                elif names:
+                    fields.append((field, value, True))
+                else:
+                    # Only escaped braces at most - resolve once
+                    fields.append((field, value.format(), False))
+            self.compiled[key] = fields
+        if errors:
+            raise ValueError("Invalid message templates: " + "; ".join(errors))
+
+    def __contains__(self, key):
+        return key in self.compiled
+
+    def missing(self, keys):
+        """Template keys (e.g. referenced by campaigns) that are not defined"""
+        return sorted({key for key in keys if key not in self.compiled})
+
+    def render(self, key, tokens):
+        """
+        Render one template
+
+        Args:
+            key: Template key
+            tokens: Token dictionary from lead_tokens()
+
+        Returns:
+            Dictionary of rendered fields ({} for an unknown template)
+        """
+        fields = self.compiled.get(key)
+        if fields is None:
+            return {}
+        return {field: value.format_map(tokens) if needs_format else value for field, value, needs_format in fields}
+
+    def render_batch(self, key, token_dicts):
+        """
+        Render one template for many leads
+
+        Args:
+            key: Template key
+            token_dicts: Iterable of token dictionaries (one per lead)
+
+        Returns:
+            List of rendered dictionaries, in input order
+        """
+        fields = self.compiled.get(key)
+        if fields is None:
+            return [{} for _ in token_dicts]
+        return [
+            {field: value.format_map(tokens) if needs_format else value for field, value, needs_format in fields}
+            for tokens in token_dicts
+        ]
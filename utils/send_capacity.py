@@ -0,0 +1,387 @@
+"""
+Send Capacity - Per-channel and per-sender send limits
+
+Two halves of the same limits:
+
+    SendPlanner   used when touchpoints are scheduled. Reserves a minute slot
+                  for each touchpoint so no channel or sending number/domain is
+                  booked beyond its per-minute limit; a burst of imports is
+                  spread over the following minutes (and days, within the
+                  8am-8pm window) instead of all landing on the same minute.
+    RateLimiter   used by the dispatcher when sending. Token buckets per
+                  channel and per sender enforce the same limits at send time,
+                  e.g. after downtime when a backlog is due at once.
+
+Each lead is pinned to one sender of a channel (the same number texts it every
+time), chosen by a stable hash of the lead ID.
+"""
+import functools
+import threading
+import time
+import zlib
+from datetime import datetime
+
+from .campaign_model import pending_touchpoints
+
+
+# channel -> per-minute channel limit and per-minute limit of each sender
+DEFAULT_SEND_LIMITS = {
+    "SMS": {"per_minute": 60, "senders": {"(949) 209-0989": 60}},
+    "Email": {"per_minute": 120, "senders": {"westcapitallending.com": 120}},
+    "VM": {"per_minute": 10, "senders": {"(949) 209-0989": 10}},
+}
+
+# Local hours touchpoints may be sent in
+SEND_WINDOW = (8, 20)
+
+
+def sender_for(limits, channel, lead_id):
+    """Sender (number or domain) a lead is pinned to on a channel (None if unlimited)"""
+    return _pick(sorted(limits.get(channel, {}).get("senders", {})), lead_id)
+
+
+@functools.lru_cache(maxsize=8192)
+def _hour_offset(zone, hour):
+    """UTC offset in minutes of a timezone during an hour since the epoch"""
+    return int(datetime.fromtimestamp(hour * 3600, zone).utcoffset().total_seconds() // 60)
+
+
+def utc_offset(zone, minute):
+    """
+    UTC offset in minutes of a timezone at a minute since the epoch
+
+    Offsets are cached per hour; DST changes of the US zones fall on the hour.
+
+    Args:
+        zone: tzinfo (e.g. a pytz zone), or None for UTC
+        minute: Minutes since the epoch
+    """
+    return 0 if zone is None else _hour_offset(zone, minute // 60)
+
+
+def _pick(senders, lead_id):
+    """Sender of a lead from a sorted sender list"""
+    if not senders:
+        return None
+    return senders[zlib.crc32(str(lead_id).encode("utf-8")) % len(senders)]
+
+
+class SendPlanner:
+    """Per-minute slot reservations for scheduled touchpoints"""
+
+    def __init__(self, limits=None, clock=time.time):
+        """
+        Initialize the planner
+
+        Args:
+            limits: Send limits (defaults to DEFAULT_SEND_LIMITS)
+            clock: Function returning seconds since the epoch
+        """
+        self.limits = limits or DEFAULT_SEND_LIMITS
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.booked = {}        # (channel, sender or None) -> {minute: count}
+        self.full = {}          # same keys -> {full minute: a later minute that may have room}
+        self.seeded = False
+        self._senders = {channel: sorted(entry.get("senders", {})) for channel, entry in self.limits.items()}
+        self._keys = {}         # (channel, sender) -> _limits_for() result
+        self._pruned_at = clock()
+
+    def _limits_for(self, channel, sender):
+        """[(bucket key, per-minute limit)] a touchpoint counts against"""
+        if (channel, sender) in self._keys:
+            return self._keys[(channel, sender)]
+        channel_limits = self.limits.get(channel)
+        if not channel_limits:
+            return []
+        keys = [((channel, None), channel_limits["per_minute"])]
+        if sender is not None:
+            keys.append(((channel, sender), channel_limits["senders"][sender]))
+        self._keys[(channel, sender)] = keys
+        return keys
+
+    def _book(self, keys, minute, count=1):
+        """Count touchpoints in a minute"""
+        for key, limit in keys:
+            counts = self.booked.setdefault(key, {})
+            counts[minute] = counts.get(minute, 0) + count
+            if counts[minute] >= limit:
+                self.full.setdefault(key, {})[minute] = minute + 1
+
+    def _next_open(self, key, minute):
+        """
+        First minute at or after `minute` that is not full for a bucket
+
+        Full minutes point past themselves; the pointers followed are
+        shortened to the answer, so a burst of reservations skips a run of
+        full minutes in one step instead of probing each.
+        """
+        skips = self.full.get(key)
+        if not skips:
+            return minute
+        path = []
+        while minute in skips:
+            path.append(minute)
+            minute = skips[minute]
+        for full_minute in path:
+            skips[full_minute] = minute
+        return minute
+
+    def _first_open(self, keys, minute):
+        """First minute at or after `minute` that no bucket in keys is full in"""
+        while True:
+            candidate = minute
+            for key, _ in keys:
+                skips = self.full.get(key)
+                if skips and candidate in skips:
+                    candidate = self._next_open(key, candidate)
+            if candidate == minute:
+                return minute
+            minute = candidate
+
+    def seed(self, campaigns, now=None):
+        """Book the pending touchpoints of existing active campaigns"""
+        cutoff = int((now.timestamp() if now else self.clock()) // 60)
+        with self.lock:
+            self.booked = {}
+            self.full = {}
+            for lead_id, campaign in campaigns.items():
+                if campaign.get("status") != "active":
+                    continue
+                for scheduled, _, touchpoint in pending_touchpoints(campaign):
+                    minute = int(scheduled // 60)
+                    if minute >= cutoff:
+                        sender = _pick(self._senders.get(touchpoint.get("type")), lead_id)
+                        self._book(self._limits_for(touchpoint.get("type"), sender), minute)
+            self.seeded = True
+
+    def reserve(self, channel, lead_id, earliest):
+        """
+        Book the first minute at or after `earliest` with spare capacity
+
+        Args:
+            channel: "SMS", "Email" or "VM"
+            lead_id: Lead the touchpoint is for (picks its sender)
+            earliest: Timezone-aware datetime in the lead's timezone
+
+        Returns:
+            Reserved datetime (inside the send window, never before earliest)
+        """
+        epoch = int(earliest.timestamp())
+        reserved = self.reserve_epoch(channel, lead_id, epoch, earliest.tzinfo)
+        if reserved == epoch:
+            return earliest
+        return datetime.fromtimestamp(reserved, earliest.tzinfo)
+
+    def reserve_epoch(self, channel, lead_id, epoch, zone):
+        """
+        reserve() on epoch seconds
+
+        Args:
+            channel: "SMS", "Email" or "VM"
+            lead_id: Lead the touchpoint is for (picks its sender)
+            epoch: Earliest send time, seconds since the epoch
+            zone: Lead's timezone (tzinfo) the send window is in
+
+        Returns:
+            Reserved time in seconds since the epoch
+        """
+        return self.reserve_many(channel, self.sender(channel, lead_id), 1, epoch, zone)[0]
+
+    def sender(self, channel, lead_id):
+        """Sender (number or domain) a lead is pinned to on a channel (None if unlimited)"""
+        return _pick(self._senders.get(channel), lead_id)
+
+    def reserve_many(self, channel, sender, count, epoch, zone):
+        """
+        Book several touchpoints of one channel and sender with the same earliest time
+
+        Each minute is filled up to its spare capacity at once, so a burst
+        costs one step per minute used rather than one per touchpoint (what
+        bulk enrollment uses).
+
+        Args:
+            channel: "SMS", "Email" or "VM"
+            sender: Sender the touchpoints go out from (see sender())
+            count: Number of touchpoints
+            epoch: Earliest send time, seconds since the epoch
+            zone: Timezone (tzinfo) of the leads the send window is in
+
+        Returns:
+            Ascending list of `count` reserved times in seconds since the epoch
+        """
+        first = minute = self._in_window(epoch // 60, zone)
+        if minute != epoch // 60:
+            epoch = minute * 60
+        keys = self._limits_for(channel, sender)
+        if not keys:
+            return [epoch] * count
+        if self.clock() - self._pruned_at > 3600:
+            self.prune()
+        reserved = []
+        with self.lock:
+            while len(reserved) < count:
+                while True:
+                    minute = self._first_open(keys, minute)
+                    in_window = self._in_window(minute, zone)
+                    if in_window == minute:
+                        break
+                    minute = in_window
+                booked = count - len(reserved)
+                if booked > 1:
+                    booked = min([booked] + [limit - self.booked.get(key, {}).get(minute, 0) for key, limit in keys])
+                self._book(keys, minute, booked)
+                reserved.extend([epoch if minute == first else minute * 60] * booked)
+        return reserved
+
+    @staticmethod
+    def _in_window(minute, zone):
+        """
+        First minute at or after `minute` inside the send window
+
+        The local hour is taken with the zone's UTC offset at that minute, so
+        the window stays 8am-8pm local time across DST changes.
+        """
+        start, end = SEND_WINDOW
+        offset = utc_offset(zone, minute)
+        local = minute + offset
+        hour = local // 60 % 24
+        if start <= hour < end:
+            return minute
+        midnight = local - local % 1440
+        opening = midnight + (0 if hour < start else 1440) + start * 60
+        # The offset may change before the window opens (a DST night)
+        return opening - utc_offset(zone, opening - offset)
+
+    def prune(self, now=None):
+        """Forget bookings for minutes that have passed"""
+        cutoff = int((now.timestamp() if now else self.clock()) // 60)
+        with self.lock:
+            self._pruned_at = self.clock()
+            for counts in list(self.booked.values()) + list(self.full.values()):
+                for minute in [m for m in counts if m < cutoff]:
+                    del counts[minute]
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at `rate` tokens per second"""
+
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        """
+        Initialize a full bucket
+
+        Args:
+            rate: Tokens added per second
+            capacity: Maximum tokens (burst size)
+            clock: Function returning seconds (monotonic)
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = float(capacity)
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        """Add the tokens earned since the last call"""
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self):
+        """Seconds until a token is available"""
+        with self.lock:
+            self._refill()
+            return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def try_acquire(self):
+        """Take a token if one is available"""
+        with self.lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class RateLimiter:
+    """Send-time token buckets per channel and per sender"""
+
+    def __init__(self, limits=None, clock=time.monotonic, sleep=time.sleep):
+        """
+        Initialize the buckets
+
+        Args:
+            limits: Send limits (defaults to DEFAULT_SEND_LIMITS)
+            clock: Function returning seconds (monotonic)
+            sleep: Function used to wait for tokens
+        """
+        self.limits = limits or DEFAULT_SEND_LIMITS
+        self.sleep = sleep
+        self.lock = threading.Lock()
+        self.buckets = {}
+        for channel, channel_limits in self.limits.items():
+            self.buckets[(channel, None)] = TokenBucket(channel_limits["per_minute"] / 60, channel_limits["per_minute"], clock)
+            for sender, per_minute in channel_limits.get("senders", {}).items():
+                self.buckets[(channel, sender)] = TokenBucket(per_minute / 60, per_minute, clock)
+
+    @staticmethod
+    def channel_rate(limits, channel):
+        """Sustained sends per minute of a channel (None if unlimited)"""
+        channel_limits = limits.get(channel)
+        if not channel_limits:
+            return None
+        senders_total = sum(channel_limits.get("senders", {}).values())
+        return min(channel_limits["per_minute"], senders_total) if senders_total else channel_limits["per_minute"]
+
+    def acquire(self, channel, lead_id):
+        """
+        Wait until the channel and the lead's sender both have a token
+
+        Returns:
+            Sender (number or domain) to send from, None if the channel is unlimited
+        """
+        sender = sender_for(self.limits, channel, lead_id)
+        buckets = [self.buckets[key] for key in ((channel, None), (channel, sender)) if key in self.buckets]
+        while True:
+            with self.lock:
+                wait = max([bucket.wait_time() for bucket in buckets] or [0.0])
+                if wait == 0:
+                    for bucket in buckets:
+                        bucket.try_acquire()
+                    return sender
+            self.sleep(wait)
+
+
+def backlog(due, limits=None, now=None):
+    """
+    Queue depth and expected lag per channel
+
+    Args:
+        due: Due touchpoints as returned by TouchpointQueue.due()
+        limits: Send limits (defaults to DEFAULT_SEND_LIMITS)
+        now: Current datetime (defaults to now)
+
+    Returns:
+        Dictionary of channel -> {"depth", "oldest_wait_minutes",
+        "drain_minutes", "expected_lag_minutes"}; the expected lag is how late
+        the last queued touchpoint will go out at the channel's send rate
+    """
+    limits = limits or DEFAULT_SEND_LIMITS
+    now_epoch = (now or datetime.now()).timestamp()
+    report = {}
+    for item in due:
+        touchpoint = item["touchpoint"]
+        if touchpoint.get("manual"):
+            continue
+        channel = touchpoint.get("type")
+        wait = max(0.0, (now_epoch - datetime.fromisoformat(touchpoint["scheduled_time"]).timestamp()) / 60)
+        entry = report.setdefault(channel, {"depth": 0, "oldest_wait_minutes": 0.0})
+        entry["depth"] += 1
+        entry["oldest_wait_minutes"] = max(entry["oldest_wait_minutes"], wait)
+
+    for channel, entry in report.items():
+        per_minute = RateLimiter.channel_rate(limits, channel)
+        entry["drain_minutes"] = entry["depth"] / per_minute if per_minute else 0.0
+        entry["expected_lag_minutes"] = entry["oldest_wait_minutes"] + entry["drain_minutes"]
+    return report
@@ -0,0 +1,64 @@
+"""
+Shared Store - Locking and change notifications for process-wide data stores
+
+The Streamlit app keeps one LeadDataManager, ConversationManager and
+CampaignManager per process (see get_shared_stores in app.py), so every browser
+session reads the same in-memory data. Writes are serialized with a re-entrant
+lock and every change bumps a version counter and notifies subscribers.
+"""
+import functools
+import threading
+
+
+def synchronized(method):
+    """Run a store method while holding the store's lock"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class SharedStore:
+    """Base class for stores shared between sessions and threads"""
+
+    def __init__(self):
+        """Initialize the lock, version counter and subscriber list"""
+        self.lock = threading.RLock()
+        self.version = 0
+        self._listeners = []
+
+    def subscribe(self, listener):
+        """
+        Register a change listener
+
+        Args:
+            listener: Callable taking (event, key, version), e.g.
+                ("update", lead_id, 42). Called with the store lock held, so it
+                must be quick and must not block on other stores.
+
+        Returns:
+            Function that removes the listener again
+        """
+        with self.lock:
+            self._listeners.append(listener)
+
+        def unsubscribe():
+            with self.lock:
+                if listener in self._listeners:
+                    self._listeners.remove(listener)
+        return unsubscribe
+
+    def changed_since(self, version):
+        """Whether the store changed after the given version"""
+        return self.version != version
+
+    def _notify(self, event, key=None):
+        """Bump the version and tell subscribers about a change"""
+        self.version += 1
+        for listener in list(self._listeners):
+            try:
+                listener(event, key, self.version)
+            except Exception:
+                # A broken subscriber must never fail the write itself
+                pass
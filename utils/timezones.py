@@ -0,0 +1,160 @@
+"""
+Timezones - Resolve lead timezones to IANA zones once, at import
+
+Bonzo sends labels such as "Eastern" or "PST" that pytz rejects, and many
+leads carry no timezone at all, only a property state and zip. resolve_timezone()
+maps label, then zip prefix, then state to an IANA zone name through the
+lookup tables below. LeadDataManager.add_lead() stores the result on every
+lead (lead_timezone()), whatever path imported it, so scheduling only ever
+calls load_zone() on a resolved name (a memoized dict hit).
+
+The zip prefix table only lists 3-digit prefixes in states split between two
+zones; a prefix straddling a zone line takes the zone most of it is in.
+"""
+import functools
+
+import pytz
+
+
+DEFAULT_TIMEZONE = "America/New_York"
+
+# Lead fields lead_timezone() reads
+TIMEZONE_FIELDS = ("timezone", "time_zone", "property_state", "state", "property_zip", "zip")
+
+# Bonzo / CRM labels and abbreviations (lowercase, without "time"/"standard"/"daylight")
+LABEL_TIMEZONES = {
+    "eastern": "America/New_York", "est": "America/New_York", "edt": "America/New_York",
+    "et": "America/New_York", "us/eastern": "America/New_York",
+    "central": "America/Chicago", "cst": "America/Chicago", "cdt": "America/Chicago",
+    "ct": "America/Chicago", "us/central": "America/Chicago",
+    "mountain": "America/Denver", "mst": "America/Denver", "mdt": "America/Denver",
+    "mt": "America/Denver", "us/mountain": "America/Denver",
+    "arizona": "America/Phoenix", "us/arizona": "America/Phoenix",
+    "pacific": "America/Los_Angeles", "pst": "America/Los_Angeles", "pdt": "America/Los_Angeles",
+    "pt": "America/Los_Angeles", "us/pacific": "America/Los_Angeles",
+    "alaska": "America/Anchorage", "akst": "America/Anchorage", "akdt": "America/Anchorage",
+    "us/alaska": "America/Anchorage",
+    "hawaii": "Pacific/Honolulu", "hst": "Pacific/Honolulu", "hawaii-aleutian": "Pacific/Honolulu",
+    "us/hawaii": "Pacific/Honolulu",
+    "atlantic": "America/Puerto_Rico", "ast": "America/Puerto_Rico",
+}
+
+# Zone most of each state is in (split states are refined by ZIP_PREFIX_TIMEZONES)
+STATE_TIMEZONES = {
+    "AL": "America/Chicago", "AK": "America/Anchorage", "AZ": "America/Phoenix", "AR": "America/Chicago",
+    "CA": "America/Los_Angeles", "CO": "America/Denver", "CT": "America/New_York", "DC": "America/New_York",
+    "DE": "America/New_York", "FL": "America/New_York", "GA": "America/New_York", "HI": "Pacific/Honolulu",
+    "ID": "America/Boise", "IL": "America/Chicago", "IN": "America/Indiana/Indianapolis", "IA": "America/Chicago",
+    "KS": "America/Chicago", "KY": "America/New_York", "LA": "America/Chicago", "ME": "America/New_York",
+    "MD": "America/New_York", "MA": "America/New_York", "MI": "America/Detroit", "MN": "America/Chicago",
+    "MS": "America/Chicago", "MO": "America/Chicago", "MT": "America/Denver", "NE": "America/Chicago",
+    "NV": "America/Los_Angeles", "NH": "America/New_York", "NJ": "America/New_York", "NM": "America/Denver",
+    "NY": "America/New_York", "NC": "America/New_York", "ND": "America/Chicago", "OH": "America/New_York",
+    "OK": "America/Chicago", "OR": "America/Los_Angeles", "PA": "America/New_York", "RI": "America/New_York",
+    "SC": "America/New_York", "SD": "America/Chicago", "TN": "America/Chicago", "TX": "America/Chicago",
+    "UT": "America/Denver", "VT": "America/New_York", "VA": "America/New_York", "WA": "America/Los_Angeles",
+    "WV": "America/New_York", "WI": "America/Chicago", "WY": "America/Denver", "PR": "America/Puerto_Rico",
+    "VI": "America/St_Thomas", "GU": "Pacific/Guam",
+}
+
+# Full state names Bonzo sometimes sends instead of the abbreviation
+STATE_NAMES = {
+    "alabama": "AL", "alaska": "AK", "arizona": "AZ", "arkansas": "AR", "california": "CA", "colorado": "CO",
+    "connecticut": "CT", "district of columbia": "DC", "delaware": "DE", "florida": "FL", "georgia": "GA",
+    "hawaii": "HI", "idaho": "ID", "illinois": "IL", "indiana": "IN", "iowa": "IA", "kansas": "KS",
+    "kentucky": "KY", "louisiana": "LA", "maine": "ME", "maryland": "MD", "massachusetts": "MA",
+    "michigan": "MI", "minnesota": "MN", "mississippi": "MS", "missouri": "MO", "montana": "MT",
+    "nebraska": "NE", "nevada": "NV", "new hampshire": "NH", "new jersey": "NJ", "new mexico": "NM",
+    "new york": "NY", "north carolina": "NC", "north dakota": "ND", "ohio": "OH", "oklahoma": "OK",
+    "oregon": "OR", "pennsylvania": "PA", "rhode island": "RI", "south carolina": "SC", "south dakota": "SD",
+    "tennessee": "TN", "texas": "TX", "utah": "UT", "vermont": "VT", "virginia": "VA", "washington": "WA",
+    "west virginia": "WV", "wisconsin": "WI", "wyoming": "WY", "puerto rico": "PR",
+}
+
+
+def _prefixes(first, last, zone):
+    """{prefix: zone} for a range of 3-digit zip prefixes"""
+    return {f"{prefix:03d}": zone for prefix in range(first, last + 1)}
+
+
+# 3-digit zip prefixes of split states that are not in their state's main zone
+ZIP_PREFIX_TIMEZONES = {
+    **_prefixes(324, 325, "America/Chicago"),           # Florida panhandle (Panama City, Pensacola)
+    **_prefixes(373, 374, "America/New_York"),          # Tennessee: Chattanooga
+    **_prefixes(376, 379, "America/New_York"),          # Tennessee: Johnson City, Knoxville
+    **_prefixes(420, 424, "America/Chicago"),           # Western Kentucky (Paducah, Bowling Green, Owensboro)
+    **_prefixes(463, 464, "America/Chicago"),           # Northwest Indiana (Gary)
+    **_prefixes(476, 477, "America/Chicago"),           # Southwest Indiana (Evansville)
+    "577": "America/Denver",                            # Western South Dakota (Rapid City)
+    "586": "America/Denver",                            # Southwest North Dakota (Dickinson)
+    "693": "America/Denver",                            # Nebraska panhandle (Scottsbluff)
+    **_prefixes(798, 799, "America/Denver"),            # West Texas (El Paso)
+    "885": "America/Denver",                            # El Paso
+    "835": "America/Los_Angeles", "838": "America/Los_Angeles",   # North Idaho (Lewiston, Coeur d'Alene)
+    "979": "America/Boise",                             # Eastern Oregon (Ontario)
+}
+
+
+@functools.lru_cache(maxsize=None)
+def load_zone(name):
+    """
+    Memoized pytz timezone of an IANA name or a label resolve_timezone() knows
+
+    Raises:
+        pytz.UnknownTimeZoneError: If the name cannot be resolved
+    """
+    resolved = resolve_timezone(name, default=None)
+    if resolved is None:
+        raise pytz.UnknownTimeZoneError(name)
+    return pytz.timezone(resolved)
+
+
+@functools.lru_cache(maxsize=4096)
+def resolve_timezone(label=None, state=None, zip_code=None, default=DEFAULT_TIMEZONE):
+    """
+    IANA zone name of a lead
+
+    Args:
+        label: Timezone as sent ("Eastern", "PST", "America/Chicago", ...)
+        state: Property state (abbreviation or full name)
+        zip_code: Property zip code
+        default: Zone when nothing resolves
+
+    Returns:
+        IANA zone name (default if label, zip and state are all unknown)
+    """
+    if label:
+        # Labels first: pytz also knows "EST" and "MST", as fixed offsets without DST
+        text = str(label).strip()
+        key = text.lower().replace("(us & canada)", "").replace("standard", "").replace("daylight", "")
+        key = " ".join(key.replace(" time", " ").split())
+        if key in LABEL_TIMEZONES:
+            return LABEL_TIMEZONES[key]
+        if text in pytz.all_timezones_set:
+            return text
+
+    if zip_code:
+        prefix = str(zip_code).strip().zfill(5)[:3]
+        if prefix in ZIP_PREFIX_TIMEZONES:
+            return ZIP_PREFIX_TIMEZONES[prefix]
+
+    if state:
+        code = str(state).strip()
+        code = STATE_NAMES.get(code.lower(), code.upper())
+        if code in STATE_TIMEZONES:
+            return STATE_TIMEZONES[code]
+
+    return default
+
+
+def lead_timezone(lead):
+    """
+    IANA zone name of a lead dictionary (raw Bonzo JSON or a stored lead)
+
+    Reads "timezone" / "time_zone", then the property (or mailing) state and zip.
+    """
+    return resolve_timezone(
+        lead.get("timezone") or lead.get("time_zone"),
+        lead.get("property_state") or lead.get("state"),
+        lead.get("property_zip") or lead.get("zip"),
+    )
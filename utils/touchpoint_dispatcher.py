@@ -0,0 +1,262 @@
+"""
+Touchpoint Dispatcher - Sends due campaign touchpoints
+
+Runs next to the Streamlit app as its own process. Every poll it asks the
+TouchpointQueue what is due, renders each touchpoint with the campaign
+manager's compiled templates (see utils/message_templates.py) and hands it to
+the sender registered for its channel ("SMS", "Email", "VM"). Token buckets per channel and per sending
+number/domain (utils/send_capacity.py) cap the send rate; the sender a
+message goes out from is passed as message["from"]. Deliveries run on a
+bounded thread pool; one task per lead sends that lead's touchpoints in
+schedule order. Successful sends are committed to the campaign store in
+batches with CampaignManager.mark_touchpoints_sent, so the app picks them up
+on its next read. Manual touchpoints (quotes Phil sends himself) are left alone.
+
+Senders implement TouchpointSender.send(). FileSender (one JSONL outbox per
+channel) and LogSender are local stand-ins until real SMS/email/voicemail
+providers are wired in.
+
+Usage:
+    python -m utils.touchpoint_dispatcher [--once] [--interval 30] [--workers 4]
+        [--outbox data/outbox | --log-only] [--campaigns-file data/campaigns.json]
+"""
+import abc
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+from .message_templates import lead_tokens
+from .send_capacity import RateLimiter, backlog
+from .touchpoint_queue import TouchpointQueue
+
+
+logger = logging.getLogger(__name__)
+
+CHANNELS = ("SMS", "Email", "VM")
+
+
+class TouchpointSender(abc.ABC):
+    """Delivers rendered touchpoints over one channel"""
+
+    @abc.abstractmethod
+    def send(self, lead_data, touchpoint, message):
+        """
+        Deliver one message
+
+        Args:
+            lead_data: Campaign copy of the lead (name, phone, email, ...)
+            touchpoint: Scheduled touchpoint dictionary
+            message: Rendered template (body, subject, script, attachment)
+
+        Raises:
+            Exception: If the message was not delivered (it stays pending)
+        """
+
+
+class FileSender(TouchpointSender):
+    """Appends each message to <outbox>/<channel>.jsonl"""
+
+    def __init__(self, outbox_dir, channel):
+        """
+        Initialize the sender
+
+        Args:
+            outbox_dir: Directory of the outbox files
+            channel: Channel name used as the file name
+        """
+        os.makedirs(outbox_dir, exist_ok=True)
+        self.path = os.path.join(outbox_dir, f"{channel.lower()}.jsonl")
+        self.lock = threading.Lock()
+
+    def send(self, lead_data, touchpoint, message):
+        """Write the message as one JSON line"""
+        line = json.dumps({
+            "to": lead_data.get("email") if touchpoint.get("type") == "Email" else lead_data.get("phone"),
+            "from": message.get("from"),
+            "lead_name": lead_data.get("name"),
+            "template": touchpoint.get("template"),
+            "message": message,
+            "sent_at": datetime.now().isoformat(),
+        }, default=str)
+        with self.lock:
+            with open(self.path, 'a') as f:
+                f.write(line + "\n")
+
+
+class LogSender(TouchpointSender):
+    """Logs each message instead of sending it"""
+
+    def __init__(self, channel):
+        self.channel = channel
+
+    def send(self, lead_data, touchpoint, message):
+        """Log the message"""
+        logger.info("%s to %s [%s]: %s", self.channel, lead_data.get("name"), touchpoint.get("template"),
+                    message.get("body") or message.get("script"))
+
+
+def file_senders(outbox_dir="data/outbox"):
+    """FileSender for every channel"""
+    return {channel: FileSender(outbox_dir, channel) for channel in CHANNELS}
+
+
+class TouchpointDispatcher:
+    """Pulls due touchpoints and delivers them through channel senders"""
+
+    def __init__(self, campaign_manager, senders, max_workers=4, batch_size=100, queue=None, limiter=None):
+        """
+        Initialize the dispatcher
+
+        Args:
+            campaign_manager: CampaignManager holding the campaigns
+            senders: Dictionary of channel ("SMS", "Email", "VM") -> TouchpointSender
+            max_workers: Maximum concurrent deliveries
+            batch_size: Sent touchpoints per state commit
+            queue: TouchpointQueue to use (one is attached if omitted)
+            limiter: RateLimiter (defaults to the default send limits)
+        """
+        self.campaign_manager = campaign_manager
+        self.senders = senders
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self.limiter = limiter or RateLimiter()
+        self.queue = queue
+        if self.queue is None:
+            self.queue = TouchpointQueue()
+            self.queue.attach(campaign_manager)
+
+    def _render(self, touchpoint, tokens):
+        """Personalized message of a touchpoint (raises if it cannot be rendered)"""
+        message = self.campaign_manager.templates.render(touchpoint["template"], tokens)
+        if not message:
+            raise KeyError(f"Unknown message template: {touchpoint['template']}")
+        return message
+
+    def _deliver(self, lead_id, items):
+        """
+        Send one lead's due touchpoints in order, stopping at the first failure
+
+        Touchpoints of a campaign that was paused, stopped or removed since the
+        queue was read are skipped (they are not due any more).
+
+        Returns:
+            (sent [(lead_id, index, sent_at)], errors [(lead_id, index, error)])
+        """
+        sent = []
+        campaign = tokens = None
+        for item in items:
+            touchpoint = item["touchpoint"]
+            try:
+                if campaign is None:
+                    campaign = self.campaign_manager.get_campaign(lead_id)
+                    if campaign is None or campaign.get("status") != "active":
+                        logger.info("Campaign of lead %s is no longer active, skipping %d touchpoints", lead_id, len(items))
+                        return sent, []
+                    tokens = lead_tokens(campaign.get("lead_data", {}))
+                sender = self.senders.get(touchpoint.get("type"))
+                if sender is None:
+                    raise KeyError(f"No sender for channel: {touchpoint.get('type')}")
+                message = self._render(touchpoint, tokens)
+                message["from"] = self.limiter.acquire(touchpoint.get("type"), lead_id)
+                sender.send(campaign.get("lead_data", {}), touchpoint, message)
+            except Exception as e:
+                # Later touchpoints of this lead wait until this one goes out
+                return sent, [(lead_id, item["index"], str(e))]
+            sent.append((lead_id, item["index"], self.campaign_manager.now().isoformat()))
+        return sent, []
+
+    def run_once(self, now=None):
+        """
+        Deliver everything due now
+
+        Args:
+            now: Cutoff datetime (defaults to now on the campaign manager's clock)
+
+        Returns:
+            Dictionary with "due", "sent", "failed" and "manual" counts
+        """
+        # Picks up campaigns changed by the app since the last poll
+        self.campaign_manager.refresh()
+        now = now or self.campaign_manager.now()
+
+        by_lead = {}
+        manual = 0
+        for item in self.queue.due(now):
+            if item["touchpoint"].get("manual"):
+                manual += 1
+                continue
+            by_lead.setdefault(item["lead_id"], []).append(item)
+
+        result = {"due": sum(len(items) for items in by_lead.values()), "sent": 0, "failed": 0, "manual": manual}
+        if not by_lead:
+            return result
+
+        pending_commit = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = [pool.submit(self._deliver, lead_id, items) for lead_id, items in by_lead.items()]
+            for future in as_completed(futures):
+                sent, errors = future.result()
+                pending_commit.extend(sent)
+                for lead_id, index, error in errors:
+                    logger.warning("Touchpoint %s of lead %s not sent: %s", index, lead_id, error)
+                result["failed"] += len(errors)
+                if len(pending_commit) >= self.batch_size:
+                    result["sent"] += self.campaign_manager.mark_touchpoints_sent(pending_commit)
+                    pending_commit = []
+
+        if pending_commit:
+            result["sent"] += self.campaign_manager.mark_touchpoints_sent(pending_commit)
+        return result
+
+    def backlog(self, now=None):
+        """Queue depth and expected lag per channel (see send_capacity.backlog)"""
+        now = now or self.campaign_manager.now()
+        return backlog(self.queue.due(now), self.limiter.limits, now)
+
+    def run_forever(self, interval=30):
+        """Poll every `interval` seconds until interrupted"""
+        while True:
+            for channel, entry in self.backlog().items():
+                logger.info("%s queue: %d due, expected lag %.1f min", channel, entry["depth"], entry["expected_lag_minutes"])
+            result = self.run_once()
+            if result["due"] or result["failed"]:
+                logger.info("Dispatched %(sent)d of %(due)d due touchpoints (%(failed)d failed)", result)
+            time.sleep(interval)
+
+
+def main(argv=None):
+    """Command-line entry point"""
+    from .campaign_manager import CampaignManager
+
+    parser = argparse.ArgumentParser(description="Send due campaign touchpoints")
+    parser.add_argument("--once", action="store_true", help="Dispatch what is due now and exit")
+    parser.add_argument("--interval", type=float, default=30, help="Seconds between polls")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent deliveries")
+    parser.add_argument("--batch-size", type=int, default=100, help="Sent touchpoints per state commit")
+    parser.add_argument("--campaigns-file", default="data/campaigns.json")
+    parser.add_argument("--outbox", default="data/outbox", help="Directory of the file stand-in senders")
+    parser.add_argument("--log-only", action="store_true", help="Log messages instead of writing the outbox")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    senders = {channel: LogSender(channel) for channel in CHANNELS} if args.log_only else file_senders(args.outbox)
+    dispatcher = TouchpointDispatcher(
+        CampaignManager(campaigns_file=args.campaigns_file), senders,
+        max_workers=args.workers, batch_size=args.batch_size,
+    )
+    if args.once:
+        print(dispatcher.run_once())
+    else:
+        try:
+            dispatcher.run_forever(args.interval)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
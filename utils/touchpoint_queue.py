@@ -0,0 +1,172 @@
+"""
+Touchpoint Queue - Global index of due campaign touchpoints
+
+Finding due touchpoints used to mean calling get_pending_touchpoints() for every
+lead. TouchpointQueue keeps one min-heap entry per active campaign, keyed by the
+scheduled time of its earliest pending touchpoint, so "what is due in the next
+minute" pops only the campaigns that have something due.
+"""
+import heapq
+import itertools
+import threading
+from datetime import datetime
+
+from .campaign_model import pending_touchpoints, touchpoint_at
+
+
+def _epoch(value):
+    """Seconds since the epoch of an ISO timestamp or datetime (naive = local time)"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.timestamp()
+
+
+def pending_times(campaign):
+    """(scheduled epoch, touchpoint index) of a campaign's pending touchpoints"""
+    return [(scheduled, index) for scheduled, index, _ in pending_touchpoints(campaign)]
+
+
+class TouchpointQueue:
+    """
+    Due-time queue over all active campaigns
+
+    Uses lazy invalidation like CallQueue: a changed campaign pushes a new
+    entry and its old entry is skipped when it surfaces, so an update costs
+    O(touchpoints + log n) and due() costs O(k log n) for k due campaigns.
+    Campaigns are held by reference; CampaignManager replaces rather than
+    modifies a campaign, so the queue sees the version it indexed.
+    """
+
+    def __init__(self):
+        """Initialize an empty queue"""
+        self.lock = threading.RLock()
+        self.heap = []          # (next_due_epoch, entry_id, lead_id)
+        self.current = {}       # lead_id -> (next_due_epoch, entry_id) of the live entry
+        self.campaigns = {}     # lead_id -> indexed campaign
+        self._entry_ids = itertools.count()
+
+    def build(self, campaigns):
+        """Index every active campaign and heapify"""
+        with self.lock:
+            self.heap = []
+            self.current = {}
+            self.campaigns = {}
+            for lead_id, campaign in campaigns.items():
+                entry = self._entry(lead_id, campaign)
+                if entry:
+                    self.heap.append(entry)
+            heapq.heapify(self.heap)
+
+    def _entry(self, lead_id, campaign):
+        """Register a campaign and return its heap entry (None if nothing is pending)"""
+        if not campaign or campaign.get("status") != "active":
+            return None
+        times = pending_times(campaign)
+        if not times:
+            return None
+        next_due = min(times)[0]
+        entry_id = next(self._entry_ids)
+        self.current[lead_id] = (next_due, entry_id)
+        self.campaigns[lead_id] = campaign
+        return (next_due, entry_id, lead_id)
+
+    def update(self, lead_id, campaign):
+        """Re-index one campaign (paused, stopped or finished campaigns drop out)"""
+        with self.lock:
+            self.current.pop(lead_id, None)
+            self.campaigns.pop(lead_id, None)
+            entry = self._entry(lead_id, campaign)
+            if entry:
+                heapq.heappush(self.heap, entry)
+            self._maybe_compact()
+
+    def remove(self, lead_id):
+        """Drop a campaign from the queue"""
+        self.update(lead_id, None)
+
+    def _is_live(self, entry):
+        """Whether a heap entry is the current one for its campaign"""
+        live = self.current.get(entry[2])
+        return live is not None and live[1] == entry[1]
+
+    def _maybe_compact(self):
+        """Rebuild the heap when stale entries outnumber live ones"""
+        if len(self.heap) > 2 * len(self.current) + 64:
+            self.heap = [entry for entry in self.heap if self._is_live(entry)]
+            heapq.heapify(self.heap)
+
+    def due(self, until=None, limit=None):
+        """
+        Pending touchpoints scheduled at or before a time, across all campaigns
+
+        Args:
+            until: datetime (defaults to now)
+            limit: Maximum number of touchpoints to return (None = all)
+
+        Returns:
+            List of {"lead_id", "index", "touchpoint"}, earliest first
+        """
+        cutoff = _epoch(until or datetime.now())
+        popped = []
+        found = []
+        with self.lock:
+            while self.heap and self.heap[0][0] <= cutoff and (limit is None or len(popped) < limit):
+                entry = heapq.heappop(self.heap)
+                if not self._is_live(entry):
+                    continue
+                popped.append(entry)
+                lead_id = entry[2]
+                campaign = self.campaigns[lead_id]
+                for scheduled, index in pending_times(campaign):
+                    if scheduled <= cutoff:
+                        found.append((scheduled, lead_id, index, touchpoint_at(campaign, index)))
+            for entry in popped:
+                heapq.heappush(self.heap, entry)
+
+        # Each popped campaign contributes its earliest touchpoint, so the first
+        # `limit` of the sorted results are the globally earliest ones
+        found.sort(key=lambda item: item[:3])
+        if limit is not None:
+            found = found[:limit]
+        return [{"lead_id": lead_id, "index": index, "touchpoint": touchpoint}
+                for _, lead_id, index, touchpoint in found]
+
+    def next_due(self):
+        """
+        Earliest pending touchpoint time
+
+        Returns:
+            (datetime, lead_id), or None if nothing is pending
+        """
+        with self.lock:
+            while self.heap and not self._is_live(self.heap[0]):
+                heapq.heappop(self.heap)
+            if not self.heap:
+                return None
+            return datetime.fromtimestamp(self.heap[0][0]), self.heap[0][2]
+
+    def __len__(self):
+        return len(self.current)
+
+    def attach(self, campaign_manager):
+        """
+        Build from a CampaignManager and follow its changes (create, enroll,
+        pause, resume, stop, touchpoint sent, reload)
+
+        Returns:
+            Function that detaches the queue again
+        """
+        with campaign_manager.lock:
+            self.build(campaign_manager.get_all_campaigns())
+
+            def on_change(event, lead_id, version):
+                if event == "reload":
+                    self.build(campaign_manager.get_all_campaigns())
+                elif event == "enroll":
+                    # A batch of new campaigns (the key lists their leads)
+                    for enrolled in lead_id:
+                        self.update(str(enrolled), campaign_manager.get_campaign(enrolled))
+                else:
+                    self.update(str(lead_id), campaign_manager.get_campaign(lead_id))
+
+            return campaign_manager.subscribe(on_change)